@@ -0,0 +1,377 @@
+"""
+Asynchronous alert pipeline.
+
+Producers (API handlers, the monitor loop, job callbacks) only append alert
+changes to an in-process queue and return. One consumer thread drains the
+queue in batches: new alerts are written to the Redis index in a single
+transaction, resolves are applied in order, listeners are notified so clients
+receive ``new_alert``/``alert_resolved`` events, and every change is handed
+to an AlertWriter that persists it to the Postgres ``alerts`` table with
+multi-row inserts. With an IncidentCorrelator, new alerts are first folded
+into open incidents: only an incident's first alert is stored, and repeats
+become one ``incident_updated`` change per incident per batch. Redis keeps the recent, hot alerts; Postgres keeps the
+full history, which ``list`` falls back to when a query reaches past what
+Redis still holds.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import db
+from db import execute_values
+from serialization import dumps
+
+ALERT_COLUMNS = ('id', 'severity', 'message', 'source', 'type', 'timestamp', 'resolved', 'resolved_at', 'auto_healed')
+
+INSERT_SQL = """
+INSERT INTO alerts (id, severity, message, source, type, timestamp, resolved, resolved_at, auto_healed, metadata)
+VALUES %s
+ON CONFLICT (id) DO NOTHING
+"""
+
+UPDATE_SQL = """
+UPDATE alerts SET
+    severity = v.severity,
+    metadata = COALESCE(alerts.metadata, '{}'::jsonb) || v.extra
+FROM (VALUES %s) AS v (id, severity, extra)
+WHERE alerts.id = v.id
+"""
+
+RESOLVE_SQL = """
+UPDATE alerts SET
+    resolved = TRUE,
+    resolved_at = v.resolved_at,
+    auto_healed = alerts.auto_healed OR v.auto_healed,
+    metadata = COALESCE(alerts.metadata, '{}'::jsonb) || v.extra
+FROM (VALUES %s) AS v (id, resolved_at, auto_healed, extra)
+WHERE alerts.id = v.id
+"""
+
+
+def parse_time(value):
+    """Epoch seconds or an ISO 8601 timestamp (UTC unless it has an offset) as epoch seconds"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid timestamp: {value}')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _utc(value):
+    """Naive UTC datetime for an ISO timestamp, as stored in the ``alerts`` table"""
+    if not value:
+        return None
+    return datetime.utcfromtimestamp(parse_time(value))
+
+
+def query_alerts(source=None, alert_type=None, resolved=None, offset=0, limit=50, since=None, until=None,
+                 connect=db.connection):
+    """Newest-first page of persisted alerts matching the filters, plus the total match count"""
+    conditions, params = [], []
+    if since is not None:
+        conditions.append('timestamp >= %s')
+        params.append(datetime.utcfromtimestamp(since))
+    if until is not None:
+        conditions.append('timestamp <= %s')
+        params.append(datetime.utcfromtimestamp(until))
+    if source is not None:
+        conditions.append('source = %s')
+        params.append(source)
+    if alert_type is not None:
+        conditions.append('type = %s')
+        params.append(alert_type)
+    if resolved is not None:
+        conditions.append('resolved = %s')
+        params.append(resolved)
+    where = ' AND '.join(conditions) or 'TRUE'
+
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM alerts WHERE {where}', params)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f'SELECT {", ".join(ALERT_COLUMNS)}, metadata FROM alerts WHERE {where} '
+                'ORDER BY timestamp DESC, id DESC LIMIT %s OFFSET %s',
+                params + [limit, offset]
+            )
+            rows = cursor.fetchall()
+
+    alerts = []
+    for row in rows:
+        alert = dict(row[-1] or {})
+        alert.update(zip(ALERT_COLUMNS, row[:-1]))
+        for field in ('timestamp', 'resolved_at'):
+            if alert[field] is not None:
+                alert[field] = alert[field].isoformat()
+        alerts.append(alert)
+    return alerts, total
+
+
+class AlertWriter(db.BatchWriter):
+    """Buffers alert inserts and resolves and writes them to Postgres in batches"""
+
+    label = 'Alert'
+
+    def __init__(self, connect=db.connection, max_buffer=100000, batch_size=1000,
+                 flush_interval=2, max_backoff=60):
+        super().__init__(connect, max_buffer, batch_size, flush_interval, max_backoff)
+
+    def insert(self, alert):
+        """Queue a newly stored alert; fields outside the table columns go into ``metadata``"""
+        extra = {key: value for key, value in alert.items() if key not in ALERT_COLUMNS}
+        self._record(('insert', (
+            alert['id'],
+            alert.get('severity') or 'info',
+            alert.get('message') or '',
+            alert.get('source'),
+            alert.get('type'),
+            _utc(alert.get('timestamp')) or datetime.utcnow(),
+            bool(alert.get('resolved')),
+            _utc(alert.get('resolved_at')),
+            bool(alert.get('auto_healed')),
+            dumps(extra) if extra else None
+        )))
+
+    def update(self, alert_id, severity=None, **fields):
+        """Queue merging changed incident fields into a persisted alert"""
+        extra = {key: value for key, value in fields.items() if key not in ALERT_COLUMNS}
+        self._record(('update', (alert_id, severity or 'info', dumps(extra))))
+
+    def resolve(self, alert_id, resolved_at=None, **fields):
+        """Queue marking a persisted alert resolved"""
+        extra = {key: value for key, value in fields.items() if key not in ALERT_COLUMNS}
+        self._record(('resolve', (
+            alert_id,
+            _utc(resolved_at) or datetime.utcnow(),
+            bool(fields.get('auto_healed')),
+            dumps(extra)
+        )))
+
+    def _write(self, batch):
+        inserts = [row for kind, row in batch if kind == 'insert']
+        # Only the latest update of an alert matters; UPDATE ... FROM would apply an arbitrary one
+        updates = list({row[0]: row for kind, row in batch if kind == 'update'}.values())
+        resolves = [row for kind, row in batch if kind == 'resolve']
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                # Inserts first: a batch may hold an alert, its updates and its resolve
+                if inserts:
+                    execute_values(cursor, INSERT_SQL, inserts, page_size=self.batch_size)
+                if updates:
+                    execute_values(cursor, UPDATE_SQL, updates, template='(%s, %s, %s::jsonb)',
+                                   page_size=self.batch_size)
+                if resolves:
+                    execute_values(cursor, RESOLVE_SQL, resolves,
+                                   template='(%s, %s::timestamp, %s::boolean, %s::jsonb)',
+                                   page_size=self.batch_size)
+
+    def max_id(self):
+        """Highest alert ID already persisted"""
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT COALESCE(max(id), 0) FROM alerts')
+                return cursor.fetchone()[0]
+
+
+class AlertPipeline:
+    """Accepts alert changes without blocking and applies them in batches on one consumer thread"""
+
+    def __init__(self, store, writer=None, correlator=None, max_queue=100000, batch_size=500, retry_interval=5):
+        self.store = store
+        self.writer = writer
+        self.correlator = correlator
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._listeners = []
+        self._thread = None
+        self.applied = 0
+        self.dropped = 0
+
+    def add_listener(self, callback):
+        """Call ``callback(event, payload)`` for every applied change
+
+        Events are ``new_alert`` with the stored alert, ``incident_updated``
+        with the alert ID and its changed incident fields, and
+        ``alert_resolved`` with the alert ID.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, changes):
+        for event, payload in changes:
+            for callback in self._listeners:
+                try:
+                    callback(event, payload)
+                except Exception as e:
+                    print(f"Alert listener error: {e}")
+
+    def _put(self, change):
+        with self._lock:
+            overflow = len(self._queue) >= self.max_queue
+            if overflow:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(change)
+        self._wakeup.set()
+        return not overflow
+
+    def fire(self, alert):
+        """Queue a new alert; returns False if an older queued change had to be dropped"""
+        return self._put(('add', dict(alert), time.time()))
+
+    def resolve(self, alert_id, **fields):
+        """Queue resolving one alert"""
+        return self._put(('resolve', alert_id, fields))
+
+    def clear(self, source, alert_type, **fields):
+        """Queue resolving every open alert of one type from one source"""
+        return self._put(('clear', (source, alert_type), fields))
+
+    def pending(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _requeue(self, changes):
+        with self._lock:
+            self._queue.extendleft(reversed(changes))
+
+    def _resolve(self, alert_ids, fields, changes):
+        for alert_id in alert_ids:
+            if self.correlator is not None:
+                self.correlator.forget(alert_id)
+            alert = self.store.resolve(alert_id, **fields)
+            if self.writer is not None:
+                self.writer.resolve(alert_id, alert['resolved_at'] if alert else None, **fields)
+            if alert:
+                changes.append(('alert_resolved', alert_id))
+
+    def _add(self, alerts, changes):
+        """Store new alerts; returns the follow-up changes (Postgres inserts, incident updates) to apply next
+
+        Once ``add_many`` has succeeded the alerts must not be stored again,
+        so everything after it is queued as separate changes that a failure
+        requeues on their own.
+        """
+        updates = []
+        if self.correlator is not None:
+            alerts, updates = self.correlator.correlate(alerts)
+        stored = self.store.add_many([alert for alert, _ in alerts], scores=[score for _, score in alerts])
+        if self.correlator is not None:
+            self.correlator.bind(stored)
+
+        follow_ups = []
+        for alert in stored:
+            changes.append(('new_alert', alert))
+            if self.writer is not None:
+                follow_ups.append(('insert', alert, None))
+        for fields in updates:
+            alert_id = fields.pop('alert_id')
+            follow_ups.append(('update', alert_id, fields))
+        return follow_ups
+
+    def _update(self, alert_id, fields, changes):
+        if self.store.update(alert_id, **fields) is None:
+            return
+        if self.writer is not None:
+            self.writer.update(alert_id, **fields)
+        changes.append(('incident_updated', dict(fields, id=alert_id)))
+
+    def _apply(self, batch, changes):
+        index = 0
+        while index < len(batch):
+            try:
+                kind, target, extra = batch[index]
+                if kind == 'add':
+                    # Consecutive new alerts go to Redis in one transaction
+                    end = index
+                    while end < len(batch) and batch[end][0] == 'add':
+                        end += 1
+                    batch[end:end] = self._add([(change[1], change[2]) for change in batch[index:end]], changes)
+                    index = end
+                    continue
+
+                if kind == 'insert':
+                    self.writer.insert(target)
+                elif kind == 'update':
+                    self._update(target, extra, changes)
+                elif kind == 'resolve':
+                    self._resolve([target], extra, changes)
+                else:
+                    source, alert_type = target
+                    open_alerts, _ = self.store.list(source=source, alert_type=alert_type, resolved=False, limit=100)
+                    alert_ids = [alert['id'] for alert in open_alerts]
+                    if self.correlator is not None:
+                        # The last source of a storm to clear resolves the storm's alert
+                        alert_ids += self.correlator.close(source, alert_type)
+                    self._resolve(alert_ids, extra, changes)
+                index += 1
+            except Exception:
+                self._requeue(batch[index:])
+                raise
+
+    def process(self):
+        """Apply every queued change; returns how many were applied"""
+        applied = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return applied
+            count = len(batch)
+            changes = []
+            try:
+                self._apply(batch, changes)
+            finally:
+                self._notify(changes)
+            applied += count
+            self.applied += count
+
+    def list(self, source=None, alert_type=None, resolved=None, offset=0, limit=50, since=None, until=None):
+        """Alerts from the Redis index, or from Postgres when ``since`` reaches past what Redis holds"""
+        if self.writer is not None and since is not None:
+            horizon = self.store.horizon()
+            if horizon is None or since < horizon:
+                return query_alerts(source=source, alert_type=alert_type, resolved=resolved, offset=offset,
+                                    limit=limit, since=since, until=until, connect=self.writer.connect)
+        return self.store.list(source=source, alert_type=alert_type, resolved=resolved, offset=offset,
+                               limit=limit, since=since, until=until)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.process()
+            except Exception as e:
+                print(f"Alert pipeline error (retrying in {self.retry_interval}s): {e}")
+                time.sleep(self.retry_interval)
+                self._wakeup.set()
+
+    def start(self):
+        """Start the consumer and, with persistence, the Postgres writer"""
+        if self._thread is not None:
+            return
+        if self.writer is not None:
+            # Redis hands out alert IDs; never reuse one already in Postgres
+            try:
+                self.store.reserve_ids(self.writer.max_id())
+            except Exception as e:
+                print(f"Alert ID reservation error: {e}")
+            self.writer.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
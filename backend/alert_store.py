@@ -0,0 +1,221 @@
+"""
+Indexed alert storage on Redis.
+
+Each alert is a hash under ``alerts:item:<id>``; a sorted set scored by
+creation time orders all alerts, and per-source, per-type and per-state sorted
+sets act as secondary indexes. Writes touch a fixed number of keys inside a
+MULTI/EXEC transaction, so they cost O(log n) and concurrent writers no longer
+overwrite each other the way a read-modify-write of one JSON blob did.
+"""
+
+import time
+import uuid
+from datetime import datetime
+
+from serialization import redis_codec
+
+
+class AlertStore:
+    """Alerts in Redis hashes with sorted-set indexes for ordering and filtering"""
+
+    def __init__(self, redis_client, prefix='alerts', max_alerts=10000, max_age=None):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.max_alerts = max_alerts
+        self.max_age = max_age
+
+    # Key helpers
+    def _item_key(self, alert_id):
+        return f'{self.prefix}:item:{alert_id}'
+
+    def _index_key(self):
+        return f'{self.prefix}:index'
+
+    def _source_key(self, source):
+        return f'{self.prefix}:source:{source}'
+
+    def _type_key(self, alert_type):
+        return f'{self.prefix}:type:{alert_type}'
+
+    def _state_key(self, resolved):
+        return f'{self.prefix}:state:{"resolved" if resolved else "open"}'
+
+    @staticmethod
+    def _encode(alert):
+        return {key: redis_codec.encode(value) for key, value in alert.items()}
+
+    @staticmethod
+    def _decode(data):
+        return {key.decode() if isinstance(key, bytes) else key: redis_codec.decode(value) for key, value in data.items()}
+
+    def add(self, alert):
+        """Store a new alert, assigning its ID, timestamp and open state"""
+        return self.add_many([alert])[0]
+
+    def add_many(self, alerts, scores=None):
+        """Store several new alerts in one transaction; ``scores`` are their creation times"""
+        alerts = [dict(alert) for alert in alerts]
+        if not alerts:
+            return []
+
+        first_id = int(self.redis.incrby(f'{self.prefix}:next_id', len(alerts))) - len(alerts) + 1
+        now = time.time()
+
+        pipe = self.redis.pipeline(transaction=True)
+        for offset, alert in enumerate(alerts):
+            alert['id'] = first_id + offset
+            alert.setdefault('timestamp', datetime.utcnow().isoformat())
+            alert.setdefault('resolved', False)
+
+            alert_id = alert['id']
+            score = scores[offset] if scores else now
+            pipe.hset(self._item_key(alert_id), mapping=self._encode(alert))
+            pipe.zadd(self._index_key(), {alert_id: score})
+            pipe.zadd(self._source_key(alert.get('source', 'unknown')), {alert_id: score})
+            pipe.zadd(self._type_key(alert.get('type', 'unknown')), {alert_id: score})
+            pipe.zadd(self._state_key(alert['resolved']), {alert_id: score})
+        pipe.zcard(self._index_key())
+        total = pipe.execute()[-1]
+
+        if self.max_alerts and total > self.max_alerts:
+            self.trim()
+
+        return alerts
+
+    def reserve_ids(self, minimum):
+        """Make sure new alert IDs are above ``minimum``, e.g. the highest ID already persisted"""
+        key = f'{self.prefix}:next_id'
+
+        def bump(pipe):
+            if int(pipe.get(key) or 0) < minimum:
+                pipe.multi()
+                pipe.set(key, minimum)
+
+        self.redis.transaction(bump, key)
+
+    def horizon(self):
+        """Creation time of the oldest alert still held, or None when empty"""
+        oldest = self.redis.zrange(self._index_key(), 0, 0, withscores=True)
+        return oldest[0][1] if oldest else None
+
+    def get(self, alert_id):
+        """Fetch one alert by ID, or None if it does not exist"""
+        data = self.redis.hgetall(self._item_key(alert_id))
+        return self._decode(data) if data else None
+
+    def update(self, alert_id, **fields):
+        """Atomically merge fields into an alert, keeping the state index in sync"""
+        item_key = self._item_key(alert_id)
+        result = {}
+
+        def apply(pipe):
+            current = pipe.hmget(item_key, ['resolved'])[0]
+            if current is None:
+                return
+
+            was_resolved = redis_codec.decode(current)
+            score = pipe.zscore(self._index_key(), alert_id)
+
+            pipe.multi()
+            pipe.hset(item_key, mapping=self._encode(fields))
+            if 'resolved' in fields and fields['resolved'] != was_resolved:
+                pipe.zrem(self._state_key(was_resolved), alert_id)
+                pipe.zadd(self._state_key(fields['resolved']), {alert_id: score})
+            result['updated'] = True
+
+        self.redis.transaction(apply, item_key)
+        return self.get(alert_id) if result else None
+
+    def resolve(self, alert_id, **fields):
+        """Mark an alert resolved; returns the updated alert or None if not found"""
+        return self.update(alert_id, resolved=True, resolved_at=datetime.utcnow().isoformat(), **fields)
+
+    def list(self, source=None, alert_type=None, resolved=None, offset=0, limit=50, since=None, until=None):
+        """Newest-first page of alerts matching the filters, plus the total match count"""
+        keys = []
+        if source is not None:
+            keys.append(self._source_key(source))
+        if alert_type is not None:
+            keys.append(self._type_key(alert_type))
+        if resolved is not None:
+            keys.append(self._state_key(resolved))
+
+        if not keys:
+            key = self._index_key()
+        elif len(keys) == 1:
+            key = keys[0]
+        else:
+            # Intersect the secondary indexes into a short-lived scratch key
+            key = f'{self.prefix}:query:{uuid.uuid4().hex}'
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.zinterstore(key, keys, aggregate='MAX')
+            pipe.expire(key, 10)
+            pipe.execute()
+
+        low = since if since is not None else '-inf'
+        high = until if until is not None else '+inf'
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcount(key, low, high)
+        pipe.zrevrangebyscore(key, high, low, start=offset, num=limit)
+        total, ids = pipe.execute()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for alert_id in ids:
+            pipe.hgetall(self._item_key(int(alert_id)))
+        alerts = [self._decode(data) for data in pipe.execute() if data]
+
+        if len(keys) > 1:
+            self.redis.delete(key)
+
+        return alerts, total
+
+    def _delete(self, alert_ids):
+        pipe = self.redis.pipeline(transaction=False)
+        for alert_id in alert_ids:
+            pipe.hmget(self._item_key(alert_id), ['source', 'type', 'resolved'])
+        fields = pipe.execute()
+
+        pipe = self.redis.pipeline(transaction=True)
+        for alert_id, (source, alert_type, resolved) in zip(alert_ids, fields):
+            pipe.delete(self._item_key(alert_id))
+            pipe.zrem(self._index_key(), alert_id)
+            if source is not None:
+                pipe.zrem(self._source_key(redis_codec.decode(source)), alert_id)
+            if alert_type is not None:
+                pipe.zrem(self._type_key(redis_codec.decode(alert_type)), alert_id)
+            if resolved is not None:
+                pipe.zrem(self._state_key(redis_codec.decode(resolved)), alert_id)
+        pipe.execute()
+
+    def trim(self):
+        """Drop alerts beyond the configured size and age limits"""
+        expired = []
+        if self.max_age:
+            expired.extend(self.redis.zrangebyscore(self._index_key(), '-inf', time.time() - self.max_age))
+        if self.max_alerts:
+            excess = self.redis.zcard(self._index_key()) - self.max_alerts
+            if excess > 0:
+                expired.extend(self.redis.zrange(self._index_key(), 0, excess - 1))
+
+        alert_ids = sorted({int(alert_id) for alert_id in expired})
+        if alert_ids:
+            self._delete(alert_ids)
+        return len(alert_ids)
+
+    def import_legacy(self, key='alerts'):
+        """Move alerts from the old single JSON blob into the store"""
+        from redis import ResponseError
+
+        try:
+            data = self.redis.get(key)
+        except ResponseError:
+            return 0
+        if not data:
+            return 0
+
+        alerts = redis_codec.decode(data)
+        for alert in reversed(alerts):
+            self.add({k: v for k, v in alert.items() if k != 'id'})
+        self.redis.delete(key)
+        return len(alerts)
@@ -0,0 +1,148 @@
+"""
+Ansible inventory generated from the container inventory.
+
+Playbooks used to run against the static ``inventory.ini`` with
+``hosts: all``, so fixing one server touched (and gathered facts from)
+every host. The inventory is now built from what the backend knows:
+
+- every known local container, reached with the ``docker`` connection;
+- every known container on a remote Docker host, reached with the same
+  connection pointed at that daemon (``-H <url>``);
+- the hosts, groups, child groups and group vars of the static inventory, so
+  groups such as ``webservers`` keep their members.
+
+Stopped and crashed containers are included, with their ``container_status``,
+so that a heal can be limited to them.
+
+Containers are also grouped by Docker host (``docker_<name>``) and by the
+comma-separated groups in their ``ANSIBLE_GROUPS_LABEL`` label. The result
+is written as a JSON file in the format of Ansible's YAML inventory plugin
+right before each run.
+"""
+
+import json
+import os
+import re
+import tempfile
+
+
+def group_name(name):
+    """A valid Ansible group name for ``name``"""
+    return re.sub(r'[^A-Za-z0-9_]', '_', name)
+
+
+def parse_ini(path):
+    """Hosts with their vars, and groups with their hosts, child groups and vars, of an INI inventory
+
+    ``[group:children]`` and ``[group:vars]`` sections are supported; any
+    other ``[group:...]`` section is rejected rather than ignored.
+    """
+    hosts, groups = {}, {}
+    section, kind = None, None
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].split(';', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section, _, kind = line[1:-1].strip().partition(':')
+                if kind not in ('', 'children', 'vars'):
+                    raise ValueError(f'{path}:{number}: unsupported section [{section}:{kind}]')
+                groups.setdefault(section, {'hosts': [], 'children': [], 'vars': {}})
+                continue
+            if section is None:
+                raise ValueError(f'{path}:{number}: entry outside a section')
+            group = groups[section]
+            if kind == 'vars':
+                key, _, value = line.partition('=')
+                group['vars'][key.strip()] = value.strip()
+            elif kind == 'children':
+                group['children'].append(line.split()[0])
+            else:
+                name, *pairs = line.split()
+                hosts.setdefault(name, {}).update(pair.split('=', 1) for pair in pairs if '=' in pair)
+                group['hosts'].append(name)
+    return hosts, groups
+
+
+class AnsibleInventory:
+    """Builds an Ansible inventory from the known containers and writes it for ansible-playbook"""
+
+    def __init__(self, inventory, path, docker_hosts=None, static_path=None, local_name='local',
+                 groups_label='autoguard.ansible.groups'):
+        self.inventory = inventory
+        self.path = path
+        self.docker_hosts = docker_hosts
+        self.static_path = static_path
+        self.local_name = local_name
+        self.groups_label = groups_label
+
+    def _add(self, hosts, groups, name, host_vars, docker_host, labels=None):
+        hosts[name] = dict(hosts.get(name, {}), **host_vars)
+        members = [f'docker_{docker_host}']
+        members += [group.strip() for group in (labels or {}).get(self.groups_label, '').split(',') if group.strip()]
+        for group in members:
+            groups.setdefault(group_name(group), {'hosts': [], 'children': [], 'vars': {}})['hosts'].append(name)
+
+    def build(self):
+        """The inventory as a dict for Ansible's YAML/JSON inventory plugin"""
+        hosts, groups = {}, {}
+        if self.static_path and os.path.exists(self.static_path):
+            hosts, groups = parse_ini(self.static_path)
+        all_vars = groups.pop('all', {}).get('vars', {})
+
+        for container in self.inventory.containers():
+            self._add(hosts, groups, container.name, {
+                'ansible_host': container.name,
+                'ansible_connection': 'docker',
+                'container_id': container.id[:12],
+                'container_status': container.status,
+                'docker_host': self.local_name
+            }, self.local_name, getattr(container, 'labels', None))
+
+        if self.docker_hosts is not None:
+            for server in self.docker_hosts.servers():
+                host = self.docker_hosts.hosts[server['host']]
+                # Remote containers are named after their host so they cannot shadow local ones
+                self._add(hosts, groups, f"{server['name']}.{host.name}", {
+                    'ansible_host': server['name'],
+                    'ansible_connection': 'docker',
+                    'ansible_docker_extra_args': f'-H {host.url}',
+                    'container_id': server['id'],
+                    'container_status': server.get('status'),
+                    'docker_host': host.name
+                }, host.name)
+
+        children = {}
+        for name, group in sorted(groups.items()):
+            entry = {'hosts': {member: {} for member in group['hosts']}}
+            if group['children']:
+                entry['children'] = {child: {} for child in group['children']}
+            if group['vars']:
+                entry['vars'] = group['vars']
+            children[name] = entry
+        return {'all': {'vars': all_vars, 'hosts': hosts, 'children': children}}
+
+    @staticmethod
+    def unknown(data, limit):
+        """Names in a comma-separated ``--limit`` that are neither a host nor a group of ``data``"""
+        known = set(data['all']['hosts']) | set(data['all']['children']) | {'all'}
+        names = [name.strip() for name in limit.split(',') if name.strip()]
+        # Patterns (wildcards, regexes, exclusions) are left to Ansible
+        return [name for name in names if name not in known and not any(c in name for c in '*?~!&:[')]
+
+    def write(self, data=None):
+        """Write ``data`` (by default a fresh inventory) and return the file's path"""
+        data = json.dumps(data if data is not None else self.build(), indent=2, sort_keys=True)
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Concurrent jobs each write their own temporary file and swap it in
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(temporary, self.path)
+        except Exception:
+            os.unlink(temporary)
+            raise
+        return self.path
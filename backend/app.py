@@ -1,144 +1,478 @@
 import os
-import json
+import atexit
 import time
-import docker
 import threading
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from dotenv import load_dotenv
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import redis
-import subprocess
-import yaml
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram
+from prometheus_client import REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+import db
+from clients import LazyClient, create_docker_client, create_redis_client
+from docker_hosts import DockerHostRegistry, load_hosts, parse_hosts
+from inventory import ContainerInventory
+from stats_collector import StatsCollector
+from stats_scheduler import StatsScheduler
+from stats_stream import StatsStreamManager
+from alert_store import AlertStore
+from ansible_inventory import AnsibleInventory
+from alert_pipeline import AlertPipeline, AlertWriter, parse_time
+from incidents import STORM_SOURCE, IncidentCorrelator
+from metrics_writer import METRIC_FIELDS, MetricsWriter
+from rollups import RollupWorker, parse_range, query_performance
+from jobs import JobQueue, MemoryJobBackend, create_backend
+from playbooks import PlaybookRunner, fact_cache_env, job_room
+from server_actions import ACTIONS, BulkActionRunner, select_containers
+from broadcaster import Broadcaster
+from response_cache import ResponseCache
+from cluster import Cluster, SharedStats
+from serialization import socketio_options
+from instrumentation import (ServerMetricsCollector, init_app as init_instrumentation, monitor_lag, stage,
+                             track_queue)
 
 load_dotenv()
 
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Several instances (gunicorn workers or nodes) sharing Redis: emits go through
+# a Redis message queue, one elected leader runs the monitor and stats
+# collection is sharded between the members
+CLUSTER_MODE = os.getenv('CLUSTER_MODE', 'false').lower() == 'true'
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 CORS(app, origins=["http://localhost:3000", "http://localhost:3001", "http://localhost:3002", "http://localhost:3003"])
-socketio = SocketIO(app, cors_allowed_origins=["http://localhost:3000", "http://localhost:3001", "http://localhost:3002", "http://localhost:3003"])
+# Per-route request count/latency and JSON timing
+init_instrumentation(app)
+socketio = SocketIO(app, cors_allowed_origins=["http://localhost:3000", "http://localhost:3001", "http://localhost:3002", "http://localhost:3003"],
+                    message_queue=REDIS_URL if CLUSTER_MODE else None,
+                    async_mode=os.getenv('SOCKETIO_ASYNC_MODE') or None, **socketio_options())
+
+# Clients connect (and are pinged) on first use, never at import, so a worker
+# can start and answer /health before Docker or Redis is reachable
+CLIENT_RETRY_INTERVAL = float(os.getenv('CLIENT_RETRY_INTERVAL', '5'))
+redis_client = LazyClient(
+    'redis', create_redis_client, REDIS_URL,
+    max_connections=int(os.getenv('REDIS_POOL_SIZE', '50')),
+    pool_timeout=float(os.getenv('REDIS_POOL_TIMEOUT', '5')),
+    socket_timeout=float(os.getenv('REDIS_SOCKET_TIMEOUT', '5')),
+    connect_timeout=float(os.getenv('REDIS_CONNECT_TIMEOUT', '2')),
+    health_check_interval=int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30')),
+    retry_interval=CLIENT_RETRY_INTERVAL
+)
+
+cluster = Cluster(
+    redis_client,
+    ttl=float(os.getenv('CLUSTER_LEASE_TTL', '15')),
+    heartbeat_interval=float(os.getenv('CLUSTER_HEARTBEAT_INTERVAL', '5'))
+) if CLUSTER_MODE else None
+
+# Topic-scoped, delta-encoded broadcasting to subscribed clients
+broadcaster = Broadcaster(
+    socketio,
+    interval=float(os.getenv('BROADCAST_INTERVAL', '1')),
+    store=redis_client if CLUSTER_MODE else None
+)
+broadcaster.register_handlers()
+
+# Short-lived response cache for the polled read endpoints
+response_cache = ResponseCache(enabled=os.getenv('RESPONSE_CACHE', 'true').lower() == 'true')
+CACHE_TTLS = {
+    'servers': float(os.getenv('CACHE_TTL_SERVERS', '5')),
+    'metrics': float(os.getenv('CACHE_TTL_METRICS', '5')),
+    'alerts': float(os.getenv('CACHE_TTL_ALERTS', '2'))
+}
+
+docker_client = LazyClient(
+    'docker', create_docker_client,
+    timeout=int(os.getenv('DOCKER_TIMEOUT', '30')),
+    max_pool_size=int(os.getenv('DOCKER_POOL_SIZE', '32')),
+    retry_interval=CLIENT_RETRY_INTERVAL
+)
+
+# Containers listed once and kept current from the Docker event stream
+inventory = ContainerInventory(docker_client)
+inventory.add_listener(lambda action, container_id, container: response_cache.invalidate('servers', 'metrics'))
+
+# Remote Docker daemons, polled concurrently with per-host timeouts and circuit breakers;
+# their containers are merged into /api/servers labelled with the host name
+LOCAL_HOST_NAME = os.getenv('LOCAL_DOCKER_HOST_NAME', 'local')
+docker_hosts = DockerHostRegistry(
+    (load_hosts(os.environ['DOCKER_HOSTS_FILE']) if os.getenv('DOCKER_HOSTS_FILE') else [])
+    + parse_hosts(os.getenv('DOCKER_HOSTS', '')),
+    interval=float(os.getenv('DOCKER_HOSTS_INTERVAL', '15')),
+    timeout=float(os.getenv('DOCKER_HOSTS_TIMEOUT', '10')),
+    pool_size=int(os.getenv('DOCKER_HOSTS_POOL_SIZE', '10')),
+    failure_threshold=int(os.getenv('DOCKER_HOSTS_FAILURE_THRESHOLD', '3')),
+    reset_timeout=float(os.getenv('DOCKER_HOSTS_RESET_TIMEOUT', '30'))
+)
+docker_hosts.add_listener(lambda: response_cache.invalidate('servers'))
+
+# Shared container stats snapshot, collected concurrently in the background
+stats_collector = StatsCollector(
+    docker_client,
+    max_workers=int(os.getenv('STATS_WORKERS', '16')),
+    interval=int(os.getenv('STATS_INTERVAL', '10')),
+    owns=cluster.owns if cluster else None,
+    inventory=inventory
+)
+
+# Where the API and monitor read samples: the local collector, or every member's samples in Redis
+if cluster:
+    stats_source = SharedStats(redis_client, max_age=float(os.getenv('CLUSTER_STATS_MAX_AGE', '30')))
+    stats_collector.add_listener(stats_source.record_sample)
+else:
+    stats_source = stats_collector
+
+# Long-lived per-container stats streams ('stream') or adaptively scheduled one-shot polling ('poll')
+STATS_MODE = os.getenv('STATS_MODE', 'stream')
+stats_streams = StatsStreamManager(docker_client, stats_collector, inventory=inventory)
+
+# Indexed alert storage with size and age based retention
+alert_store = AlertStore(
+    redis_client,
+    max_alerts=int(os.getenv('ALERT_MAX_COUNT', '10000')),
+    max_age=int(os.getenv('ALERT_RETENTION_DAYS', '30')) * 86400
+)
+
+# Repeated alerts fold into open incidents per source and type; a type firing on many
+# sources at once becomes a single storm incident
+ALERT_CORRELATION = os.getenv('ALERT_CORRELATION', 'true').lower() == 'true'
+incident_correlator = IncidentCorrelator(
+    window=float(os.getenv('ALERT_CORRELATION_WINDOW', '300')),
+    storm_threshold=int(os.getenv('ALERT_STORM_THRESHOLD', '10'))
+) if ALERT_CORRELATION else None
+
+# Alert changes are queued and applied in batches: Redis index, client events, then Postgres history
+ALERT_PERSISTENCE = os.getenv('ALERT_PERSISTENCE', 'true').lower() == 'true'
+alert_pipeline = AlertPipeline(
+    alert_store,
+    writer=AlertWriter(
+        batch_size=int(os.getenv('ALERT_BATCH_SIZE', '1000')),
+        flush_interval=float(os.getenv('ALERT_FLUSH_INTERVAL', '2'))
+    ) if ALERT_PERSISTENCE else None,
+    correlator=incident_correlator
+)
+
+def alert_changed(event, payload):
+    response_cache.invalidate('alerts')
+    broadcaster.publish_event('alerts', event, payload)
+
+alert_pipeline.add_listener(alert_changed)
+
+# Buffered, batched persistence of container samples into Postgres
+METRICS_PERSISTENCE = os.getenv('METRICS_PERSISTENCE', 'true').lower() == 'true'
+metrics_writer = MetricsWriter(
+    max_buffer=int(os.getenv('METRICS_BUFFER_SIZE', '100000')),
+    batch_size=int(os.getenv('METRICS_BATCH_SIZE', '5000')),
+    flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+)
+if METRICS_PERSISTENCE:
+    stats_collector.add_listener(metrics_writer.record_sample)
+
+# 1m/5m/1h rollups backing /api/performance
+rollup_worker = RollupWorker(
+    interval=int(os.getenv('ROLLUP_INTERVAL', '60')),
+    raw_retention=int(os.getenv('METRICS_RAW_RETENTION_DAYS', '0')) * 86400,
+    # Singleton work: only the cluster leader rolls up and prunes raw samples
+    active=lambda: not cluster or cluster.is_leader
+)
+
+def create_rule_engine():
+    """Vectorized alert rules with deduplication, hysteresis and flap suppression"""
+    from history_store import HistoryStore
+    from rules import DEFAULT_RULES, Rule, RuleEngine, load_rules
+
+    rules = (load_rules(os.environ['ALERT_RULES_FILE']) if os.getenv('ALERT_RULES_FILE')
+             else [Rule(**rule) for rule in DEFAULT_RULES])
+    window = max([int(os.getenv('ALERT_RULES_WINDOW', '30'))] + [rule.window for rule in rules])
+
+    # In-memory per-container history, one tick per monitor loop, shared by the rule engine and the history API
+    store = HistoryStore(
+        sorted(set(METRIC_FIELDS) | {rule.metric for rule in rules}),
+        size=max(int(os.getenv('HISTORY_SIZE', '720')), window),
+        mirror=window
+    )
+    return RuleEngine(rules, window=window, store=store)
+
+# Both are NumPy-backed and built on first use, so importing the app does not load NumPy
+rule_engine = LazyClient('rule engine', create_rule_engine)
+history_store = LazyClient('history store', lambda: rule_engine.store)
+
+# Poll mode: every container on its own interval, shorter near thresholds or with an
+# open alert and longer while stable, within a global budget of Docker stats calls
+STATS_MAX_INTERVAL = float(os.getenv('STATS_MAX_INTERVAL', '60'))
+if cluster:
+    # Samples older than CLUSTER_STATS_MAX_AGE drop out of the shared view
+    STATS_MAX_INTERVAL = min(STATS_MAX_INTERVAL, stats_source.max_age / 2)
+stats_scheduler = StatsScheduler(
+    stats_collector,
+    interval=float(os.getenv('STATS_INTERVAL', '10')),
+    min_interval=float(os.getenv('STATS_MIN_INTERVAL', '2')),
+    max_interval=STATS_MAX_INTERVAL,
+    budget=float(os.getenv('STATS_BUDGET', '20')),
+    max_workers=int(os.getenv('STATS_WORKERS', '16')),
+    hot=lambda name, sample: rule_engine.near(name, sample, margin=float(os.getenv('STATS_HOT_MARGIN', '0.9'))),
+    stable_delta=float(os.getenv('STATS_STABLE_DELTA', '2'))
+)
+
+# Bounded, persistent queue for Ansible deployments and auto-heal runs; jobs are kept
+# in-process while Redis is down and handed over once it answers again
+job_queue = JobQueue(
+    lambda: create_backend(redis_client, history_size=int(os.getenv('JOB_HISTORY_SIZE', '500'))),
+    fallback=MemoryJobBackend(history_size=int(os.getenv('JOB_HISTORY_SIZE', '500'))),
+    retry_interval=float(os.getenv('JOB_BACKEND_RETRY_INTERVAL', '30')),
+    concurrency=int(os.getenv('JOB_CONCURRENCY', '2')),
+    # Start/stop/restart get their own workers so they never wait behind running playbooks
+    pools={'actions': int(os.getenv('SERVER_ACTION_CONCURRENCY', '2'))},
+    retry_backoff=float(os.getenv('JOB_RETRY_BACKOFF', '10')),
+    heartbeat_interval=float(os.getenv('JOB_HEARTBEAT_INTERVAL', '15')),
+    lease=float(os.getenv('JOB_LEASE', '60'))
+)
+ANSIBLE_DIR = os.getenv('ANSIBLE_DIR', '/app/ansible')
+# Per attempt; also bounds how long an identical heal or deploy is deduplicated
+HEAL_TIMEOUT = float(os.getenv('HEAL_TIMEOUT', '120'))
+DEPLOY_TIMEOUT = float(os.getenv('DEPLOY_TIMEOUT', '300'))
 
-# Initialize Docker client
-docker_client = docker.from_env()
+# Playbook output is streamed to per-job rooms and size-capped log files; facts are
+# cached between runs and only gathered again once older than ANSIBLE_FACT_CACHE_TTL
+playbook_runner = PlaybookRunner(
+    ANSIBLE_DIR,
+    os.getenv('JOB_LOG_DIR', '/app/logs/jobs'),
+    socketio.emit,
+    max_log_bytes=int(os.getenv('JOB_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    env=fact_cache_env(
+        os.getenv('ANSIBLE_FACT_CACHE', 'jsonfile'),
+        ttl=int(os.getenv('ANSIBLE_FACT_CACHE_TTL', '3600')),
+        path=os.getenv('ANSIBLE_FACT_CACHE_DIR', '/app/logs/ansible_facts'),
+        redis_url=REDIS_URL
+    )
+)
 
-# Initialize Redis client
-redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+# Inventory generated from the running containers (local and remote) plus the static inventory.ini
+ansible_inventory = AnsibleInventory(
+    inventory,
+    os.getenv('ANSIBLE_INVENTORY_PATH', '/tmp/ansible/inventory.json'),
+    docker_hosts=docker_hosts,
+    static_path=os.path.join(ANSIBLE_DIR, 'inventory.ini'),
+    local_name=LOCAL_HOST_NAME,
+    groups_label=os.getenv('ANSIBLE_GROUPS_LABEL', 'autoguard.ansible.groups')
+)
 
-# Prometheus metrics
-request_count = Counter('api_requests_total', 'Total API requests', ['method', 'endpoint'])
-request_duration = Histogram('api_request_duration_seconds', 'API request duration')
-server_cpu_usage = Gauge('server_cpu_usage_percent', 'Server CPU usage percentage', ['server'])
-server_memory_usage = Gauge('server_memory_usage_percent', 'Server memory usage percentage', ['server'])
+class UnknownHosts(Exception):
+    """A playbook run was limited to hosts the inventory does not have"""
 
-# Database connection
-def get_db_connection():
+def playbook_inventory(limit=None):
+    """Path of a freshly generated inventory, or the static one if it cannot be generated
+
+    Raises UnknownHosts if ``limit`` names hosts the inventory does not
+    have, instead of leaving ansible-playbook to fail with "no hosts matched".
+    """
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'postgres'),
-            database=os.getenv('DB_NAME', 'monitoring_db'),
-            user=os.getenv('DB_USER', 'devops_user'),
-            password=os.getenv('DB_PASSWORD', 'secure_password123'),
-            port=os.getenv('DB_PORT', '5432')
-        )
-        return conn
+        data = ansible_inventory.build()
     except Exception as e:
-        print(f"Database connection error: {e}")
+        print(f"Ansible inventory error (using inventory.ini): {e}")
         return None
+    unknown = ansible_inventory.unknown(data, limit) if limit else []
+    if unknown:
+        raise UnknownHosts(f"Not in the Ansible inventory: {', '.join(unknown)}")
+    return ansible_inventory.write(data)
+
+# Start/stop/restart run as jobs, several containers at a time
+action_runner = BulkActionRunner(
+    docker_client,
+    socketio.emit,
+    parallelism=int(os.getenv('SERVER_ACTION_PARALLELISM', '8')),
+    stop_timeout=int(os.getenv('SERVER_ACTION_STOP_TIMEOUT', '10'))
+)
+
+MONITORING_INTERVAL = float(os.getenv('MONITORING_INTERVAL', '5'))
+
+# Per-server Prometheus series, built from the latest samples on each scrape (request
+# and stage timings are in instrumentation.py)
+def server_samples():
+    local = [dict(sample, host=LOCAL_HOST_NAME) for sample in stats_source.snapshot().values()]
+    return local + docker_hosts.samples()
+
+REGISTRY.register(ServerMetricsCollector(
+    server_samples,
+    ttl=float(os.getenv('SERVER_METRICS_TTL', '120')),
+    max_series=int(os.getenv('SERVER_METRICS_MAX_SERIES', '1000'))
+))
 
 # Health check endpoint
 @app.route('/health')
 def health():
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
 
+# Readiness: Docker, Redis and (when persistence is on) Postgres answer
+@app.route('/health/ready')
+def ready():
+    checks = {'docker': lambda: docker_client.ping(), 'redis': lambda: redis_client.ping()}
+    if METRICS_PERSISTENCE or ALERT_PERSISTENCE:
+        checks['postgres'] = db.check
+    results = {}
+    for name, check in checks.items():
+        try:
+            check()
+            results[name] = 'ok'
+        except Exception as e:
+            results[name] = str(e).strip()
+    is_ready = all(result == 'ok' for result in results.values())
+    return jsonify({
+        'status': 'ready' if is_ready else 'unavailable',
+        'checks': results,
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200 if is_ready else 503
+
 # API Routes
 @app.route('/api/servers', methods=['GET'])
+@response_cache.cached('servers', CACHE_TTLS['servers'])
 def get_servers():
-    request_count.labels(method='GET', endpoint='/api/servers').inc()
-    
     try:
+        host = request.args.get('host')
         servers = []
-        containers = docker_client.containers.list(all=True)
+        errors = {}
+        local = []
+        if host in (None, LOCAL_HOST_NAME):
+            # An unreachable local daemon should not hide the remote hosts
+            try:
+                local = inventory.containers()
+            except Exception as e:
+                errors[LOCAL_HOST_NAME] = str(e)
         
-        for container in containers:
-            stats = container.stats(stream=False) if container.status == 'running' else None
+        for container in local:
+            usage = stats_source.get(container.id) if container.status == 'running' else None
             
             server_info = {
                 'id': container.id[:12],
                 'name': container.name,
                 'status': container.status,
-                'image': container.image.tags[0] if container.image.tags else 'unknown',
+                'image': inventory.image_tag(container),
                 'created': container.attrs['Created'],
                 'ports': container.attrs.get('NetworkSettings', {}).get('Ports', {}),
-                'networks': list(container.attrs.get('NetworkSettings', {}).get('Networks', {}).keys())
+                'networks': list(container.attrs.get('NetworkSettings', {}).get('Networks', {}).keys()),
+                'host': LOCAL_HOST_NAME
             }
             
-            if stats and container.status == 'running':
-                # Calculate CPU usage
-                cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-                system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
-                cpu_usage = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100
-                
-                # Calculate memory usage
-                memory_usage = (stats['memory_stats']['usage'] / stats['memory_stats']['limit']) * 100
-                
+            if usage:
                 server_info.update({
-                    'cpu_usage': round(cpu_usage, 2),
-                    'memory_usage': round(memory_usage, 2),
-                    'memory_limit': stats['memory_stats']['limit'],
-                    'network_rx': stats['networks']['eth0']['rx_bytes'] if 'networks' in stats else 0,
-                    'network_tx': stats['networks']['eth0']['tx_bytes'] if 'networks' in stats else 0
+                    'cpu_usage': usage['cpu_usage'],
+                    'memory_usage': usage['memory_usage'],
+                    'memory_limit': usage['memory_limit'],
+                    'network_rx': usage['network_rx'],
+                    'network_tx': usage['network_tx'],
+                    'stats_timestamp': datetime.utcfromtimestamp(usage['timestamp']).isoformat()
                 })
-                
-                # Update Prometheus metrics
-                server_cpu_usage.labels(server=container.name).set(cpu_usage)
-                server_memory_usage.labels(server=container.name).set(memory_usage)
             
             servers.append(server_info)
         
-        return jsonify({'servers': servers})
+        # Remote hosts: their last successful listing, never a blocking call
+        servers.extend(docker_hosts.servers(host))
+        errors.update({status['name']: status['error'] for status in docker_hosts.status()
+                       if status['error'] and host in (None, status['name'])})
+        
+        response = {'servers': servers}
+        if errors:
+            response['errors'] = errors
+        return jsonify(response)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/hosts', methods=['GET'])
+def get_hosts():
+    """Docker hosts with their breaker state, last refresh and error"""
+    try:
+        local = {'name': LOCAL_HOST_NAME, 'url': os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock'),
+                 'state': 'closed', 'error': None}
+        try:
+            local['containers'] = inventory.count()
+        except Exception as e:
+            local.update(state='unavailable', error=str(e))
+        return jsonify({'hosts': [local] + docker_hosts.status()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/servers/<server_id>/action', methods=['POST'])
 def server_action(server_id):
-    request_count.labels(method='POST', endpoint='/api/servers/action').inc()
-    
     try:
         action = request.json.get('action')
-        container = docker_client.containers.get(server_id)
+        if action not in ACTIONS:
+            return jsonify({'error': 'Invalid action'}), 400
+        
+        container = inventory.get(server_id)
+        if container is None:
+            return jsonify({'error': 'Server not found'}), 404
+        
+        # Docker may wait out the stop timeout; run it off the request
+        job, _ = job_queue.submit('server_action', {'action': action, 'containers': [container.id]})
         
-        if action == 'start':
-            container.start()
-        elif action == 'stop':
-            container.stop()
-        elif action == 'restart':
-            container.restart()
-        else:
+        return jsonify({'success': True, 'action': action, 'job_id': job['id']}), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/actions', methods=['POST'])
+def bulk_server_action():
+    try:
+        data = request.json or {}
+        action = data.get('action')
+        if action not in ACTIONS:
             return jsonify({'error': 'Invalid action'}), 400
+        if not data.get('ids') and not data.get('selector'):
+            return jsonify({'error': 'ids or selector is required'}), 400
+        parallelism = data.get('parallelism')
+        if parallelism is not None and (not isinstance(parallelism, int) or parallelism < 1):
+            return jsonify({'error': 'parallelism must be a positive integer'}), 400
         
-        # Emit real-time update
-        socketio.emit('server_action', {
-            'server_id': server_id,
+        containers, missing = select_containers(inventory, ids=data.get('ids'), selector=data.get('selector'))
+        if missing:
+            return jsonify({'error': 'Server not found', 'missing': missing}), 404
+        if not containers:
+            return jsonify({'error': 'No servers match the selector'}), 404
+        
+        job, _ = job_queue.submit('server_action', {
             'action': action,
-            'timestamp': datetime.utcnow().isoformat()
+            'containers': [container.id for container in containers],
+            'parallelism': parallelism
         })
         
-        return jsonify({'success': True, 'action': action})
+        return jsonify({
+            'success': True,
+            'action': action,
+            'job_id': job['id'],
+            'servers': [container.id[:12] for container in containers]
+        }), 202
     
-    except docker.errors.NotFound:
-        return jsonify({'error': 'Server not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<server_id>/history', methods=['GET'])
+def get_server_history(server_id):
+    try:
+        time_range = request.args.get('range')
+        since = time.time() - parse_range(time_range) if time_range else None
+        
+        container = inventory.get(server_id)
+        if container is None:
+            return jsonify({'error': 'Server not found'}), 404
+        history = [
+            dict(sample, timestamp=datetime.utcfromtimestamp(sample['timestamp']).isoformat())
+            for sample in history_store.history(container.name, since=since)
+        ]
+        return jsonify({'server_id': server_id, 'interval': MONITORING_INTERVAL, 'history': history})
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/deployments', methods=['GET'])
 def get_deployments():
-    request_count.labels(method='GET', endpoint='/api/deployments').inc()
-    
     # Mock deployment data - in a real scenario, this would come from a database
     deployments = [
         {
@@ -167,228 +501,183 @@ def get_deployments():
 
 @app.route('/api/deployments', methods=['POST'])
 def create_deployment():
-    request_count.labels(method='POST', endpoint='/api/deployments').inc()
-    
     try:
         deployment_data = request.json
         
-        # Run deployment using Ansible
-        playbook_path = '/app/ansible/deploy.yml'
-        inventory_path = '/app/ansible/inventory.ini'
+        # Queue deployment; it runs once a job worker is free
+        job, _ = job_queue.submit('deploy', deployment_data)
         
-        cmd = [
-            'ansible-playbook',
-            '-i', inventory_path,
-            playbook_path,
-            '--extra-vars', json.dumps(deployment_data)
-        ]
-        
-        # Start deployment in background
-        def run_deployment():
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-                
-                # Emit deployment result
-                socketio.emit('deployment_complete', {
-                    'status': 'success' if result.returncode == 0 else 'failed',
-                    'output': result.stdout,
-                    'error': result.stderr,
-                    'timestamp': datetime.utcnow().isoformat()
-                })
-                
-            except subprocess.TimeoutExpired:
-                socketio.emit('deployment_complete', {
-                    'status': 'failed',
-                    'error': 'Deployment timed out',
-                    'timestamp': datetime.utcnow().isoformat()
-                })
-        
-        thread = threading.Thread(target=run_deployment)
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({'success': True, 'message': 'Deployment started'})
+        return jsonify({'success': True, 'message': 'Deployment queued', 'job_id': job['id']})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/alerts', methods=['GET'])
+@response_cache.cached('alerts', CACHE_TTLS['alerts'])
 def get_alerts():
-    request_count.labels(method='GET', endpoint='/api/alerts').inc()
-    
     try:
-        # Get alerts from Redis cache
-        alerts_data = redis_client.get('alerts')
-        if alerts_data:
-            alerts = json.loads(alerts_data)
-        else:
-            alerts = []
+        resolved = request.args.get('resolved')
+        try:
+            limit = min(int(request.args.get('limit', 50)), 500)
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'limit and offset must be integers'}), 400
+        
+        # ?range=24h, or explicit ?since=/&until= as epoch seconds or ISO 8601
+        time_range = request.args.get('range')
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = time.time() - parse_range(time_range) if time_range else parse_time(since) if since else None
+        until = parse_time(until) if until else None
+        
+        # Older ranges than Redis still holds are answered from the Postgres history
+        alerts, total = alert_pipeline.list(
+            source=request.args.get('source'),
+            alert_type=request.args.get('type'),
+            resolved=None if resolved is None else resolved.lower() in ('1', 'true', 'yes'),
+            offset=offset,
+            limit=limit,
+            since=since,
+            until=until
+        )
         
-        return jsonify({'alerts': alerts})
+        return jsonify({'alerts': alerts, 'total': total, 'limit': limit, 'offset': offset})
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/alerts', methods=['POST'])
 def create_alert():
-    request_count.labels(method='POST', endpoint='/api/alerts').inc()
-    
     try:
         alert_data = request.json
-        alert_data['id'] = int(time.time() * 1000)  # Simple ID generation
         alert_data['timestamp'] = datetime.utcnow().isoformat()
         alert_data['resolved'] = False
         
-        # Store in Redis
-        alerts_data = redis_client.get('alerts')
-        alerts = json.loads(alerts_data) if alerts_data else []
-        alerts.insert(0, alert_data)
-        
-        # Keep only last 100 alerts
-        alerts = alerts[:100]
-        redis_client.set('alerts', json.dumps(alerts))
-        
-        # Emit real-time alert
-        socketio.emit('new_alert', alert_data)
+        # Stored, persisted and emitted (with its ID) by the alert pipeline
+        alert_pipeline.fire(alert_data)
         
-        return jsonify({'success': True, 'alert': alert_data})
+        return jsonify({'success': True, 'queued': True, 'alert': alert_data}), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/alerts/<int:alert_id>/resolve', methods=['POST'])
 def resolve_alert(alert_id):
-    request_count.labels(method='POST', endpoint='/api/alerts/resolve').inc()
-    
     try:
-        alerts_data = redis_client.get('alerts')
-        alerts = json.loads(alerts_data) if alerts_data else []
-        
-        for alert in alerts:
-            if alert['id'] == alert_id:
-                alert['resolved'] = True
-                alert['resolved_at'] = datetime.utcnow().isoformat()
-                break
-        
-        redis_client.set('alerts', json.dumps(alerts))
+        # Applied and emitted by the alert pipeline; alerts that have aged out of Redis are resolved in Postgres
+        alert_pipeline.resolve(alert_id)
         
-        # Emit alert resolved event
-        socketio.emit('alert_resolved', alert_id)
-        
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'queued': True}), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ansible/inventory', methods=['GET'])
+def get_ansible_inventory():
+    """The inventory playbooks run against"""
+    try:
+        return jsonify(ansible_inventory.build())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/incidents', methods=['GET'])
+def get_incidents():
+    """Open incidents with their occurrence counts"""
+    if incident_correlator is None:
+        return jsonify({'error': 'Alert correlation is disabled'}), 404
+    return jsonify(incident_correlator.report())
+
 @app.route('/api/alerts/<int:alert_id>/auto-heal', methods=['POST'])
 def auto_heal_alert(alert_id):
-    request_count.labels(method='POST', endpoint='/api/alerts/auto-heal').inc()
-    
     try:
-        alerts_data = redis_client.get('alerts')
-        alerts = json.loads(alerts_data) if alerts_data else []
-        
-        alert = next((a for a in alerts if a['id'] == alert_id), None)
+        alert = alert_store.get(alert_id)
         if not alert:
             return jsonify({'error': 'Alert not found'}), 404
         
-        # Run auto-healing playbook
-        playbook_path = '/app/ansible/auto-heal.yml'
-        inventory_path = '/app/ansible/inventory.ini'
-        
-        cmd = [
-            'ansible-playbook',
-            '-i', inventory_path,
-            playbook_path,
-            '--extra-vars', json.dumps({
-                'alert_id': alert_id,
-                'alert_type': alert.get('type', 'unknown'),
-                'server': alert.get('source', 'unknown')
-            })
-        ]
+        # Queue auto-healing; identical heals already in flight are reused. A storm incident
+        # is healed in one run across all of its sources
+        server = ','.join(alert['sources']) if alert.get('sources') else alert.get('source', 'unknown')
+        alert_type = alert.get('type', 'unknown')
+        try:
+            playbook_inventory(server)
+        except UnknownHosts as e:
+            return jsonify({'error': f'Cannot auto-heal alert {alert_id}: {e}'}), 400
+        job, created = job_queue.submit(
+            'heal',
+            {'alert_id': alert_id, 'alert_type': alert_type, 'server': server},
+            dedup_key=f'heal:{server}:{alert_type}'
+        )
         
-        def run_auto_heal():
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-                
-                if result.returncode == 0:
-                    # Mark alert as resolved
-                    alert['resolved'] = True
-                    alert['resolved_at'] = datetime.utcnow().isoformat()
-                    alert['auto_healed'] = True
-                    redis_client.set('alerts', json.dumps(alerts))
-                    
-                    socketio.emit('alert_resolved', alert_id)
-                    socketio.emit('auto_heal_complete', {
-                        'alert_id': alert_id,
-                        'status': 'success',
-                        'message': 'Auto-healing completed successfully'
-                    })
-                else:
-                    socketio.emit('auto_heal_complete', {
-                        'alert_id': alert_id,
-                        'status': 'failed',
-                        'message': 'Auto-healing failed',
-                        'error': result.stderr
-                    })
-                    
-            except subprocess.TimeoutExpired:
-                socketio.emit('auto_heal_complete', {
-                    'alert_id': alert_id,
-                    'status': 'failed',
-                    'message': 'Auto-healing timed out'
-                })
+        return jsonify({
+            'success': True,
+            'message': 'Auto-healing queued' if created else 'Auto-healing already in progress',
+            'job_id': job['id']
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        offset = int(request.args.get('offset', 0))
+        jobs, total = job_queue.history(offset=offset, limit=limit)
         
-        thread = threading.Thread(target=run_auto_heal)
-        thread.daemon = True
-        thread.start()
+        return jsonify({'jobs': jobs, 'total': total, 'queued': job_queue.depth(), 'limit': limit, 'offset': offset})
+    
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
         
-        return jsonify({'success': True, 'message': 'Auto-healing started'})
+        return jsonify({'job': job})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>/log', methods=['GET'])
+def get_job_log(job_id):
+    # Job IDs are hex strings; anything else cannot name a log file
+    if not job_id.isalnum():
+        return jsonify({'error': 'Job not found'}), 404
+    
+    path = playbook_runner.log_path(job_id)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Log not found'}), 404
+    
+    # conditional=True answers Range requests with 206 partial content
+    return send_file(path, mimetype='text/plain', conditional=True, etag=False)
+
 @app.route('/api/metrics', methods=['GET'])
+@response_cache.cached('metrics', CACHE_TTLS['metrics'])
 def get_metrics():
-    request_count.labels(method='GET', endpoint='/api/metrics').inc()
-    
     try:
         # Collect system metrics
-        containers = docker_client.containers.list(filters={'status': 'running'})
+        online = inventory.count('running')
         
         metrics = {
-            'total_servers': len(docker_client.containers.list(all=True)),
-            'online_servers': len(containers),
+            'total_servers': inventory.count(),
+            'online_servers': online,
             'timestamp': datetime.utcnow().isoformat(),
-            'system_health': 'healthy' if len(containers) > 0 else 'degraded'
+            'system_health': 'healthy' if online > 0 else 'degraded'
         }
         
         # Calculate average CPU and memory usage
-        if containers:
-            total_cpu = 0
-            total_memory = 0
-            
-            for container in containers:
-                try:
-                    stats = container.stats(stream=False)
-                    
-                    # CPU calculation
-                    cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-                    system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
-                    cpu_usage = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100
-                    
-                    # Memory calculation
-                    memory_usage = (stats['memory_stats']['usage'] / stats['memory_stats']['limit']) * 100
-                    
-                    total_cpu += cpu_usage
-                    total_memory += memory_usage
-                    
-                except Exception:
-                    continue
-            
+        snapshot = stats_source.snapshot()
+        if snapshot:
             metrics.update({
-                'avg_cpu_usage': round(total_cpu / len(containers), 2),
-                'avg_memory_usage': round(total_memory / len(containers), 2)
+                'avg_cpu_usage': round(sum(s['cpu_usage'] for s in snapshot.values()) / len(snapshot), 2),
+                'avg_memory_usage': round(sum(s['memory_usage'] for s in snapshot.values()) / len(snapshot), 2)
             })
         
         return jsonify(metrics)
@@ -396,11 +685,123 @@ def get_metrics():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats/schedule', methods=['GET'])
+def get_stats_schedule():
+    """Target versus achieved per-container sampling intervals of the poll scheduler"""
+    try:
+        report = stats_scheduler.report(detail=request.args.get('detail', 'false').lower() == 'true')
+        return jsonify(dict(report, mode=STATS_MODE))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/performance', methods=['GET'])
+def get_performance():
+    try:
+        range_seconds = parse_range(request.args.get('range', '1h'))
+        min_points = min(int(request.args.get('points', 60)), 1000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        performance = query_performance(
+            range_seconds,
+            metric=request.args.get('metric', 'cpu_usage'),
+            server=request.args.get('server'),
+            min_points=min_points
+        )
+        performance['range'] = request.args.get('range', '1h')
+        return jsonify(performance)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/metrics')
 def prometheus_metrics():
     """Prometheus metrics endpoint"""
     return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
+# Job handlers
+def run_deployment(job):
+    return playbook_runner.run(job['id'], 'deploy.yml', job['payload'], timeout=job.get('timeout') or DEPLOY_TIMEOUT,
+                               inventory=playbook_inventory(job['payload'].get('limit')),
+                               limit=job['payload'].get('limit'))
+
+def run_auto_heal(job):
+    # Only the affected host(s); a storm incident's server is a comma-separated list
+    return playbook_runner.run(job['id'], 'auto-heal.yml', job['payload'], timeout=job.get('timeout') or HEAL_TIMEOUT,
+                               inventory=playbook_inventory(job['payload']['server']), limit=job['payload']['server'])
+
+def run_server_action(job):
+    payload = job['payload']
+    return action_runner.run(job['id'], payload['action'], payload['containers'], payload.get('parallelism'))
+
+def server_action_finished(job):
+    response_cache.invalidate('servers', 'metrics')
+    
+    for result in (job['result'] or {}).get('results', []):
+        if result['status'] == 'succeeded':
+            broadcaster.publish_event('servers', 'server_action', {
+                'server_id': result['container_id'],
+                'action': result['action'],
+                'timestamp': datetime.utcnow().isoformat()
+            })
+
+def deployment_finished(job):
+    broadcaster.publish_event('jobs', 'deployment_complete', {
+        'job_id': job['id'],
+        'status': 'success' if job['status'] == 'succeeded' else 'failed',
+        'output': '\n'.join((job['result'] or {}).get('tail', [])),
+        'log_url': f"/api/jobs/{job['id']}/log",
+        'error': job['error'] or '',
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+def auto_heal_finished(job):
+    alert_id = job['payload']['alert_id']
+    
+    if job['status'] == 'succeeded':
+        # Mark alert as resolved
+        alert_pipeline.resolve(alert_id, auto_healed=True)
+        
+        broadcaster.publish_event('alerts', 'auto_heal_complete', {
+            'alert_id': alert_id,
+            'job_id': job['id'],
+            'status': 'success',
+            'message': 'Auto-healing completed successfully'
+        })
+    else:
+        broadcaster.publish_event('alerts', 'auto_heal_complete', {
+            'alert_id': alert_id,
+            'job_id': job['id'],
+            'status': 'failed',
+            'message': 'Auto-healing failed',
+            'error': job['error']
+        })
+
+def job_updated(job):
+    broadcaster.publish_event('jobs', 'job_update', {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'error': job['error']
+    })
+
+# Heals run ahead of deployments and are retried with backoff
+job_queue.register('heal', run_auto_heal, priority=0, timeout=HEAL_TIMEOUT,
+                   max_retries=int(os.getenv('HEAL_MAX_RETRIES', '2')), on_finish=auto_heal_finished)
+job_queue.register('deploy', run_deployment, priority=10, timeout=DEPLOY_TIMEOUT,
+                   max_retries=int(os.getenv('DEPLOY_MAX_RETRIES', '0')), on_finish=deployment_finished)
+job_queue.register('server_action', run_server_action, priority=5, on_finish=server_action_finished, pool='actions')
+job_queue.add_listener(job_updated)
+
+# Backlogs reported on /metrics at scrape time
+track_queue('jobs', job_queue.depth)
+track_queue('metrics_writer', metrics_writer.pending)
+track_queue('alerts', alert_pipeline.pending)
+if alert_pipeline.writer:
+    track_queue('alert_writer', alert_pipeline.writer.pending)
+
 # WebSocket events
 @socketio.on('connect')
 def handle_connect():
@@ -411,86 +812,184 @@ def handle_connect():
 def handle_disconnect():
     print('Client disconnected')
 
+@socketio.on('join_job')
+def handle_join_job(data):
+    """Subscribe to a job's live output"""
+    join_room(job_room(data.get('job_id')))
+
+@socketio.on('leave_job')
+def handle_leave_job(data):
+    leave_room(job_room(data.get('job_id')))
+
 def monitor_system():
     """Background task to monitor system and emit real-time updates"""
+    scheduled = time.time()
     while True:
+        # Lag: how far behind schedule this tick starts (slow ticks, starved threads)
+        started = time.time()
+        monitor_lag.set(max(0.0, started - scheduled))
+        scheduled = started + MONITORING_INTERVAL
+        
+        # With several instances only the elected leader evaluates rules and publishes state;
+        # the others just keep the history that their own API requests read
+        if cluster and not cluster.is_leader:
+            try:
+                history_store.append({usage['name']: usage for usage in stats_source.snapshot().values()})
+            except Exception as e:
+                print(f"History update error: {e}")
+            time.sleep(max(0.0, scheduled - time.time()))
+            continue
+        
         try:
-            # Get current metrics
-            containers = docker_client.containers.list(filters={'status': 'running'})
-            
-            metrics = {
-                'total_servers': len(docker_client.containers.list(all=True)),
-                'online_servers': len(containers),
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            # Check for issues and create alerts
-            for container in containers:
-                try:
-                    stats = container.stats(stream=False)
-                    
-                    # CPU calculation
-                    cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-                    system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
-                    cpu_usage = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100
-                    
-                    # Memory calculation
-                    memory_usage = (stats['memory_stats']['usage'] / stats['memory_stats']['limit']) * 100
-                    
-                    # Check thresholds and create alerts
-                    if cpu_usage > 80:
-                        alert = {
-                            'id': int(time.time() * 1000),
-                            'severity': 'critical' if cpu_usage > 90 else 'warning',
-                            'message': f'High CPU usage on {container.name}: {cpu_usage:.1f}%',
-                            'source': container.name,
-                            'timestamp': datetime.utcnow().isoformat(),
-                            'type': 'cpu_high',
-                            'resolved': False
-                        }
-                        
-                        # Store and emit alert
-                        alerts_data = redis_client.get('alerts')
-                        alerts = json.loads(alerts_data) if alerts_data else []
-                        alerts.insert(0, alert)
-                        alerts = alerts[:100]
-                        redis_client.set('alerts', json.dumps(alerts))
-                        
-                        socketio.emit('new_alert', alert)
-                    
-                    if memory_usage > 85:
-                        alert = {
-                            'id': int(time.time() * 1000),
-                            'severity': 'critical' if memory_usage > 95 else 'warning',
-                            'message': f'High memory usage on {container.name}: {memory_usage:.1f}%',
-                            'source': container.name,
-                            'timestamp': datetime.utcnow().isoformat(),
-                            'type': 'memory_high',
-                            'resolved': False
-                        }
-                        
-                        # Store and emit alert
-                        alerts_data = redis_client.get('alerts')
-                        alerts = json.loads(alerts_data) if alerts_data else []
-                        alerts.insert(0, alert)
-                        alerts = alerts[:100]
-                        redis_client.set('alerts', json.dumps(alerts))
-                        
-                        socketio.emit('new_alert', alert)
-                
-                except Exception:
-                    continue
-            
-            # Emit metrics update
-            socketio.emit('metrics_update', metrics)
-            
+            with stage('monitor_tick'):
+                monitor_tick()
         except Exception as e:
             print(f"Monitoring error: {e}")
         
-        time.sleep(30)  # Monitor every 30 seconds
+        time.sleep(max(0.0, scheduled - time.time()))
+
+def monitor_tick():
+    """One monitoring pass: evaluate rules, raise/resolve alerts and publish state"""
+    # Get current metrics
+    metrics = {
+        'total_servers': inventory.count(),
+        'online_servers': inventory.count('running')
+    }
+    
+    # Evaluate alert rules against the latest sample of every container
+    snapshot = stats_source.snapshot()
+    with stage('rules'):
+        rule_engine.observe({usage['name']: usage for usage in snapshot.values()})
+        events = rule_engine.evaluate()
+    
+    with stage('alerts'):
+        for event in events:
+            try:
+                if event['action'] == 'fire':
+                    alert = {
+                        'severity': event['severity'],
+                        'message': event['message'],
+                        'source': event['source'],
+                        'timestamp': datetime.utcnow().isoformat(),
+                        'type': event['type'],
+                        'value': event['value'],
+                        'resolved': False
+                    }
+                    
+                    # Queued; stored, persisted and emitted off the monitor loop
+                    alert_pipeline.fire(alert)
+                else:
+                    alert_pipeline.clear(event['source'], event['type'], auto_resolved=True)
+            
+            except Exception as e:
+                print(f"Alert handling error: {e}")
+    
+    # Publish summary and per-server state; subscribers receive only what changed
+    with stage('publish'):
+        if snapshot:
+            metrics.update({
+                'avg_cpu_usage': round(sum(u['cpu_usage'] for u in snapshot.values()) / len(snapshot), 2),
+                'avg_memory_usage': round(sum(u['memory_usage'] for u in snapshot.values()) / len(snapshot), 2)
+            })
+        broadcaster.publish('summary', metrics)
+        
+        servers = {
+            usage['name']: {'cpu_usage': usage['cpu_usage'], 'memory_usage': usage['memory_usage']}
+            for usage in snapshot.values()
+        }
+        gone = set(broadcaster.snapshot('servers')[0]) - set(servers)
+        broadcaster.publish('servers', servers)
+        if gone:
+            broadcaster.remove('servers', *gone)
+        for usage in snapshot.values():
+            broadcaster.publish(f"server:{usage['name']}", {
+                key: value for key, value in usage.items() if key not in ('name', 'timestamp')
+            })
+        for name in gone:
+            broadcaster.drop_topic(f'server:{name}')
+    
+    # Enforce alert retention
+    with stage('retention'):
+        alert_store.trim()
+
+def restore_alert_state():
+    """Import legacy alerts and mark alerts that are still open in the rule engine"""
+    try:
+        alert_store.import_legacy()
+    except Exception as e:
+        print(f"Legacy alert import error: {e}")
+    
+    # Alerts left open by a previous run should not be raised again
+    try:
+        open_alerts, _ = alert_store.list(resolved=False, limit=alert_store.max_alerts)
+        for alert in open_alerts:
+            for source in alert.get('sources') or [alert.get('source')]:
+                if source != STORM_SOURCE:
+                    rule_engine.mark_open(source, alert.get('type'))
+        if incident_correlator is not None:
+            incident_correlator.restore(open_alerts, time.time())
+    except Exception as e:
+        print(f"Open alert restore error: {e}")
+
+def handle_leadership(is_leader):
+    """Take over or hand off the singleton monitoring work"""
+    if is_leader:
+        # Another leader may have opened or resolved alerts in the meantime
+        rule_engine.reset()
+        restore_alert_state()
+        if METRICS_PERSISTENCE:
+            rollup_worker.start()
+    else:
+        broadcaster.reset()
+
+def handle_membership(members):
+    """Re-shard stats collection when instances join or leave"""
+    print(f"Cluster members: {', '.join(members)}")
+    if STATS_MODE == 'stream':
+        stats_streams.sync()
 
 # Start background monitoring
 def start_monitoring():
+    if cluster:
+        cluster.on_leadership(handle_leadership)
+        cluster.on_membership(handle_membership)
+        # Join before collecting so this instance starts with its own shard only
+        try:
+            cluster.heartbeat()
+        except Exception as e:
+            print(f"Cluster join error: {e}")
+        cluster.start()
+        atexit.register(cluster.leave)
+    else:
+        restore_alert_state()
+    
+    if METRICS_PERSISTENCE or ALERT_PERSISTENCE:
+        # Databases initialized by an older init.sql; retried by the writers if Postgres is not up yet
+        try:
+            db.ensure_schema()
+        except Exception as e:
+            print(f"Database migration error: {e}")
+    
+    if METRICS_PERSISTENCE:
+        metrics_writer.start()
+        if not cluster:
+            rollup_worker.start()
+    
+    try:
+        inventory.start()
+    except Exception as e:
+        # Retried on the next inventory read (monitor tick or request)
+        print(f"Docker inventory error: {e}")
+    
+    if STATS_MODE == 'stream':
+        stats_streams.start()
+    else:
+        stats_scheduler.start()
+    
+    docker_hosts.start()
+    alert_pipeline.start()
+    job_queue.start()
+    
     monitor_thread = threading.Thread(target=monitor_system)
     monitor_thread.daemon = True
     monitor_thread.start()
@@ -0,0 +1,121 @@
+"""
+Local stand-ins for the Docker daemon used by the benchmarks.
+
+FakeDockerClient exposes the subset of the docker SDK the backend uses
+(containers.list/get, container attrs, image tags and one-shot or streaming
+stats) over N synthetic containers, with an optional per-call stats latency
+to mimic the daemon's sampling delay.
+"""
+
+import random
+import time
+
+import docker
+
+
+def synthetic_stats(rng):
+    previous_total = rng.randint(10 ** 9, 10 ** 10)
+    previous_system = rng.randint(10 ** 12, 10 ** 13)
+    return {
+        'cpu_stats': {
+            'cpu_usage': {'total_usage': previous_total + rng.randint(0, 4 * 10 ** 8)},
+            'system_cpu_usage': previous_system + 10 ** 9,
+            'online_cpus': 4
+        },
+        'precpu_stats': {
+            'cpu_usage': {'total_usage': previous_total},
+            'system_cpu_usage': previous_system
+        },
+        'memory_stats': {'usage': rng.randint(10 ** 7, 5 * 10 ** 8), 'limit': 5 * 10 ** 8},
+        'networks': {'eth0': {'rx_bytes': rng.randint(0, 10 ** 9), 'tx_bytes': rng.randint(0, 10 ** 9)}}
+    }
+
+
+class FakeImage:
+    def __init__(self, image_id, tags):
+        self.id = image_id
+        self.tags = tags
+
+
+class FakeContainer:
+    def __init__(self, index, stats_latency=0.0, status='running', seed=0):
+        self.id = f'{index:012x}'.ljust(64, 'f')
+        self.name = f'bench-{index:04d}'
+        self.status = status
+        self.labels = {'app': f'app-{index % 10}', 'tier': 'web' if index % 2 else 'worker'}
+        self.image = FakeImage(f'sha256:{index % 20:064x}', [f'bench/app-{index % 20}:latest'])
+        self.attrs = {
+            'Created': '2024-01-01T00:00:00.000000000Z',
+            'Image': self.image.id,
+            'Config': {'Labels': self.labels},
+            'NetworkSettings': {'Ports': {'80/tcp': None}, 'Networks': {'bench': {}}}
+        }
+        self.stats_latency = stats_latency
+        self._rng = random.Random(seed + index)
+
+    def stats(self, stream=False, decode=False):
+        if stream:
+            return self._stream()
+        time.sleep(self.stats_latency)
+        return synthetic_stats(self._rng)
+
+    def _stream(self):
+        while True:
+            time.sleep(max(self.stats_latency, 1.0))
+            yield synthetic_stats(self._rng)
+
+    def start(self):
+        self.status = 'running'
+
+    def stop(self, timeout=10):
+        self.status = 'exited'
+
+    def restart(self, timeout=10):
+        self.status = 'running'
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self._by_id = {container.id: container for container in containers}
+
+    def list(self, all=False, filters=None, **kwargs):
+        status = (filters or {}).get('status')
+        containers = list(self._by_id.values())
+        if status:
+            return [c for c in containers if c.status == status]
+        if not all:
+            return [c for c in containers if c.status == 'running']
+        return containers
+
+    def get(self, container_id):
+        for full_id, container in self._by_id.items():
+            if full_id.startswith(container_id) or container.name == container_id:
+                return container
+        raise docker.errors.NotFound(f'No such container: {container_id}')
+
+
+class FakeImages:
+    def __init__(self, containers):
+        self._by_id = {container.image.id: container.image for container in containers}
+
+    def get(self, image_id):
+        return self._by_id[image_id]
+
+
+class FakeDockerClient:
+    def __init__(self, count, stats_latency=0.0, stopped_ratio=0.1):
+        stopped_every = int(1 / stopped_ratio) if stopped_ratio else 0
+        containers = [
+            FakeContainer(i, stats_latency, status='exited' if stopped_every and i % stopped_every == 0 else 'running')
+            for i in range(count)
+        ]
+        self.containers = FakeContainers(containers)
+        self.images = FakeImages(containers)
+
+    def events(self, decode=False, since=None, filters=None):
+        while True:
+            time.sleep(3600)
+            yield {}
+
+    def ping(self):
+        return True
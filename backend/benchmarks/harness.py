@@ -0,0 +1,120 @@
+"""
+Timing, reporting and comparison helpers shared by the benchmarks.
+"""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered)))) - 1
+    return ordered[rank]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Latency percentiles in milliseconds plus throughput for one measured run"""
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if count else None,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else None,
+        'rps': round(count / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+def measure(call, requests, concurrency=1, setup=None):
+    """Run ``call(state)`` ``requests`` times over ``concurrency`` threads and summarize
+
+    ``setup()`` creates per-thread state (e.g. a test client); ``call`` returns
+    truthy on success.
+    """
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(_):
+        if not hasattr(local, 'state'):
+            local.state = setup() if setup else None
+        started = time.perf_counter()
+        try:
+            ok = call(local.state)
+        except Exception:
+            ok = False
+        duration = time.perf_counter() - started
+        with lock:
+            latencies.append(duration)
+            if not ok:
+                errors.append(1)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def metadata(options):
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': options
+    }
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def compare(current, baseline, threshold=10.0):
+    """Cases whose p99 latency or throughput regressed by more than ``threshold`` percent
+
+    Cases are matched between runs by name. Returns ``(name, metric, baseline,
+    current, change_pct)`` tuples.
+    """
+    regressions = []
+    for section in ('http', 'socketio', 'serialization', 'startup', 'postgres'):
+        previous = {case['name']: case for case in baseline.get(section, [])}
+        for case in current.get(section, []):
+            old = previous.get(case['name'])
+            if not old:
+                continue
+            for metric, higher_is_better in (('p99_ms', False), ('rps', True), ('messages_per_sec', True),
+                                             ('rows_per_sec', True), ('ops_per_sec', True)):
+                before, after = old.get(metric), case.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                if (change < -threshold) if higher_is_better else (change > threshold):
+                    regressions.append((case['name'], metric, before, after, round(change, 1)))
+    return regressions
@@ -0,0 +1,432 @@
+"""
+Latency and throughput benchmarks for the backend hot paths.
+
+Runs the ``app.py`` and ``simple_app.py`` endpoints in-process against local
+fakes (a stub Docker client with N synthetic containers and fakeredis) and
+reports p50/p99 latency and requests/sec as container and alert counts grow,
+Socket.IO fan-out throughput to M subscribed clients, encode/decode speed of
+the available serializers on API-sized payloads, the time a fresh interpreter
+takes to import ``app.py`` and answer ``/health`` with Docker and Redis
+unreachable and, with ``--postgres``, batched metric writes into a local
+Postgres. Results are saved
+as JSON and can be compared with an earlier run to catch regressions.
+
+Run from the backend directory::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --containers 10,1000 --alerts 1000 --clients 100
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fakes import FakeDockerClient  # noqa: E402
+from benchmarks.harness import compare, measure, metadata, percentile, save_results  # noqa: E402
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+
+def load_apps():
+    """Import both apps with Docker and Redis replaced by local fakes"""
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit('The benchmarks need fakeredis: pip install fakeredis')
+
+    # Keep background work (persistence, broadcast ticks) out of the measurements
+    os.environ.setdefault('METRICS_PERSISTENCE', 'false')
+    os.environ.setdefault('ALERT_PERSISTENCE', 'false')
+    os.environ.setdefault('BROADCAST_INTERVAL', '3600')
+    os.environ.setdefault('STATS_MODE', 'poll')
+    os.environ.setdefault('JOB_LOG_DIR', tempfile.mkdtemp(prefix='bench-jobs-'))
+
+    fake_redis = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    # The app binds its lazy client factories at import
+    with mock.patch('clients.create_docker_client', return_value=FakeDockerClient(0)), \
+            mock.patch('clients.create_redis_client', return_value=fake_redis):
+        import app as backend
+    import simple_app
+
+    return backend, simple_app
+
+
+def use_containers(backend, count, stats_latency):
+    """Point the app at a fresh fake Docker host and warm the stats snapshot"""
+    from inventory import ContainerInventory
+    from stats_collector import StatsCollector
+
+    client = FakeDockerClient(count, stats_latency=stats_latency)
+    backend.docker_client = client
+    backend.inventory = ContainerInventory(client)
+    backend.inventory.start()
+    backend.stats_collector = StatsCollector(client, max_workers=16, inventory=backend.inventory)
+    backend.stats_source = backend.stats_collector
+    backend.stats_collector.refresh()
+    backend.response_cache.invalidate('servers', 'metrics')
+
+
+def use_alerts(backend, count):
+    """Replace the alert history with ``count`` synthetic alerts"""
+    backend.redis_client.flushall()
+    for i in range(count):
+        backend.alert_store.add({
+            'type': ('cpu_high', 'memory_high', 'disk_high')[i % 3],
+            'severity': 'critical' if i % 10 == 0 else 'warning',
+            'message': f'Synthetic alert {i}',
+            'source': f'bench-{i % 50:04d}',
+            'timestamp': datetime.utcnow().isoformat(),
+            'resolved': i % 4 == 0
+        })
+    backend.response_cache.invalidate('alerts')
+
+
+def http_case(flask_app, name, method, path, options, requests=None, body=None):
+    def call(client):
+        path_value = path() if callable(path) else path
+        response = client.open(path_value, method=method, json=body)
+        return response.status_code < 400
+
+    result = measure(call, requests or options.requests, options.concurrency, setup=flask_app.test_client)
+    case = dict(name=name, method=method, concurrency=options.concurrency, **result)
+    print(f"{name:<60} p50 {case['p50_ms']:>9.2f} ms  p99 {case['p99_ms']:>9.2f} ms  "
+          f"{case['rps']:>9.1f} req/s  errors {case['errors']}")
+    return case
+
+
+def bench_http(backend, simple_app, options):
+    cases = []
+
+    for count in options.containers:
+        use_containers(backend, count, options.stats_latency)
+        for cached in (False, True):
+            backend.response_cache.enabled = cached
+            label = f'containers={count} cache={"on" if cached else "off"}'
+            for path in ('/api/servers', '/api/metrics'):
+                cases.append(dict(http_case(backend.app, f'app GET {path} {label}', 'GET', path, options),
+                                  app='app', path=path, containers=count, cache=cached))
+
+    use_containers(backend, min(options.containers), options.stats_latency)
+    backend.response_cache.enabled = False
+    for count in options.alerts:
+        use_alerts(backend, count)
+        label = f'alerts={count}'
+        reads = [
+            ('/api/alerts', '/api/alerts'),
+            ('/api/alerts?source&resolved', '/api/alerts?source=bench-0007&resolved=false'),
+            ('/api/alerts?offset', f'/api/alerts?offset={count // 2}&limit=50')
+        ]
+        for path_name, path in reads:
+            cases.append(dict(http_case(backend.app, f'app GET {path_name} {label}', 'GET', path, options),
+                              app='app', path=path_name, alerts=count))
+
+        new_alert = {'type': 'cpu_high', 'severity': 'warning', 'message': 'Benchmark alert', 'source': 'bench-0001'}
+        cases.append(dict(http_case(backend.app, f'app POST /api/alerts {label}', 'POST', '/api/alerts', options,
+                                    body=new_alert),
+                          app='app', path='/api/alerts', alerts=count))
+
+        alert_ids = itertools.count(1)
+        cases.append(dict(http_case(backend.app, f'app POST /api/alerts/<id>/resolve {label}', 'POST',
+                                    lambda: f'/api/alerts/{next(alert_ids)}/resolve', options),
+                          app='app', path='/api/alerts/<id>/resolve', alerts=count))
+
+    for path in ('/api/servers', '/api/alerts', '/api/metrics'):
+        cases.append(dict(http_case(simple_app.app, f'simple_app GET {path}', 'GET', path, options),
+                          app='simple_app', path=path))
+
+    return cases
+
+
+def bench_socketio(backend, options):
+    """Time delta flushes from the broadcaster to M subscribed test clients
+
+    The test clients receive in-process, so this measures the server side of
+    the fan-out: diffing, serializing and queueing one message per client.
+    """
+    cases = []
+    broadcaster = backend.broadcaster
+    # Let the background tick run its first flush before measuring
+    broadcaster.start()
+    time.sleep(0.1)
+
+    for count in options.clients:
+        # The connect/disconnect handlers log every client
+        with contextlib.redirect_stdout(io.StringIO()):
+            clients = [backend.socketio.test_client(backend.app) for _ in range(count)]
+        for client in clients:
+            client.emit('subscribe', {'topics': ['summary']})
+            client.get_received()
+
+        durations = []
+        started = time.perf_counter()
+        for tick in range(options.rounds):
+            broadcaster.publish('summary', {'tick': tick, 'avg_cpu_usage': tick % 100, 'online_servers': count})
+            flush_started = time.perf_counter()
+            broadcaster.flush()
+            durations.append(time.perf_counter() - flush_started)
+        elapsed = time.perf_counter() - started
+
+        delivered = sum(len(client.get_received()) for client in clients)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for client in clients:
+                client.disconnect()
+
+        case = {
+            'name': f'socketio topic_update clients={count}',
+            'clients': count,
+            'rounds': options.rounds,
+            'messages': delivered,
+            'seconds': round(elapsed, 3),
+            'messages_per_sec': round(delivered / elapsed, 1),
+            'p50_flush_ms': round(percentile(durations, 50) * 1000, 3),
+            'p99_flush_ms': round(percentile(durations, 99) * 1000, 3)
+        }
+        print(f"{case['name']:<60} p50 {case['p50_flush_ms']:>9.2f} ms  p99 {case['p99_flush_ms']:>9.2f} ms  "
+              f"{case['messages_per_sec']:>9.1f} msg/s")
+        cases.append(case)
+
+    return cases
+
+
+def serialization_payloads(count):
+    """Payloads shaped like /api/servers, an /api/alerts page and a topic_update for ``count`` items"""
+    servers = [{
+        'id': f'{i:012x}', 'name': f'bench-{i:04d}', 'status': 'running', 'image': 'nginx:1.25',
+        'created': '2024-01-01T00:00:00.000000000Z', 'ports': {'80/tcp': [{'HostIp': '0.0.0.0', 'HostPort': str(8000 + i)}]},
+        'networks': ['bridge'], 'cpu_usage': round(i * 0.37 % 100, 2), 'memory_usage': round(i * 0.61 % 100, 2),
+        'memory_limit': 2147483648, 'network_rx': i * 1024, 'network_tx': i * 512,
+        'stats_timestamp': '2024-01-01T00:00:00'
+    } for i in range(count)]
+    alerts = [{
+        'id': i, 'severity': 'warning', 'message': f'High CPU usage on bench-{i % 100:04d}: {i % 100}%',
+        'source': f'bench-{i % 100:04d}', 'type': 'cpu_high', 'value': float(i % 100),
+        'timestamp': '2024-01-01T00:00:00', 'resolved': bool(i % 2)
+    } for i in range(count)]
+    update = {'topic': 'servers', 'seq': 42, 'changes': {
+        f'bench-{i:04d}': {'cpu_usage': round(i * 0.37 % 100, 2), 'memory_usage': round(i * 0.61 % 100, 2)}
+        for i in range(count)
+    }, 'removed': []}
+    return {'servers': {'servers': servers}, 'alerts': {'alerts': alerts, 'total': count}, 'topic_update': update}
+
+
+def bench_serialization(options):
+    """Encode and decode API-sized payloads with every available serializer"""
+    import serialization
+
+    encoders = {'json': (lambda obj: json.dumps(obj, separators=(',', ':')).encode(), json.loads)}
+    if serialization.orjson is not None:
+        encoders['orjson'] = (serialization.orjson.dumps, serialization.orjson.loads)
+    if serialization.msgpack is not None:
+        encoders['msgpack'] = (serialization.msgpack.packb, serialization.msgpack.unpackb)
+
+    cases = []
+    for count in options.containers:
+        for payload_name, payload in serialization_payloads(count).items():
+            for encoder, (encode, decode) in encoders.items():
+                data = encode(payload)
+                for operation, call in (('encode', lambda: encode(payload)), ('decode', lambda: decode(data))):
+                    durations = []
+                    started = time.perf_counter()
+                    for _ in range(options.rounds):
+                        call_started = time.perf_counter()
+                        call()
+                        durations.append(time.perf_counter() - call_started)
+                    elapsed = time.perf_counter() - started
+
+                    case = {
+                        'name': f'serialization {payload_name} items={count} {encoder} {operation}',
+                        'payload': payload_name,
+                        'items': count,
+                        'encoder': encoder,
+                        'operation': operation,
+                        'bytes': len(data),
+                        'p50_ms': round(percentile(durations, 50) * 1000, 3),
+                        'p99_ms': round(percentile(durations, 99) * 1000, 3),
+                        'ops_per_sec': round(options.rounds / elapsed, 1)
+                    }
+                    print(f"{case['name']:<60} p50 {case['p50_ms']:>9.3f} ms  {case['ops_per_sec']:>9.1f} ops/s  "
+                          f"{case['bytes']:>9} bytes")
+                    cases.append(case)
+
+    return cases
+
+
+# Heavy dependencies that importing the app must leave unloaded until first use
+DEFERRED_MODULES = ('psycopg2', 'numpy', 'docker', 'yaml')
+
+# Run in a fresh interpreter per sample; prints seconds to import and to the first /health response,
+# and which of DEFERRED_MODULES the import loaded
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+loaded = sorted(name for name in %r if name in sys.modules)
+status = app.app.test_client().get('/health').status_code
+print(json.dumps({'import': imported - started, 'health': time.perf_counter() - started, 'status': status,
+                  'loaded': loaded}))
+""" % (DEFERRED_MODULES,)
+
+
+def bench_startup(options):
+    """Start the app in fresh interpreters with the Docker socket missing and Redis unreachable"""
+    env = dict(os.environ, DOCKER_HOST='unix:///nonexistent/docker.sock', REDIS_URL='redis://127.0.0.1:1/0')
+    cases = []
+    for async_mode in ('', 'threading'):
+        env['SOCKETIO_ASYNC_MODE'] = async_mode
+        timings = {'import app': [], 'first /health': [], 'process to /health': []}
+        errors = 0
+        for _ in range(options.startup_runs):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=BACKEND_DIR, env=env,
+                                       capture_output=True, text=True, timeout=120)
+            elapsed = time.perf_counter() - started
+            try:
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                result = None
+            if not result or result['status'] != 200:
+                errors += 1
+                print(completed.stderr.strip().splitlines()[-1:])
+                continue
+            if result['loaded']:
+                errors += 1
+                print(f"importing app loaded {', '.join(result['loaded'])}")
+            timings['import app'].append(result['import'])
+            timings['first /health'].append(result['health'])
+            timings['process to /health'].append(elapsed)
+
+        for name, durations in timings.items():
+            case = {
+                'name': f'startup {name} async_mode={async_mode or "auto"}',
+                'async_mode': async_mode or 'auto',
+                'runs': options.startup_runs,
+                'errors': errors,
+                'p50_ms': round(percentile(durations, 50) * 1000, 1) if durations else None,
+                'p99_ms': round(percentile(durations, 99) * 1000, 1) if durations else None
+            }
+            print(f"{case['name']:<60} p50 {case['p50_ms']} ms  p99 {case['p99_ms']} ms  errors {errors}")
+            cases.append(case)
+
+    return cases
+
+
+def bench_postgres(options):
+    """Write synthetic samples through MetricsWriter into the configured Postgres"""
+    import db
+    from metrics_writer import MetricsWriter
+
+    cases = []
+    try:
+        with db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+    except Exception as e:
+        print(f"Skipping Postgres benchmarks: {e}")
+        return cases
+
+    for batch_size in options.batch_sizes:
+        writer = MetricsWriter(max_buffer=options.rows, batch_size=batch_size)
+        now = time.time()
+        for i in range(options.rows):
+            writer.record(f'bench-{i % 100:04d}', 'cpu_usage', i % 100, now - i)
+
+        started = time.perf_counter()
+        written = writer.flush()
+        elapsed = time.perf_counter() - started
+
+        case = {
+            'name': f'postgres metrics insert batch={batch_size}',
+            'batch_size': batch_size,
+            'rows': written,
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(written / elapsed, 1)
+        }
+        print(f"{case['name']:<60} {case['rows_per_sec']:>9.1f} rows/s")
+        cases.append(case)
+
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM metrics WHERE server_id IN (SELECT id FROM servers WHERE name LIKE 'bench-%%')")
+            cursor.execute("DELETE FROM servers WHERE name LIKE 'bench-%%'")
+
+    return cases
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--containers', type=int_list, default=[10, 100, 500],
+                        help='synthetic container counts (default: 10,100,500)')
+    parser.add_argument('--alerts', type=int_list, default=[100, 1000, 10000],
+                        help='stored alert counts (default: 100,1000,10000)')
+    parser.add_argument('--clients', type=int_list, default=[10, 100, 500],
+                        help='subscribed Socket.IO client counts (default: 10,100,500)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per HTTP case')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent HTTP clients')
+    parser.add_argument('--rounds', type=int, default=50, help='broadcast ticks per Socket.IO case')
+    parser.add_argument('--stats-latency', type=float, default=0.0,
+                        help='seconds each fake stats call blocks, to mimic the Docker daemon')
+    parser.add_argument('--postgres', action='store_true', help='also benchmark metric writes into DB_* Postgres')
+    parser.add_argument('--rows', type=int, default=50000, help='rows per Postgres case')
+    parser.add_argument('--batch-sizes', type=int_list, default=[500, 5000], help='MetricsWriter batch sizes')
+    parser.add_argument('--startup-runs', type=int, default=5, help='fresh interpreters per startup case')
+    parser.add_argument('--skip', action='append', default=[],
+                        choices=['http', 'socketio', 'serialization', 'startup'],
+                        help='skip a benchmark group')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change in p99 or throughput reported as a regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    backend, simple_app = load_apps()
+
+    results = {'meta': metadata({key: value for key, value in vars(options).items()
+                                 if key not in ('output', 'compare')})}
+    if 'http' not in options.skip:
+        results['http'] = bench_http(backend, simple_app, options)
+    if 'socketio' not in options.skip:
+        results['socketio'] = bench_socketio(backend, options)
+    if 'serialization' not in options.skip:
+        results['serialization'] = bench_serialization(options)
+    if 'startup' not in options.skip:
+        results['startup'] = bench_startup(options)
+    if options.postgres:
+        results['postgres'] = bench_postgres(options)
+
+    output = options.output or os.path.join(RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    print(f"Results written to {save_results(results, output)}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(results, json.load(f), options.threshold)
+        for name, metric, before, after, change in regressions:
+            print(f"REGRESSION {name}: {metric} {before} -> {after} ({change:+.1f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {options.threshold}% against {options.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Topic-scoped, delta-encoded Socket.IO broadcasting.
+
+Clients subscribe to topics (``summary``, ``servers``, ``server:<name>``,
+``alerts``, ...) and are placed in one Socket.IO room per topic. On subscribe a
+client receives the topic's full state once; after that, each tick sends only
+the fields that changed since the previous tick. Every publish within a tick
+is coalesced, so a topic produces at most one state message and one event
+batch per tick regardless of how often it was updated.
+
+Messages:
+
+- ``topic_snapshot`` ``{topic, seq, data}`` sent to a client when it subscribes
+- ``topic_update`` ``{topic, seq, changes, removed}`` sent to the topic room
+- ``topic_events`` ``{topic, events: [{event, data}]}`` sent to the topic room
+
+``seq`` increases by one per update so clients can detect a missed message and
+resubscribe.
+
+With several instances behind a Socket.IO message queue, only the leader
+publishes state; passing a Redis ``store`` keeps each topic's state and
+sequence number there so any instance can serve subscribe snapshots and a new
+leader continues the sequence where the old one stopped.
+"""
+
+import threading
+import time
+
+from flask import request
+from flask_socketio import join_room, leave_room
+
+from instrumentation import stage
+from serialization import redis_codec
+
+REMOVED = object()
+
+
+class Broadcaster:
+    """Coalesces topic state and events and emits per-tick deltas to topic rooms"""
+
+    def __init__(self, socketio, interval=1.0, store=None, prefix='broadcast'):
+        self.socketio = socketio
+        self.interval = interval
+        self.store = store
+        self.prefix = prefix
+        self._state = {}
+        self._seq = {}
+        self._pending = {}
+        self._events = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @staticmethod
+    def room(topic):
+        return f'topic:{topic}'
+
+    def publish(self, topic, data):
+        """Stage new values for some of a topic's fields"""
+        with self._lock:
+            self._pending.setdefault(topic, {}).update(data)
+        self.start()
+
+    def remove(self, topic, *keys):
+        """Stage the removal of fields from a topic"""
+        with self._lock:
+            pending = self._pending.setdefault(topic, {})
+            for key in keys:
+                pending[key] = REMOVED
+        self.start()
+
+    def publish_event(self, topic, event, data):
+        """Queue a discrete event for the topic's next batch"""
+        with self._lock:
+            self._events.setdefault(topic, []).append({'event': event, 'data': data})
+        self.start()
+
+    def drop_topic(self, topic):
+        """Forget a topic's state, e.g. when the server it describes is gone"""
+        with self._lock:
+            self._state.pop(topic, None)
+            self._pending.pop(topic, None)
+        if self.store is not None:
+            self.store.delete(self._store_key(topic))
+
+    def reset(self):
+        """Forget locally held state so it is re-read from the store, e.g. after losing leadership"""
+        with self._lock:
+            self._state.clear()
+            self._seq.clear()
+            self._pending.clear()
+
+    def _store_key(self, topic):
+        return f'{self.prefix}:{topic}'
+
+    def _load(self, topic):
+        data = self.store.get(self._store_key(topic))
+        stored = redis_codec.decode(data) if data else {}
+        return stored.get('data', {}), stored.get('seq', 0)
+
+    def snapshot(self, topic):
+        """Current state and sequence number of a topic"""
+        with self._lock:
+            if topic in self._state or self.store is None:
+                return dict(self._state.get(topic, {})), self._seq.get(topic, 0)
+        return self._load(topic)
+
+    def _diff(self):
+        updates = []
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            events, self._events = self._events, {}
+
+            for topic, fields in pending.items():
+                state = self._state.setdefault(topic, {})
+                changes = {}
+                removed = []
+                for key, value in fields.items():
+                    if value is REMOVED:
+                        if key in state:
+                            del state[key]
+                            removed.append(key)
+                    elif key not in state or state[key] != value:
+                        state[key] = value
+                        changes[key] = value
+
+                if changes or removed:
+                    self._seq[topic] = self._seq.get(topic, 0) + 1
+                    updates.append((topic, {
+                        'topic': topic,
+                        'seq': self._seq[topic],
+                        'changes': changes,
+                        'removed': removed
+                    }))
+
+        return updates, events
+
+    def _save(self, updates):
+        pipe = self.store.pipeline(transaction=False)
+        with self._lock:
+            for topic, message in updates:
+                pipe.set(self._store_key(topic), redis_codec.encode({'seq': message['seq'], 'data': self._state.get(topic, {})}))
+        pipe.execute()
+
+    def flush(self):
+        """Emit one delta per changed topic and one batch per topic with events"""
+        if self.store is not None:
+            # Continue from the shared state of topics this instance has not published yet
+            with self._lock:
+                unknown = [topic for topic in self._pending if topic not in self._state]
+            for topic in unknown:
+                data, seq = self._load(topic)
+                with self._lock:
+                    self._state.setdefault(topic, data)
+                    self._seq.setdefault(topic, seq)
+
+        updates, events = self._diff()
+        if self.store is not None and updates:
+            self._save(updates)
+        with stage('emit_fanout'):
+            for topic, message in updates:
+                self.socketio.emit('topic_update', message, to=self.room(topic))
+            for topic, batch in events.items():
+                self.socketio.emit('topic_events', {'topic': topic, 'events': batch}, to=self.room(topic))
+        return len(updates) + len(events)
+
+    def subscribe(self, topic):
+        """Join the calling client to a topic and send it the full state"""
+        join_room(self.room(topic))
+        data, seq = self.snapshot(topic)
+        self.socketio.emit('topic_snapshot', {'topic': topic, 'seq': seq, 'data': data}, to=request.sid)
+
+    def unsubscribe(self, topic):
+        leave_room(self.room(topic))
+
+    def register_handlers(self):
+        """Add ``subscribe``/``unsubscribe`` Socket.IO handlers taking ``{topics: [...]}``"""
+
+        @self.socketio.on('subscribe')
+        def handle_subscribe(data):
+            for topic in (data or {}).get('topics', []):
+                self.subscribe(topic)
+
+        @self.socketio.on('unsubscribe')
+        def handle_unsubscribe(data):
+            for topic in (data or {}).get('topics', []):
+                self.unsubscribe(topic)
+
+    def _run(self):
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Broadcast error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start the per-tick flush loop (idempotent)"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
@@ -0,0 +1,99 @@
+"""
+Lazily created, pooled Docker and Redis clients.
+
+Nothing connects when the app module is imported: each client is a proxy
+that builds the real client on first use, from a connection pool with a
+configurable size and timeouts, and health-checks it (a ping) before handing
+it out. Importing the app for tests, benchmarks or a fresh gunicorn worker
+therefore needs neither the Docker socket nor Redis, and a worker can answer
+``/health`` before either is reachable. The docker SDK, which pulls in
+requests/urllib3, is only imported when the Docker client is first needed.
+"""
+
+import threading
+import time
+
+from instrumentation import instrument_redis
+
+
+class ClientUnavailable(Exception):
+    """A client could not be created or failed its health check"""
+
+
+class LazyClient:
+    """Proxy creating a client with ``factory(*args, **kwargs)`` on first attribute access
+
+    The factory is expected to health-check the client it returns and raise
+    if it is unusable. After a failure every call raises ClientUnavailable for
+    ``retry_interval`` seconds before creation is attempted again, so a
+    missing daemon does not make each caller wait out a connect timeout.
+    """
+
+    def __init__(self, name, factory, *args, retry_interval=5, **kwargs):
+        self._name = name
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._retry_interval = retry_interval
+        self._client = None
+        self._error = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                if time.time() < self._retry_at:
+                    raise self._error
+                try:
+                    self._client = self._factory(*self._args, **self._kwargs)
+                except Exception as e:
+                    self._error = ClientUnavailable(f'{self._name} unavailable: {e}')
+                    self._retry_at = time.time() + self._retry_interval
+                    raise self._error from e
+                self._error = None
+            return self._client
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self._resolve(), attr)
+
+    def __repr__(self):
+        state = 'connected' if self._client is not None else 'not connected'
+        return f'<LazyClient {self._name} ({state})>'
+
+
+def create_docker_client(timeout=30, max_pool_size=32):
+    """Docker client from the environment (DOCKER_HOST etc.), pinged before use"""
+    import docker
+
+    client = docker.from_env(timeout=timeout, max_pool_size=max_pool_size)
+    client.ping()
+    return client
+
+
+def create_redis_client(url, max_connections=50, pool_timeout=5, socket_timeout=5, connect_timeout=2,
+                        health_check_interval=30):
+    """Instrumented Redis client on a blocking pool of at most ``max_connections``, pinged before use
+
+    Callers wait up to ``pool_timeout`` for a free connection instead of
+    failing when the pool is exhausted; idle connections are re-checked after
+    ``health_check_interval`` seconds.
+    """
+    import redis
+
+    pool = redis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=connect_timeout,
+        health_check_interval=health_check_interval
+    )
+    client = instrument_redis(redis.Redis(connection_pool=pool))
+    client.ping()
+    return client
@@ -0,0 +1,228 @@
+"""
+Coordination between backend instances sharing one Redis.
+
+When several gunicorn processes or nodes serve the API, each instance
+registers itself as a cluster member with a heartbeat. One of them holds a
+leader lease and runs the singleton work (the monitor loop, rule evaluation,
+alert retention, rollups); the lease expires if its holder dies so another
+member takes over. Container stats collection is split between the live
+members with a consistent hash ring, so each container is sampled by exactly
+one instance and only a small share of containers moves when a member joins
+or leaves. Samples are published to Redis so every instance sees all of them.
+"""
+
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+
+from serialization import redis_codec
+
+
+def default_identity():
+    """A member name unique per process: host, PID and a random suffix"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to member names"""
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.nodes = frozenset(nodes)
+        self._points = []
+        self._owners = []
+        for point, node in sorted((self._hash(f'{node}#{i}'), node) for node in self.nodes for i in range(replicas)):
+            self._points.append(point)
+            self._owners.append(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def node_for(self, key):
+        """The member owning ``key``, or None when the ring is empty"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class LeaseLock:
+    """A Redis key held by one owner for ``ttl`` seconds at a time and renewed while alive"""
+
+    def __init__(self, redis_client, key, identity, ttl=15):
+        self.redis = redis_client
+        self.key = key
+        self.identity = identity
+        self.ttl = ttl
+
+    def acquire(self):
+        """Take the lease if it is free or renew it if already held; returns whether we hold it"""
+        ttl_ms = int(self.ttl * 1000)
+        if self.redis.set(self.key, self.identity, nx=True, px=ttl_ms):
+            return True
+
+        def renew(pipe):
+            if pipe.get(self.key) != self.identity.encode():
+                return False
+            pipe.multi()
+            pipe.pexpire(self.key, ttl_ms)
+            return True
+
+        from redis import WatchError
+
+        try:
+            return self.redis.transaction(renew, self.key, value_from_callable=True)
+        except WatchError:
+            return False
+
+    def release(self):
+        """Give up the lease if we still hold it"""
+        def drop(pipe):
+            if pipe.get(self.key) == self.identity.encode():
+                pipe.multi()
+                pipe.delete(self.key)
+
+        from redis import WatchError
+
+        try:
+            self.redis.transaction(drop, self.key)
+        except WatchError:
+            pass
+
+    def holder(self):
+        value = self.redis.get(self.key)
+        return value.decode() if value else None
+
+
+class Cluster:
+    """Membership heartbeats, leader election and stats sharding for one instance"""
+
+    def __init__(self, redis_client, identity=None, prefix='cluster', ttl=15, heartbeat_interval=5):
+        self.redis = redis_client
+        self.identity = identity or default_identity()
+        self.prefix = prefix
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.lease = LeaseLock(redis_client, f'{prefix}:leader', self.identity, ttl)
+        self.ring = HashRing([self.identity])
+        self.is_leader = False
+        self._leadership_listeners = []
+        self._membership_listeners = []
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def on_leadership(self, callback):
+        """Call ``callback(is_leader)`` whenever this instance gains or loses the lease"""
+        self._leadership_listeners.append(callback)
+
+    def on_membership(self, callback):
+        """Call ``callback(members)`` whenever the set of live members changes"""
+        self._membership_listeners.append(callback)
+
+    def _notify(self, listeners, value):
+        for callback in listeners:
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"Cluster listener error: {e}")
+
+    def owns(self, container_id):
+        """Whether this instance collects stats for a container"""
+        return self.ring.node_for(container_id) in (None, self.identity)
+
+    def members(self):
+        return sorted(self.ring.nodes)
+
+    def heartbeat(self, now=None):
+        """Refresh membership and the leader lease; returns the live members"""
+        now = time.time() if now is None else now
+        key = f'{self.prefix}:members'
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(key, {self.identity: now})
+        pipe.zremrangebyscore(key, '-inf', now - self.ttl)
+        pipe.zrange(key, 0, -1)
+        members = {member.decode() for member in pipe.execute()[-1]}
+
+        with self._lock:
+            changed = members != self.ring.nodes
+            if changed:
+                self.ring = HashRing(members)
+        if changed:
+            self._notify(self._membership_listeners, sorted(members))
+
+        leader = self.lease.acquire()
+        if leader != self.is_leader:
+            self.is_leader = leader
+            print(f"Cluster member {self.identity} {'is now' if leader else 'is no longer'} the leader")
+            self._notify(self._leadership_listeners, leader)
+        return members
+
+    def leave(self):
+        """Drop out of the membership and hand over the lease"""
+        try:
+            self.redis.zrem(f'{self.prefix}:members', self.identity)
+            self.lease.release()
+        except Exception as e:
+            print(f"Cluster leave error: {e}")
+        self.is_leader = False
+
+    def _run(self):
+        while True:
+            try:
+                self.heartbeat()
+            except Exception as e:
+                # Without Redis we cannot prove we still hold the lease
+                print(f"Cluster heartbeat error: {e}")
+                if self.is_leader:
+                    self.is_leader = False
+                    self._notify(self._leadership_listeners, False)
+            time.sleep(self.heartbeat_interval)
+
+    def start(self):
+        """Join the cluster and keep heartbeating in the background (idempotent)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+
+class SharedStats:
+    """Stats samples from every member, published to and read from one Redis hash
+
+    Has the same ``get``/``snapshot`` interface as StatsCollector. Samples
+    older than ``max_age`` are treated as gone, which also drops containers
+    whose collecting member stopped.
+    """
+
+    def __init__(self, redis_client, key='cluster:stats', max_age=30):
+        self.redis = redis_client
+        self.key = key
+        self.max_age = max_age
+
+    def record_sample(self, container_id, sample):
+        """StatsCollector listener publishing a member's own samples"""
+        self.redis.hset(self.key, container_id, redis_codec.encode(sample))
+
+    def get(self, container_id):
+        data = self.redis.hget(self.key, container_id)
+        if not data:
+            return None
+        sample = redis_codec.decode(data)
+        return sample if time.time() - sample.get('timestamp', 0) <= self.max_age else None
+
+    def snapshot(self):
+        now = time.time()
+        samples, expired = {}, []
+        for container_id, data in self.redis.hgetall(self.key).items():
+            sample = redis_codec.decode(data)
+            if now - sample.get('timestamp', 0) <= self.max_age:
+                samples[container_id.decode()] = sample
+            else:
+                expired.append(container_id)
+        if expired:
+            self.redis.hdel(self.key, *expired)
+        return samples
@@ -0,0 +1,243 @@
+"""
+Pooled PostgreSQL connections.
+
+A single ThreadedConnectionPool is created on first use and shared by every
+component that talks to Postgres, instead of opening a fresh connection per
+call. Connections that turn out to be closed or broken are discarded rather
+than returned to the pool, so a Postgres restart does not leave dead
+connections behind for later callers. psycopg2 itself is only imported when
+Postgres is first used.
+
+``ensure_schema`` brings databases created from an older ``init.sql`` up to
+date. That script only runs when the Postgres volume is first initialized,
+so every schema change since is also applied here, idempotently, before the
+writers start.
+
+BatchWriter is the shared base of the buffered Postgres writers: a bounded
+in-memory buffer flushed in batches by a background thread. When Postgres is
+slow or down the oldest rows are dropped (and counted) rather than letting
+memory grow, and failed batches are retried with exponential backoff.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Idempotent schema changes for databases initialized before them, applied in order
+SCHEMA_MIGRATIONS = [
+    # DECIMAL(10,2) values overflow on network byte counters
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'metrics' AND column_name = 'value' AND data_type <> 'double precision') THEN
+            ALTER TABLE metrics ALTER COLUMN value TYPE DOUBLE PRECISION;
+        END IF;
+    END
+    $$
+    """,
+    # Downsampled rollups (resolution is the bucket width in seconds)
+    """
+    CREATE TABLE IF NOT EXISTS metrics_rollup (
+        server_id INTEGER REFERENCES servers(id),
+        metric_type VARCHAR(100) NOT NULL,
+        resolution INTEGER NOT NULL,
+        bucket TIMESTAMP NOT NULL,
+        min_value DOUBLE PRECISION NOT NULL,
+        max_value DOUBLE PRECISION NOT NULL,
+        avg_value DOUBLE PRECISION NOT NULL,
+        p95_value DOUBLE PRECISION NOT NULL,
+        sample_count INTEGER NOT NULL,
+        PRIMARY KEY (resolution, server_id, metric_type, bucket)
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_metrics_rollup_type_bucket ON metrics_rollup(resolution, metric_type, bucket)',
+    # Batched alert inserts write the alert type
+    'ALTER TABLE alerts ADD COLUMN IF NOT EXISTS type VARCHAR(100)',
+]
+
+# Serializes migrations across instances starting together
+SCHEMA_LOCK_ID = 7261001
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from psycopg2 import pool
+
+                url = os.getenv('DATABASE_URL')
+                # DATABASE_URL is what the deployments set; the DB_* variables are the fallback
+                target = {'dsn': url} if url else {
+                    'host': os.getenv('DB_HOST', 'postgres'),
+                    'database': os.getenv('DB_NAME', 'monitoring_db'),
+                    'user': os.getenv('DB_USER', 'devops_user'),
+                    'password': os.getenv('DB_PASSWORD', 'secure_password123'),
+                    'port': os.getenv('DB_PORT', '5432')
+                }
+                _pool = pool.ThreadedConnectionPool(
+                    int(os.getenv('DB_POOL_MIN', '1')),
+                    int(os.getenv('DB_POOL_MAX', '10')),
+                    connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+                    options=f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT', '30000'))}",
+                    **target
+                )
+    return _pool
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection, committing on success and rolling back on error"""
+    import psycopg2
+
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def check():
+    """Health check: run a trivial query on a pooled connection"""
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def ensure_schema(connect=connection):
+    """Apply SCHEMA_MIGRATIONS once per process; raises (and is retried by the next call) if Postgres fails"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+                for statement in SCHEMA_MIGRATIONS:
+                    cursor.execute(statement)
+        _schema_ready = True
+
+
+def execute_values(cursor, sql, rows, **kwargs):
+    """psycopg2.extras.execute_values, imported on first use"""
+    from psycopg2.extras import execute_values as execute
+
+    return execute(cursor, sql, rows, **kwargs)
+
+
+class BatchWriter:
+    """Buffers rows and writes them to Postgres in batches; subclasses implement ``_write``"""
+
+    # Names the writer in flush error messages
+    label = 'Batch'
+
+    def __init__(self, connect=connection, max_buffer=100000, batch_size=1000,
+                 flush_interval=5, max_backoff=60):
+        self.connect = connect
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def _record(self, row):
+        """Queue one row; returns False if an older row had to be dropped"""
+        with self._lock:
+            overflow = len(self._buffer) >= self.max_buffer
+            if overflow:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(row)
+            pending = len(self._buffer)
+
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return not overflow
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _requeue(self, batch):
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            keep = batch[-room:] if room > 0 else []
+            self.dropped += len(batch) - len(keep)
+            self._buffer.extendleft(reversed(keep))
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _failed(self):
+        """Called after a batch was rejected and requeued"""
+
+    def flush(self):
+        """Write everything currently buffered; raises if Postgres rejects a batch"""
+        written = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return written
+            try:
+                self._write(batch)
+            except Exception:
+                self._requeue(batch)
+                self._failed()
+                raise
+            written += len(batch)
+            self.written += len(batch)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while True:
+            if backoff > self.flush_interval:
+                time.sleep(backoff)
+            else:
+                self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                ensure_schema(self.connect)
+                self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                self.failures += 1
+                backoff = min(backoff * 2, self.max_backoff)
+                print(f"{self.label} flush error (retrying in {backoff}s): {e}")
+
+    def start(self):
+        """Start the background flush loop"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
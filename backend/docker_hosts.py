@@ -0,0 +1,284 @@
+"""
+Remote Docker hosts.
+
+The local daemon is followed through the container inventory. Other hosts
+(``tcp://`` with optional TLS, or ``ssh://``) are listed in a registry and
+polled concurrently. Each host has:
+
+- its own pooled client, created lazily;
+- a worker pool for stats calls;
+- a timeout;
+- a circuit breaker.
+
+A host that is slow or down therefore delays nothing but its own entry.
+After repeated failures it is skipped until its breaker lets a trial
+request through. Every host's last successful listing is kept in memory,
+so the merged, host-labelled server view never waits on a remote daemon.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from clients import LazyClient
+from stats_collector import calculate_usage
+
+
+def parse_hosts(value):
+    """Hosts from ``name=url`` pairs separated by commas, e.g. ``web=tcp://10.0.0.5:2376,db=ssh://ops@db1``"""
+    hosts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition('=')
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f'Invalid Docker host (expected name=url): {item}')
+        hosts.append({'name': name.strip(), 'url': url.strip()})
+    return hosts
+
+
+def load_hosts(path):
+    """Read host definitions from a YAML file containing a ``hosts`` list"""
+    import yaml
+
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    return config.get('hosts', [])
+
+
+def create_host_client(url, tls=None, timeout=10, pool_size=10, version=None, ssh_client=None):
+    """Docker client for a remote daemon, pinged before use
+
+    ``tls`` is ``True`` or a dict with ``ca_cert``, ``client_cert``,
+    ``client_key`` and ``verify``. ``ssh://`` URLs use the ``ssh`` binary
+    unless ``ssh_client`` is false.
+    """
+    import docker
+
+    if isinstance(tls, dict):
+        client_cert = (tls['client_cert'], tls['client_key']) if tls.get('client_cert') else None
+        tls = docker.tls.TLSConfig(client_cert=client_cert, ca_cert=tls.get('ca_cert'),
+                                   verify=tls.get('verify', True))
+    client = docker.DockerClient(
+        base_url=url,
+        tls=tls or False,
+        timeout=timeout,
+        max_pool_size=pool_size,
+        version=version or 'auto',
+        use_ssh_client=url.startswith('ssh://') if ssh_client is None else ssh_client
+    )
+    client.ping()
+    return client
+
+
+class CircuitBreaker:
+    """Skips a failing host after ``failure_threshold`` consecutive failures for ``reset_timeout`` seconds
+
+    Once the timeout has passed a single trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if self._trial else 'open'
+
+    def allow(self):
+        """Whether a call may be made now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class DockerHost:
+    """One remote daemon: its client, breaker and last successful listing"""
+
+    def __init__(self, name, url, tls=None, timeout=10, pool_size=10, version=None, ssh_client=None,
+                 failure_threshold=3, reset_timeout=30, labels=None):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.labels = labels or {}
+        self.client = LazyClient(f'docker host {name}', create_host_client, url, tls=tls, timeout=timeout,
+                                 pool_size=pool_size, version=version, ssh_client=ssh_client, retry_interval=0)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f'docker-{name}')
+        self.servers = []
+        self.refreshed_at = None
+        self.latency = None
+        self.error = None
+        self.busy = False
+
+    def _server(self, container, usage):
+        server = {
+            'id': container['Id'][:12],
+            'name': (container.get('Names') or ['/' + container['Id'][:12]])[0].lstrip('/'),
+            'status': container.get('State'),
+            'image': container.get('Image'),
+            'created': datetime.utcfromtimestamp(container.get('Created', 0)).isoformat(),
+            'ports': container.get('Ports', []),
+            'networks': list(container.get('NetworkSettings', {}).get('Networks', {}).keys()),
+            'host': self.name
+        }
+        if usage:
+            server.update(usage)
+        return server
+
+    def collect(self):
+        """List the host's containers and fetch stats for the running ones within the host's timeout"""
+        deadline = time.monotonic() + self.timeout
+        containers = self.client.api.containers(all=True)
+        futures = {
+            container['Id']: self._executor.submit(self.client.api.stats, container['Id'], stream=False)
+            for container in containers if container.get('State') == 'running'
+        }
+        usage = {}
+        for container_id, future in futures.items():
+            try:
+                usage[container_id] = calculate_usage(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeout:
+                # Listed without usage rather than holding up the whole host
+                future.cancel()
+            except Exception as e:
+                print(f"Stats error for {container_id[:12]} on {self.name}: {e}")
+        return [self._server(container, usage.get(container['Id'])) for container in containers]
+
+    def status(self):
+        return {
+            'name': self.name,
+            'url': self.url,
+            'labels': self.labels,
+            'state': self.breaker.state,
+            'containers': len(self.servers),
+            'refreshed_at': datetime.utcfromtimestamp(self.refreshed_at).isoformat() if self.refreshed_at else None,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'error': self.error
+        }
+
+
+class DockerHostRegistry:
+    """Polls every remote host concurrently and serves a merged, host-labelled server view"""
+
+    def __init__(self, hosts=None, interval=15, timeout=10, pool_size=10, failure_threshold=3, reset_timeout=30):
+        self.interval = interval
+        self.hosts = {}
+        for config in hosts or []:
+            config = dict(config)
+            config.setdefault('timeout', timeout)
+            config.setdefault('pool_size', pool_size)
+            config.setdefault('failure_threshold', failure_threshold)
+            config.setdefault('reset_timeout', reset_timeout)
+            host = DockerHost(**config)
+            if host.name in self.hosts:
+                raise ValueError(f'Duplicate Docker host: {host.name}')
+            self.hosts[host.name] = host
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.hosts)), thread_name_prefix='docker-hosts')
+        self._listeners = []
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Call ``callback()`` after every refresh"""
+        self._listeners.append(callback)
+
+    def _release(self, host):
+        def done(future):
+            host.busy = False
+        return done
+
+    def refresh(self):
+        """Collect from every available host at once, waiting at most each host's timeout"""
+        started = time.monotonic()
+        pending = {}
+        for host in self.hosts.values():
+            # A collection still running past its timeout keeps its worker; don't queue another
+            if host.busy or not host.breaker.allow():
+                continue
+            host.busy = True
+            future = self._executor.submit(host.collect)
+            future.add_done_callback(self._release(host))
+            pending[host] = future
+
+        for host, future in pending.items():
+            try:
+                servers = future.result(timeout=max(0.0, started + host.timeout - time.monotonic()))
+            except FutureTimeout:
+                host.error = f'timed out after {host.timeout}s'
+                host.breaker.record_failure()
+            except Exception as e:
+                host.error = str(e)
+                host.breaker.record_failure()
+            else:
+                host.servers = servers
+                host.refreshed_at = time.time()
+                host.latency = time.monotonic() - started
+                host.error = None
+                host.breaker.record_success()
+            if host.error:
+                print(f"Docker host {host.name} error: {host.error}")
+
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Docker host listener error: {e}")
+        return {host.name: host.error for host in pending}
+
+    def servers(self, host=None):
+        """Last known containers of every remote host (or one), each labelled with its host"""
+        if host is not None:
+            return list(self.hosts[host].servers) if host in self.hosts else []
+        return [server for entry in self.hosts.values() for server in entry.servers]
+
+    def samples(self):
+        """Usage of every running remote container with stats, stamped with its host's last refresh"""
+        return [
+            dict(server, timestamp=host.refreshed_at)
+            for host in self.hosts.values() for server in host.servers if 'cpu_usage' in server
+        ]
+
+    def status(self):
+        return [host.status() for host in self.hosts.values()]
+
+    def _run(self):
+        scheduled = time.time()
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Docker host refresh error: {e}")
+            scheduled = max(scheduled + self.interval, time.time())
+            time.sleep(max(0.0, scheduled - time.time()))
+
+    def start(self):
+        """Start polling in the background (no-op without remote hosts)"""
+        if self._thread is None and self.hosts:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
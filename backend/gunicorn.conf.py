@@ -0,0 +1,15 @@
+# Gunicorn settings for the backend API
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'eventlet'
+# More than one worker needs CLUSTER_MODE=true so workers share Socket.IO
+# emits through Redis and only one of them runs the monitor
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+
+
+def post_worker_init(worker):
+    """Start the collectors, job workers and monitor in every worker process"""
+    from app import start_monitoring
+
+    start_monitoring()
@@ -0,0 +1,166 @@
+"""
+Columnar in-memory metric history.
+
+Every monitor tick appends one column: the latest value of each metric for
+every container, plus a single timestamp shared by all containers. Each metric
+is one fixed-size NumPy array with a row per container and a column per tick,
+used as a ring buffer, so appends are O(1) per container, memory is allocated
+once (rows x ticks x 8 bytes per metric) and recent windows are read as array
+views without copying or a Redis/Postgres round trip.
+
+The first ``mirror`` columns are also written past the end of the ring, so
+any window of up to ``mirror`` ticks is a contiguous slice even when it wraps
+around; longer windows that wrap are copied.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from metrics_writer import METRIC_FIELDS
+
+
+class HistoryStore:
+    """Fixed-size ring buffers of per-container metrics sharing one timestamp column"""
+
+    def __init__(self, metrics=METRIC_FIELDS, size=720, mirror=120, capacity=64, dtype=np.float64):
+        self.metrics = tuple(metrics)
+        self.size = max(1, int(size))
+        self.mirror = min(max(1, int(mirror)), self.size)
+        self.dtype = dtype
+        self.rows = {}
+        self._free = []
+        self._capacity = 0
+        self._head = 0
+        self._count = 0
+        self._lock = threading.RLock()
+        self._timestamps = np.full(self.size + self.mirror, np.nan)
+        self._columns = {}
+        self._allocate(capacity)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def nbytes(self):
+        """Memory held by the buffers"""
+        return self._timestamps.nbytes + sum(array.nbytes for array in self._columns.values())
+
+    def __len__(self):
+        """Number of ticks currently held"""
+        return self._count
+
+    def _allocate(self, capacity):
+        width = self.size + self.mirror
+        columns = {}
+        for metric in self.metrics:
+            grown = np.full((capacity, width), np.nan, dtype=self.dtype)
+            if metric in self._columns:
+                grown[:self._capacity] = self._columns[metric]
+            columns[metric] = grown
+        self._columns = columns
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def row(self, key):
+        """Row index of a key, allocating one (and growing the buffers) if needed"""
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                if not self._free:
+                    self._allocate(self._capacity * 2)
+                row = self._free.pop()
+                self.rows[key] = row
+            return row
+
+    def release(self, key):
+        """Forget a key's history and free its row; returns the row or None"""
+        with self._lock:
+            row = self.rows.pop(key, None)
+            if row is not None:
+                for array in self._columns.values():
+                    array[row] = np.nan
+                self._free.append(row)
+            return row
+
+    def append(self, samples, now=None):
+        """Add one tick of ``{key: {metric: value}}`` samples
+
+        Keys missing from ``samples`` are released. Returns ``{key: row}`` for
+        the released keys.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            released = {key: self.release(key) for key in [key for key in self.rows if key not in samples]}
+            rows = np.array([self.row(key) for key in samples], dtype=np.intp)
+
+            position = self._head
+            for metric, array in self._columns.items():
+                column = np.full(self._capacity, np.nan, dtype=self.dtype)
+                if rows.size:
+                    column[rows] = [sample.get(metric, np.nan) for sample in samples.values()]
+                array[:, position] = column
+                if position < self.mirror:
+                    array[:, self.size + position] = column
+            self._timestamps[position] = now
+            if position < self.mirror:
+                self._timestamps[self.size + position] = now
+
+            self._head = (position + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+            return released
+
+    def _window(self, array, n):
+        # The newest tick is at head - 1; read backwards n ticks
+        end = self._head or self.size
+        if n <= end:
+            return array[..., end - n:end]
+        if end <= self.mirror:
+            # Wrapped, but the ticks after the wrap are mirrored past the end of the ring
+            return array[..., self.size + end - n:self.size + end]
+        return np.concatenate((array[..., self.size - (n - end):self.size], array[..., :end]), axis=-1)
+
+    def latest(self, n=None):
+        """Timestamps and per-metric ``(capacity, n)`` arrays for the newest ``n`` ticks, oldest first
+
+        Rows are indexed by ``rows``; unused rows and ticks are NaN. Windows of
+        up to ``mirror`` ticks are views into the buffers and must not be modified.
+        """
+        with self._lock:
+            n = self._count if n is None else min(n, self._count)
+            return (self._window(self._timestamps, n),
+                    {metric: self._window(array, n) for metric, array in self._columns.items()})
+
+    def series(self, key, metric, n=None):
+        """Timestamps and values of one metric for one key, oldest first"""
+        with self._lock:
+            row = self.rows.get(key)
+            n = self._count if n is None else min(n, self._count)
+            if row is None:
+                return np.empty(0), np.empty(0, dtype=self.dtype)
+            return self._window(self._timestamps, n), self._window(self._columns[metric][row], n)
+
+    def history(self, key, n=None, since=None):
+        """Samples recorded for a key as ``[{'timestamp': ..., metric: value}]``, oldest first"""
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                return []
+            n = self._count if n is None else min(n, self._count)
+            timestamps = self._window(self._timestamps, n)
+            values = {metric: self._window(array[row], n) for metric, array in self._columns.items()}
+
+            recorded = np.zeros(n, dtype=bool)
+            for column in values.values():
+                recorded |= ~np.isnan(column)
+            if since is not None:
+                with np.errstate(invalid='ignore'):
+                    recorded &= timestamps >= since
+
+            return [
+                dict({metric: None if np.isnan(column[i]) else float(column[i]) for metric, column in values.items()},
+                     timestamp=float(timestamps[i]))
+                for i in np.flatnonzero(recorded)
+            ]
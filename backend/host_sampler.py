@@ -0,0 +1,135 @@
+"""
+Background host metrics sampling.
+
+A sampler thread reads psutil's cumulative counters (CPU times, disk and
+network I/O) once per interval and turns the differences between two reads
+into utilisation and rates. Nothing sleeps while a request waits, unlike
+``psutil.cpu_percent(interval=1)``. Each pass publishes a new read-only
+snapshot by swapping a single reference. Readers never see a half-updated
+snapshot and need no lock.
+"""
+
+import os
+import threading
+import time
+from types import MappingProxyType
+
+import psutil
+
+
+def _cpu_totals(times):
+    """(busy, total) seconds, counted the way psutil.cpu_percent does"""
+    total = sum(times) - getattr(times, 'guest', 0) - getattr(times, 'guest_nice', 0)
+    return total - times.idle - getattr(times, 'iowait', 0), total
+
+
+def cpu_percent(before, after):
+    """Busy percentage between two cpu_times() reads; ``before=None`` means since boot"""
+    busy, total = _cpu_totals(after)
+    if before is not None:
+        before_busy, before_total = _cpu_totals(before)
+        busy, total = busy - before_busy, total - before_total
+    return round(max(0.0, min(100.0, busy / total * 100)), 1) if total > 0 else 0.0
+
+
+def rate(before, after, field, elapsed):
+    """Per-second change of a counter field; counters that went backwards (reset) count as 0"""
+    if after is None or elapsed <= 0:
+        return 0.0
+    previous = getattr(before, field) if before is not None else 0
+    return round(max(0, getattr(after, field) - previous) / elapsed, 1)
+
+
+class HostSampler:
+    """Samples host CPU, memory, disk and network in the background and serves the latest snapshot"""
+
+    def __init__(self, interval=1.0, disk_path='/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self._previous = None
+        self._snapshot = None
+        self._listeners = []
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Call ``callback(snapshot)`` after every sample"""
+        self._listeners.append(callback)
+
+    def _read(self):
+        return {
+            'time': time.time(),
+            'cpu': psutil.cpu_times(),
+            'cores': psutil.cpu_times(percpu=True),
+            'disk': psutil.disk_io_counters(),
+            'net': psutil.net_io_counters()
+        }
+
+    def sample(self):
+        """Read the counters once and publish a snapshot of the rates since the previous read"""
+        current = self._read()
+        # The first sample covers the time since boot
+        previous = self._previous or {'time': psutil.boot_time(), 'cpu': None, 'cores': None, 'disk': None,
+                                      'net': None}
+        elapsed = current['time'] - previous['time']
+        memory = psutil.virtual_memory()
+        disk, net = current['disk'], current['net']
+        cores = zip(previous['cores'] or [None] * len(current['cores']), current['cores'])
+
+        snapshot = MappingProxyType({
+            'timestamp': current['time'],
+            'cpu_percent': cpu_percent(previous['cpu'], current['cpu']),
+            'cpu_per_core': tuple(cpu_percent(before, after) for before, after in cores),
+            'load_average': tuple(round(load, 2) for load in os.getloadavg()) if hasattr(os, 'getloadavg') else None,
+            'memory_percent': round(memory.percent, 1),
+            'memory_used': memory.used,
+            'memory_total': memory.total,
+            'disk_percent': round(psutil.disk_usage(self.disk_path).percent, 1),
+            'disk_read_bytes_per_sec': rate(previous['disk'], disk, 'read_bytes', elapsed),
+            'disk_write_bytes_per_sec': rate(previous['disk'], disk, 'write_bytes', elapsed),
+            'disk_read_ops_per_sec': rate(previous['disk'], disk, 'read_count', elapsed),
+            'disk_write_ops_per_sec': rate(previous['disk'], disk, 'write_count', elapsed),
+            'net_rx_bytes_per_sec': rate(previous['net'], net, 'bytes_recv', elapsed),
+            'net_tx_bytes_per_sec': rate(previous['net'], net, 'bytes_sent', elapsed),
+            'net_rx_packets_per_sec': rate(previous['net'], net, 'packets_recv', elapsed),
+            'net_tx_packets_per_sec': rate(previous['net'], net, 'packets_sent', elapsed)
+        })
+        self._previous = current
+        self._snapshot = snapshot
+
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Host sample listener error: {e}")
+        return snapshot
+
+    def snapshot(self):
+        """Latest snapshot (read-only), starting the sampler on first use"""
+        self.start()
+        return self._snapshot
+
+    def _run(self):
+        scheduled = time.time()
+        while True:
+            # Skip missed samples rather than sampling in a burst to catch up
+            scheduled = max(scheduled + self.interval, time.time())
+            time.sleep(max(0.0, scheduled - time.time()))
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Host sampling error: {e}")
+
+    def start(self):
+        """Take a first sample and keep sampling in the background (idempotent)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Host sampling error: {e}")
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
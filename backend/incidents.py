@@ -0,0 +1,198 @@
+"""
+Alert correlation into incidents.
+
+Alerts are grouped by source and type into incidents. An incident stays open
+while alerts for its group keep arriving within ``window`` seconds of each
+other. Only the first alert of an incident is stored and broadcast.
+Repeats increment the incident's occurrence count and last-seen time, and
+are reported as at most one update per incident per batch.
+
+When more than ``storm_threshold`` sources open incidents of the same type
+within one window, each further source of that type joins a single storm
+incident for the type instead of opening its own. Node-wide trouble then
+raises one alert rather than one per container. A storm does not expire with
+the window; it stays open until each of its sources has cleared.
+"""
+
+import threading
+from datetime import datetime
+
+SEVERITY_RANK = {'info': 0, 'warning': 1, 'critical': 2}
+
+# Source of storm incidents, which span many sources of one type
+STORM_SOURCE = '*'
+
+
+def _iso(timestamp):
+    return datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+class IncidentCorrelator:
+    """Folds alerts into open incidents keyed by (source, type)"""
+
+    def __init__(self, window=300, storm_threshold=10):
+        self.window = window
+        # 0 disables storm grouping
+        self.storm_threshold = storm_threshold
+        self._incidents = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def _expire(self, now):
+        # Storms and their members only close when every member has cleared: their sources were
+        # never stored individually, so nothing else would resolve the storm's alert
+        for key in [key for key, incident in self._incidents.items()
+                    if key[0] != STORM_SOURCE and 'storm' not in incident and now - incident['last_seen'] > self.window]:
+            del self._incidents[key]
+
+    def _storm(self, alert, now):
+        """The storm incident an alert from a new source should join, if its type is storming"""
+        alert_type = alert.get('type')
+        storm = self._incidents.get((STORM_SOURCE, alert_type))
+        if storm is not None or not self.storm_threshold:
+            return storm
+        recent = sum(1 for (source, kind), incident in self._incidents.items()
+                     if kind == alert_type and source != STORM_SOURCE and now - incident['first_seen'] <= self.window)
+        if recent < self.storm_threshold:
+            return None
+
+        storm = self._open((STORM_SOURCE, alert_type), dict(
+            alert,
+            source=STORM_SOURCE,
+            message=f'{alert_type} on more than {self.storm_threshold} sources'
+        ), now)
+        storm['sources'] = []
+        return storm
+
+    def _open(self, key, alert, now):
+        incident = {
+            'key': key,
+            'alert': alert,
+            'alert_id': None,
+            'severity': alert.get('severity') or 'info',
+            'occurrences': 0,
+            'first_seen': now,
+            'last_seen': now,
+            'changed': False
+        }
+        self._incidents[key] = incident
+        return incident
+
+    def correlate(self, alerts):
+        """Split ``(alert, timestamp)`` pairs into alerts to store and updates to stored incidents
+
+        Returns ``(alert, first_seen)`` pairs for incidents that have no
+        stored alert yet, each alert carrying its incident's ``occurrences``,
+        ``first_seen`` and ``last_seen``, and one dict of changed fields
+        (with ``alert_id``) per stored incident that alerts were folded into.
+        Call ``bind`` with the alerts once stored.
+        """
+        new, updated = [], []
+        with self._lock:
+            for alert, now in alerts:
+                self._expire(now)
+                key = (alert.get('source'), alert.get('type'))
+                entry = self._incidents.get(key)
+                if entry is None:
+                    incident = self._storm(alert, now)
+                    if incident is None:
+                        incident = self._open(key, dict(alert), now)
+                    else:
+                        # Storm members are kept so that clearing them all closes the storm
+                        incident['sources'].append(key[0])
+                        self._incidents[key] = {'storm': incident, 'first_seen': now, 'last_seen': now}
+                else:
+                    incident = entry.get('storm', entry)
+                    entry['last_seen'] = max(entry['last_seen'], now)
+
+                if incident['occurrences']:
+                    self.suppressed += 1
+                incident['occurrences'] += 1
+                incident['last_seen'] = max(incident['last_seen'], now)
+                if SEVERITY_RANK.get(alert.get('severity'), 0) > SEVERITY_RANK.get(incident['severity'], 0):
+                    incident['severity'] = alert.get('severity')
+
+                if incident['alert_id'] is None:
+                    # Not stored yet, including when a failed batch is retried
+                    if not any(pending is incident for pending in new):
+                        new.append(incident)
+                elif not incident['changed']:
+                    incident['changed'] = True
+                    updated.append(incident)
+
+            changes = []
+            for incident in updated:
+                incident['changed'] = False
+                changes.append(dict(self._fields(incident), alert_id=incident['alert_id']))
+            new = [(dict(incident['alert'], **self._fields(incident)), incident['first_seen']) for incident in new]
+        return new, changes
+
+    @staticmethod
+    def _fields(incident):
+        fields = {
+            'severity': incident['severity'],
+            'occurrences': incident['occurrences'],
+            'first_seen': _iso(incident['first_seen']),
+            'last_seen': _iso(incident['last_seen'])
+        }
+        if 'sources' in incident:
+            fields['sources'] = list(incident['sources'])
+        return fields
+
+    def bind(self, stored):
+        """Record the IDs of newly stored incident alerts"""
+        with self._lock:
+            for alert in stored:
+                incident = self._incidents.get((alert.get('source'), alert.get('type')))
+                if incident is not None and incident['alert_id'] is None:
+                    incident['alert_id'] = alert['id']
+
+    def restore(self, alerts, now):
+        """Reopen incidents for stored open alerts, e.g. after a restart or a change of leader"""
+        with self._lock:
+            for alert in alerts:
+                key = (alert.get('source'), alert.get('type'))
+                if key in self._incidents:
+                    continue
+                incident = self._open(key, alert, now)
+                incident['alert_id'] = alert['id']
+                incident['occurrences'] = int(alert.get('occurrences') or 1)
+                if alert.get('sources'):
+                    incident['sources'] = list(alert['sources'])
+                    for source in incident['sources']:
+                        self._incidents[(source, key[1])] = {'storm': incident, 'first_seen': now, 'last_seen': now}
+
+    def close(self, source, alert_type):
+        """Forget the incident for one source and type; returns storm alert IDs that closed with it"""
+        with self._lock:
+            incident = self._incidents.pop((source, alert_type), None)
+            storm = incident.get('storm') if incident else None
+            if storm is None or source not in storm['sources']:
+                return []
+            storm['sources'].remove(source)
+            if storm['sources']:
+                return []
+            self._incidents.pop((STORM_SOURCE, alert_type), None)
+            return [storm['alert_id']] if storm['alert_id'] is not None else []
+
+    def forget(self, alert_id):
+        """Forget the incident whose stored alert was resolved directly"""
+        with self._lock:
+            for key, incident in list(self._incidents.items()):
+                if incident.get('storm', incident)['alert_id'] == alert_id:
+                    del self._incidents[key]
+
+    def report(self):
+        """Open incidents and how many alerts have been folded into them"""
+        with self._lock:
+            incidents = [incident for incident in self._incidents.values() if 'storm' not in incident]
+            return {
+                'open': len(incidents),
+                'storms': sum(1 for incident in incidents if incident['key'][0] == STORM_SOURCE),
+                'suppressed': self.suppressed,
+                'incidents': [
+                    dict(self._fields(incident), alert_id=incident['alert_id'], source=incident['key'][0],
+                         type=incident['key'][1])
+                    for incident in sorted(incidents, key=lambda incident: -incident['last_seen'])
+                ]
+            }
@@ -0,0 +1,161 @@
+"""
+Prometheus instrumentation for the API and the monitoring hot paths.
+
+- Every Flask request is counted and timed per route and status by
+  middleware, so routes need no metric code of their own.
+- ``stage(name)`` times an internal step (Docker calls, Redis round trips,
+  JSON encoding, Socket.IO fan-out, monitor tick phases) into one histogram
+  labelled by stage.
+- Ansible runs are timed per playbook and outcome.
+- Gauges report how late the monitor loop is running, how much work is
+  queued and the target versus achieved stats sampling interval.
+- Per-server usage is not kept in labelled Gauges. ``ServerMetricsCollector``
+  builds those series from the current stats snapshot on every scrape, so
+  containers that are gone or have gone quiet drop out of /metrics, and the
+  number of series is capped.
+
+Everything is registered in the default registry served on ``/metrics``.
+"""
+
+import heapq
+import time
+
+from flask import g, request
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+from serialization import JSONProvider
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+request_count = Counter('api_requests_total', 'Total API requests', ['method', 'endpoint', 'status'])
+request_duration = Histogram('api_request_duration_seconds', 'API request duration', ['method', 'endpoint'],
+                             buckets=STAGE_BUCKETS)
+stage_duration = Histogram('backend_stage_duration_seconds', 'Time spent in internal backend stages', ['stage'],
+                           buckets=STAGE_BUCKETS)
+playbook_duration = Histogram('ansible_playbook_duration_seconds', 'Ansible playbook run time', ['playbook', 'status'],
+                              buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+monitor_lag = Gauge('monitor_loop_lag_seconds', 'How much later than scheduled the last monitor tick started')
+queue_depth = Gauge('backend_queue_depth', 'Items waiting in internal queues', ['queue'])
+stats_interval = Gauge('stats_sample_interval_seconds', 'Mean per-container stats sampling interval',
+                       ['kind'])
+
+
+def stage(name):
+    """Context manager/decorator timing one stage into ``backend_stage_duration_seconds``"""
+    return stage_duration.labels(stage=name).time()
+
+
+def track_queue(name, depth):
+    """Report ``depth()`` as the size of a queue whenever /metrics is scraped"""
+    def read():
+        try:
+            return depth()
+        except Exception:
+            return float('nan')
+
+    queue_depth.labels(queue=name).set_function(read)
+
+
+class ServerMetricsCollector:
+    """Per-server usage series generated from the latest samples at scrape time
+
+    ``samples()`` returns dicts with ``name``, ``host``, ``timestamp`` and the
+    usage fields. Servers without a sample in the last ``ttl`` seconds are
+    left out, and when more than ``max_series`` servers remain only the
+    busiest (by CPU) are exported; the rest are counted in
+    ``server_metrics_dropped_servers``.
+    """
+
+    METRICS = (
+        ('cpu_usage', 'server_cpu_usage_percent', 'Server CPU usage percentage'),
+        ('memory_usage', 'server_memory_usage_percent', 'Server memory usage percentage')
+    )
+
+    def __init__(self, samples, ttl=120, max_series=1000):
+        self.samples = samples
+        self.ttl = ttl
+        self.max_series = max_series
+
+    def describe(self):
+        # Registration must not call samples(); it may reach Docker or Redis
+        return [GaugeMetricFamily(name, documentation, labels=['server', 'host'])
+                for _, name, documentation in self.METRICS] + [self._dropped(0)]
+
+    def _dropped(self, count):
+        return GaugeMetricFamily('server_metrics_dropped_servers',
+                                 'Servers left out of the per-server series by the series cap', value=count)
+
+    def collect(self):
+        now = time.time()
+        try:
+            current = [sample for sample in self.samples() if now - sample.get('timestamp', 0) <= self.ttl]
+        except Exception as e:
+            print(f"Server metrics collection error: {e}")
+            current = []
+        exported = current
+        if len(current) > self.max_series:
+            exported = heapq.nlargest(self.max_series, current, key=lambda sample: sample.get('cpu_usage') or 0)
+
+        for field, name, documentation in self.METRICS:
+            family = GaugeMetricFamily(name, documentation, labels=['server', 'host'])
+            for sample in exported:
+                if sample.get(field) is not None:
+                    family.add_metric([sample['name'], sample.get('host', '')], sample[field])
+            yield family
+        yield self._dropped(len(current) - len(exported))
+
+
+class TimedJSONProvider(JSONProvider):
+    """Flask JSON provider recording encode/decode time"""
+
+    def dumps(self, obj, **kwargs):
+        with stage('json_dumps'):
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        with stage('json_loads'):
+            return super().loads(s, **kwargs)
+
+
+def init_app(app):
+    """Time and count every request by route template and status"""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_duration.labels(method=request.method, endpoint=endpoint).observe(time.perf_counter() - started)
+            request_count.labels(method=request.method, endpoint=endpoint, status=response.status_code).inc()
+        return response
+
+
+def instrument_redis(client):
+    """Time every command and pipeline round trip made through a Redis client"""
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def timed_execute_command(*args, **options):
+        with stage('redis'):
+            return execute_command(*args, **options)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def timed_execute(*execute_args, **execute_kwargs):
+            with stage('redis_pipeline'):
+                return execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    return client
@@ -0,0 +1,182 @@
+"""
+Event-driven container inventory.
+
+All containers are listed once at startup and the inventory is then kept
+current from the Docker event stream: a container is re-inspected when it is
+created, started, stopped, renamed or updated, and dropped when destroyed.
+API routes and the monitor read lists, lookups and per-status counts from
+memory instead of calling ``containers.list()`` on every request, and image
+tags are resolved once per image ID rather than through ``container.image``,
+which costs an API call on every access.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from instrumentation import stage
+
+# Container actions after which the container is re-inspected
+REFRESH_ACTIONS = {'create', 'start', 'restart', 'die', 'stop', 'kill', 'pause', 'unpause', 'rename', 'update', 'oom'}
+IMAGE_ACTIONS = {'tag', 'untag', 'delete', 'pull', 'load', 'import'}
+
+
+class ContainerInventory:
+    """In-memory view of every container, loaded once and updated from Docker events"""
+
+    def __init__(self, docker_client, retry_interval=5):
+        self.docker_client = docker_client
+        self.retry_interval = retry_interval
+        self._containers = {}
+        self._names = {}
+        self._indexed = {}
+        self._statuses = Counter()
+        self._image_tags = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._loaded_at = None
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Call ``callback(action, container_id, container)`` after each change
+
+        ``container`` is None once the container is destroyed. After a full
+        reload the callback receives ``('sync', None, None)``.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, action, container_id, container):
+        for callback in self._listeners:
+            try:
+                callback(action, container_id, container)
+            except Exception as e:
+                print(f"Inventory listener error: {e}")
+
+    def _put(self, container):
+        self._remove(container.id)
+        self._containers[container.id] = container
+        # Index by the name and status seen now; the container object may be refreshed in place
+        self._indexed[container.id] = (container.name, container.status)
+        self._names[container.name] = container.id
+        self._statuses[container.status] += 1
+
+    def _remove(self, container_id):
+        self._containers.pop(container_id, None)
+        indexed = self._indexed.pop(container_id, None)
+        if indexed is not None:
+            name, status = indexed
+            self._statuses[status] -= 1
+            if self._names.get(name) == container_id:
+                del self._names[name]
+
+    def load(self):
+        """Replace the inventory with a fresh listing of all containers"""
+        loaded_at = time.time()
+        with stage('docker_list'):
+            containers = self.docker_client.containers.list(all=True)
+        with self._lock:
+            self._containers = {}
+            self._names = {}
+            self._indexed = {}
+            self._statuses = Counter()
+            for container in containers:
+                self._put(container)
+            self._loaded_at = loaded_at
+        self._notify('sync', None, None)
+
+    def _handle_event(self, event):
+        kind = event.get('Type', 'container')
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        actor_id = event.get('id') or event.get('Actor', {}).get('ID')
+        if not actor_id:
+            return
+
+        if kind == 'image':
+            if action in IMAGE_ACTIONS:
+                with self._lock:
+                    # Tags may have moved; resolve them again on next use
+                    self._image_tags.clear()
+            return
+
+        if action == 'destroy':
+            with self._lock:
+                self._remove(actor_id)
+            self._notify(action, actor_id, None)
+        elif action in REFRESH_ACTIONS:
+            try:
+                container = self.docker_client.containers.get(actor_id)
+            except Exception as e:
+                print(f"Inventory refresh error for {actor_id[:12]}: {e}")
+                return
+            with self._lock:
+                self._put(container)
+            self._notify(action, actor_id, container)
+
+    def _watch_events(self):
+        while True:
+            try:
+                # Replay from the last load so nothing between listing and subscribing is missed
+                since = int(self._loaded_at) if self._loaded_at else None
+                for event in self.docker_client.events(decode=True, since=since,
+                                                       filters={'type': ['container', 'image']}):
+                    self._handle_event(event)
+            except Exception as e:
+                print(f"Docker events stream error: {e}")
+            time.sleep(self.retry_interval)
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Inventory reload error: {e}")
+
+    def start(self):
+        """Load the inventory and follow Docker events (idempotent)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self.load()
+            self._thread = threading.Thread(target=self._watch_events, daemon=True)
+            self._thread.start()
+
+    def containers(self, status=None):
+        """Containers, optionally only those in one status (``running``, ``exited``, ...)"""
+        self.start()
+        with self._lock:
+            return [container for container in self._containers.values()
+                    if status is None or self._indexed[container.id][1] == status]
+
+    def count(self, status=None):
+        """Number of containers, optionally in one status, without listing them"""
+        self.start()
+        with self._lock:
+            return len(self._containers) if status is None else self._statuses[status]
+
+    def get(self, key):
+        """Container by full ID, name or unique ID prefix, or None"""
+        self.start()
+        with self._lock:
+            container = self._containers.get(key) or self._containers.get(self._names.get(key))
+            if container is not None:
+                return container
+            matches = [container for container_id, container in self._containers.items()
+                       if container_id.startswith(key)]
+            return matches[0] if len(matches) == 1 else None
+
+    def image_tag(self, container):
+        """First tag of a container's image, resolved once per image ID"""
+        image_id = container.attrs.get('Image')
+        with self._lock:
+            if image_id in self._image_tags:
+                return self._image_tags[image_id]
+
+        try:
+            tags = self.docker_client.images.get(image_id).tags if image_id else []
+        except Exception:
+            tags = []
+        # Fall back to the reference the container was created from
+        tag = tags[0] if tags else container.attrs.get('Config', {}).get('Image') or 'unknown'
+        with self._lock:
+            self._image_tags[image_id] = tag
+        return tag
@@ -0,0 +1,526 @@
+"""
+Persistent job queue with a bounded worker pool.
+
+Ansible deployments and auto-heal runs are submitted as jobs instead of each
+spawning its own thread. A fixed number of worker threads executes them in
+priority order (lower numbers first, so heals run ahead of deploys), identical
+in-flight jobs can be deduplicated with a key, and failed jobs are retried with
+exponential backoff. Kinds can be registered on a separate worker pool with
+its own queue, so quick jobs (container start/stop/restart) never wait behind
+long playbook runs. Job state lives in Redis so queued work and history
+survive a restart. While Redis is unavailable an in-process backend takes the
+jobs, and Redis is retried periodically; once it answers, the in-process jobs
+are handed over to it.
+
+A running job records the worker that owns it, and that worker heartbeats
+each of its jobs. Every instance periodically requeues running jobs whose
+heartbeat has lapsed, e.g. after a restart mid-run. Dedup claims expire
+after the time a job can legitimately take, so a lost release cannot block
+a key forever.
+"""
+
+import heapq
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from serialization import redis_codec
+
+TERMINAL_STATES = ('succeeded', 'failed')
+
+
+class MemoryJobBackend:
+    """In-process job storage used when Redis is not available"""
+
+    def __init__(self, history_size=500):
+        self.history_size = history_size
+        self._jobs = {}
+        # Ready heaps per worker pool
+        self._ready = {}
+        self._delayed = []
+        self._dedup = {}
+        self._heartbeats = {}
+        self._history = []
+        self._cond = threading.Condition()
+
+    def save(self, job):
+        with self._cond:
+            if job['id'] not in self._jobs:
+                self._history.append(job['id'])
+                while len(self._history) > self.history_size:
+                    self._jobs.pop(self._history.pop(0), None)
+            self._jobs[job['id']] = dict(job)
+
+    def load(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def push(self, job):
+        with self._cond:
+            heapq.heappush(self._ready.setdefault(job.get('pool'), []), (job['priority'], time.time(), job['id']))
+            self._cond.notify_all()
+
+    def schedule(self, job, run_at):
+        with self._cond:
+            heapq.heappush(self._delayed, (run_at, job['id']))
+
+    def promote_due(self, now):
+        with self._cond:
+            while self._delayed and self._delayed[0][0] <= now:
+                _, job_id = heapq.heappop(self._delayed)
+                job = self._jobs.get(job_id)
+                if job:
+                    heapq.heappush(self._ready.setdefault(job.get('pool'), []), (job['priority'], now, job_id))
+                    self._cond.notify_all()
+
+    def pop(self, timeout, pool=None):
+        with self._cond:
+            if not self._ready.get(pool):
+                self._cond.wait(timeout)
+            if self._ready.get(pool):
+                return heapq.heappop(self._ready[pool])[2]
+            return None
+
+    def claim_dedup(self, key, job_id, ttl):
+        with self._cond:
+            existing, expires = self._dedup.get(key, (None, 0))
+            if existing and expires > time.time():
+                return existing
+            self._dedup[key] = (job_id, time.time() + ttl)
+            return None
+
+    def release_dedup(self, key, job_id):
+        with self._cond:
+            if self._dedup.get(key, (None, 0))[0] == job_id:
+                del self._dedup[key]
+
+    def heartbeat(self, job_ids, now):
+        with self._cond:
+            self._heartbeats.update((job_id, now) for job_id in job_ids)
+
+    def drop_heartbeat(self, job_id):
+        with self._cond:
+            self._heartbeats.pop(job_id, None)
+
+    def last_heartbeat(self, job_id):
+        with self._cond:
+            return self._heartbeats.get(job_id)
+
+    def claim_orphan(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job['status'] != 'running':
+                return False
+            job['status'] = 'queued'
+            self._heartbeats.pop(job_id, None)
+            return True
+
+    def history(self, offset, limit):
+        with self._cond:
+            ids = list(reversed(self._history))[offset:offset + limit]
+            return [dict(self._jobs[job_id]) for job_id in ids if job_id in self._jobs], len(self._history)
+
+    def depth(self, pool=None):
+        with self._cond:
+            return len(self._ready.get(pool, ()))
+
+    def running(self):
+        with self._cond:
+            return [dict(job) for job in self._jobs.values() if job['status'] == 'running']
+
+    def handoff(self):
+        """Empty the queues and return ``(jobs, ready IDs, (run_at, ID) pairs, live dedup claims)``"""
+        with self._cond:
+            jobs = [dict(self._jobs[job_id]) for job_id in self._history if job_id in self._jobs]
+            ready = [job_id for heap in self._ready.values() for _, _, job_id in sorted(heap)]
+            delayed = sorted(self._delayed)
+            dedup = {key: claim for key, claim in self._dedup.items() if claim[1] > time.time()}
+            self._ready, self._delayed = {}, []
+            return jobs, ready, delayed, dedup
+
+
+class RedisJobBackend:
+    """Job storage in Redis: a JSON document per job plus sorted sets for the queues"""
+
+    def __init__(self, redis_client, prefix='jobs', history_size=500):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.history_size = history_size
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def save(self, job):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(self._key(f'item:{job["id"]}'), redis_codec.encode(job))
+        pipe.zadd(self._key('history'), {job['id']: job['created']}, nx=True)
+        if job['status'] == 'running':
+            pipe.sadd(self._key('running'), job['id'])
+        else:
+            pipe.srem(self._key('running'), job['id'])
+        pipe.execute()
+
+        excess = self.redis.zcard(self._key('history')) - self.history_size
+        if excess > 0:
+            expired = self.redis.zrange(self._key('history'), 0, excess - 1)
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.zrem(self._key('history'), *expired)
+            pipe.delete(*[self._key(f'item:{job_id.decode()}') for job_id in expired])
+            pipe.execute()
+
+    def load(self, job_id):
+        data = self.redis.get(self._key(f'item:{job_id}'))
+        return redis_codec.decode(data) if data else None
+
+    def _queue(self, pool):
+        # The default pool keeps the original key, so jobs queued before pools existed still run
+        return self._key(f'queue:{pool}' if pool else 'queue')
+
+    def push(self, job):
+        # Priority first, then submission order within a priority
+        self.redis.zadd(self._queue(job.get('pool')), {job['id']: job['priority'] * 1e10 + time.time()})
+
+    def schedule(self, job, run_at):
+        self.redis.zadd(self._key('delayed'), {job['id']: run_at})
+
+    def promote_due(self, now):
+        for job_id in self.redis.zrangebyscore(self._key('delayed'), '-inf', now):
+            # Only the caller that removes the entry promotes it
+            if self.redis.zrem(self._key('delayed'), job_id):
+                job = self.load(job_id.decode())
+                if job:
+                    self.push(job)
+
+    def pop(self, timeout, pool=None):
+        item = self.redis.bzpopmin(self._queue(pool), timeout=max(1, int(timeout)))
+        return item[1].decode() if item else None
+
+    def claim_dedup(self, key, job_id, ttl):
+        dedup_key = self._key(f'dedup:{key}')
+        if self.redis.set(dedup_key, job_id, nx=True, ex=max(1, int(ttl))):
+            return None
+        existing = self.redis.get(dedup_key)
+        return existing.decode() if existing else None
+
+    def release_dedup(self, key, job_id):
+        dedup_key = self._key(f'dedup:{key}')
+        if self.redis.get(dedup_key) == job_id.encode():
+            self.redis.delete(dedup_key)
+
+    def heartbeat(self, job_ids, now):
+        if job_ids:
+            self.redis.hset(self._key('heartbeats'), mapping={job_id: now for job_id in job_ids})
+
+    def drop_heartbeat(self, job_id):
+        self.redis.hdel(self._key('heartbeats'), job_id)
+
+    def last_heartbeat(self, job_id):
+        value = self.redis.hget(self._key('heartbeats'), job_id)
+        return float(value) if value is not None else None
+
+    def claim_orphan(self, job_id):
+        # Only the instance that removes the job from the running set requeues it
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.srem(self._key('running'), job_id)
+        pipe.hdel(self._key('heartbeats'), job_id)
+        return bool(pipe.execute()[0])
+
+    def history(self, offset, limit):
+        ids = self.redis.zrevrange(self._key('history'), offset, offset + limit - 1)
+        jobs = [self.load(job_id.decode()) for job_id in ids]
+        return [job for job in jobs if job], self.redis.zcard(self._key('history'))
+
+    def depth(self, pool=None):
+        return self.redis.zcard(self._queue(pool))
+
+    def running(self):
+        jobs = [self.load(job_id.decode()) for job_id in self.redis.smembers(self._key('running'))]
+        return [job for job in jobs if job]
+
+
+class JobQueue:
+    """Runs registered job handlers on a bounded pool of worker threads"""
+
+    def __init__(self, backend, concurrency=2, retry_backoff=10, heartbeat_interval=15, lease=60,
+                 default_timeout=3600, fallback=None, retry_interval=30, pools=None):
+        # Either a backend or a callable creating one on first use. While the callable raises,
+        # ``fallback`` (if any) takes the jobs and creation is retried every retry_interval seconds.
+        self._factory, self._backend = (backend, None) if callable(backend) else (None, backend)
+        self._fallback = fallback
+        self.retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._backend_lock = threading.Lock()
+        self.concurrency = concurrency
+        # Extra worker pools as {name: concurrency}, each with its own queue
+        self.pools = dict(pools or {})
+        self.retry_backoff = retry_backoff
+        self.heartbeat_interval = heartbeat_interval
+        # A running job without a heartbeat for this long is requeued
+        self.lease = lease
+        # Bounds jobs registered without a timeout, for dedup expiry
+        self.default_timeout = default_timeout
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._handlers = {}
+        self._listeners = []
+        self._threads = []
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._factory is not None:
+            with self._backend_lock:
+                if self._factory is not None and time.time() >= self._retry_at:
+                    self._connect()
+                if self._factory is not None:
+                    return self._fallback
+        return self._backend
+
+    def _connect(self):
+        try:
+            backend = self._factory()
+            if self._fallback is not None:
+                self._adopt(backend)
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            self._retry_at = time.time() + self.retry_interval
+            print(f"Job queue using in-process storage, retrying in {self.retry_interval}s: {e}")
+            return
+        self._backend, self._factory = backend, None
+
+    def _adopt(self, backend):
+        """Hand the fallback's jobs over to ``backend``; they go back to the fallback if that fails"""
+        jobs, ready, delayed, dedup = self._fallback.handoff()
+        by_id = {job['id']: job for job in jobs}
+        try:
+            for job in jobs:
+                backend.save(job)
+            for job_id in ready:
+                backend.push(by_id[job_id])
+            for run_at, job_id in delayed:
+                backend.schedule(by_id[job_id], run_at)
+            now = time.time()
+            for key, (job_id, expires) in dedup.items():
+                backend.claim_dedup(key, job_id, expires - now)
+            # Jobs this worker is running must not look abandoned to other instances
+            with self._in_flight_lock:
+                backend.heartbeat(list(self._in_flight), now)
+        except Exception:
+            for job_id in ready:
+                self._fallback.push(by_id[job_id])
+            for run_at, job_id in delayed:
+                self._fallback.schedule(by_id[job_id], run_at)
+            raise
+
+    def register(self, kind, handler, priority=10, max_retries=0, on_finish=None, timeout=None, pool=None):
+        """Register ``handler(job)`` for a job kind; its return value becomes the job result
+
+        ``timeout`` is how long one attempt may run; it is stored on each job
+        for the handler and bounds how long the job's dedup key is held.
+        ``pool`` names one of the extra worker pools to run the kind on.
+        """
+        if pool is not None and pool not in self.pools:
+            raise ValueError(f'Unknown worker pool: {pool}')
+        self._handlers[kind] = {
+            'handler': handler,
+            'priority': priority,
+            'max_retries': max_retries,
+            'on_finish': on_finish,
+            'timeout': timeout,
+            'pool': pool
+        }
+
+    def _dedup_ttl(self, job):
+        """Longest a job can take across all attempts and retry delays, plus a lease to notice a dead worker"""
+        attempts = job['max_retries'] + 1
+        backoff = sum(self.retry_backoff * 2 ** attempt for attempt in range(job['max_retries']))
+        return (job['timeout'] or self.default_timeout) * attempts + backoff + self.lease
+
+    def add_listener(self, callback):
+        """Call ``callback(job)`` whenever a job changes state"""
+        self._listeners.append(callback)
+
+    def _update(self, job, **fields):
+        job.update(fields, updated=time.time())
+        self.backend.save(job)
+        for callback in self._listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"Job listener error: {e}")
+
+    def submit(self, kind, payload, dedup_key=None, priority=None):
+        """Queue a job; returns ``(job, created)`` where an in-flight duplicate is returned as-is"""
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        self.start()
+
+        registration = self._handlers[kind]
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'payload': payload,
+            'status': 'queued',
+            'priority': registration['priority'] if priority is None else priority,
+            'attempts': 0,
+            'max_retries': registration['max_retries'],
+            'dedup_key': dedup_key,
+            'timeout': registration['timeout'],
+            'pool': registration['pool'],
+            'created': now,
+            'created_at': datetime.utcfromtimestamp(now).isoformat(),
+            'result': None,
+            'error': None
+        }
+
+        if dedup_key:
+            ttl = self._dedup_ttl(job)
+            existing_id = self.backend.claim_dedup(dedup_key, job['id'], ttl)
+            if existing_id:
+                existing = self.backend.load(existing_id)
+                if existing and existing['status'] not in TERMINAL_STATES:
+                    return existing, False
+                # Stale claim left by a finished job; take it over unless someone else just did
+                self.backend.release_dedup(dedup_key, existing_id)
+                winner_id = self.backend.claim_dedup(dedup_key, job['id'], ttl)
+                if winner_id:
+                    return self.backend.load(winner_id) or existing, False
+
+        self._update(job)
+        self.backend.push(job)
+        return job, True
+
+    def get(self, job_id):
+        return self.backend.load(job_id)
+
+    def history(self, offset=0, limit=50):
+        return self.backend.history(offset, limit)
+
+    def depth(self):
+        backend = self.backend
+        return backend.depth() + sum(backend.depth(pool) for pool in self.pools)
+
+    def _finish(self, job, status, **fields):
+        self._update(job, status=status, finished_at=datetime.utcnow().isoformat(), **fields)
+        if job.get('dedup_key'):
+            self.backend.release_dedup(job['dedup_key'], job['id'])
+
+        on_finish = self._handlers.get(job['kind'], {}).get('on_finish')
+        if on_finish:
+            try:
+                on_finish(job)
+            except Exception as e:
+                print(f"Job completion hook error for {job['id']}: {e}")
+
+    def _execute(self, job_id):
+        job = self.backend.load(job_id)
+        if not job or job['status'] in TERMINAL_STATES:
+            return
+
+        registration = self._handlers.get(job['kind'])
+        if not registration:
+            self._finish(job, 'failed', error=f"No handler for job kind {job['kind']}")
+            return
+
+        with self._in_flight_lock:
+            self._in_flight.add(job_id)
+        try:
+            self.backend.heartbeat([job_id], time.time())
+            self._update(job, status='running', attempts=job['attempts'] + 1, owner=self.worker_id,
+                         started_at=datetime.utcnow().isoformat())
+            self._run(job, registration)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(job_id)
+            self.backend.drop_heartbeat(job_id)
+
+    def _run(self, job, registration):
+        try:
+            result = registration['handler'](job)
+        except Exception as e:
+            if job['attempts'] <= job['max_retries']:
+                delay = self.retry_backoff * 2 ** (job['attempts'] - 1)
+                self._update(job, status='retrying', error=str(e), retry_at=time.time() + delay)
+                self.backend.schedule(job, time.time() + delay)
+            else:
+                self._finish(job, 'failed', error=str(e))
+            return
+
+        self._finish(job, 'succeeded', result=result, error=None)
+
+    def _work(self, pool=None):
+        while True:
+            try:
+                self.backend.promote_due(time.time())
+                job_id = self.backend.pop(timeout=1, pool=pool)
+                if job_id:
+                    self._execute(job_id)
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                time.sleep(1)
+
+    def heartbeat(self):
+        """Mark this worker's running jobs as alive"""
+        with self._in_flight_lock:
+            job_ids = list(self._in_flight)
+        self.backend.heartbeat(job_ids, time.time())
+
+    def recover(self):
+        """Requeue running jobs whose owner stopped heartbeating them, e.g. after a restart"""
+        now = time.time()
+        with self._in_flight_lock:
+            in_flight = set(self._in_flight)
+        requeued = 0
+        for job in self.backend.running():
+            if job['id'] in in_flight:
+                continue
+            last = self.backend.last_heartbeat(job['id']) or job.get('updated', now)
+            if now - last <= self.lease or not self.backend.claim_orphan(job['id']):
+                continue
+            print(f"Requeueing job {job['id']} abandoned by {job.get('owner', 'an unknown worker')}")
+            self._update(job, status='queued', owner=None)
+            self.backend.push(job)
+            requeued += 1
+        return requeued
+
+    def _maintain(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+                self.recover()
+            except Exception as e:
+                print(f"Job maintenance error: {e}")
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        # Connect first, outside _start_lock: creating the backend may wait out a Redis connect timeout
+        self.backend
+        with self._start_lock:
+            if self._threads:
+                return
+            try:
+                self.recover()
+            except Exception as e:
+                print(f"Job recovery error: {e}")
+            for pool, concurrency in [(None, self.concurrency)] + list(self.pools.items()):
+                for _ in range(concurrency):
+                    thread = threading.Thread(target=self._work, args=(pool,), daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            thread = threading.Thread(target=self._maintain, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+
+def create_backend(redis_client, history_size=500):
+    """Redis-backed job storage; raises while Redis does not answer"""
+    redis_client.ping()
+    return RedisJobBackend(redis_client, history_size=history_size)
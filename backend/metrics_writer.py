@@ -0,0 +1,72 @@
+"""
+Batched persistence of container samples into the Postgres ``metrics`` table.
+
+Samples are buffered in memory by a db.BatchWriter and flushed in batches
+with multi-row ``execute_values`` inserts over a pooled connection.
+"""
+
+import json
+import time
+from datetime import datetime
+
+import db
+from db import execute_values
+
+METRIC_FIELDS = ('cpu_usage', 'memory_usage', 'network_rx', 'network_tx')
+
+
+class MetricsWriter(db.BatchWriter):
+    """Buffers metric rows and writes them to Postgres in batches"""
+
+    label = 'Metrics'
+
+    def __init__(self, connect=db.connection, max_buffer=100000, batch_size=5000,
+                 flush_interval=5, max_backoff=60):
+        super().__init__(connect, max_buffer, batch_size, flush_interval, max_backoff)
+        self._server_ids = {}
+
+    def record(self, server, metric_type, value, timestamp=None, labels=None):
+        """Queue one sample; returns False if an older sample had to be dropped"""
+        return self._record((server, metric_type, float(value), timestamp or time.time(), labels))
+
+    def record_sample(self, container_id, sample):
+        """Queue the metric fields of a StatsCollector sample"""
+        labels = {'container_id': container_id[:12]}
+        for field in METRIC_FIELDS:
+            if field in sample:
+                self.record(sample['name'], field, sample[field], sample['timestamp'], labels)
+
+    def _resolve_server_ids(self, cursor, names):
+        missing = sorted(set(names) - set(self._server_ids))
+        if missing:
+            rows = execute_values(
+                cursor,
+                """
+                INSERT INTO servers (name, host, status) VALUES %s
+                ON CONFLICT (name) DO UPDATE SET last_seen = CURRENT_TIMESTAMP
+                RETURNING name, id
+                """,
+                [(name, name, 'running') for name in missing],
+                fetch=True
+            )
+            self._server_ids.update(dict(rows))
+        return self._server_ids
+
+    def _write(self, batch):
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                server_ids = self._resolve_server_ids(cursor, [row[0] for row in batch])
+                execute_values(
+                    cursor,
+                    'INSERT INTO metrics (server_id, metric_type, value, timestamp, labels) VALUES %s',
+                    [
+                        (server_ids[server], metric_type, value, datetime.utcfromtimestamp(timestamp),
+                         json.dumps(labels) if labels else None)
+                        for server, metric_type, value, timestamp, labels in batch
+                    ],
+                    page_size=self.batch_size
+                )
+
+    def _failed(self):
+        # Cached server IDs may belong to a rolled back transaction
+        self._server_ids.clear()
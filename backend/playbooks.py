@@ -0,0 +1,147 @@
+"""
+Streaming Ansible playbook execution.
+
+Playbook output is read line by line as it is produced instead of being
+captured whole. Each line is pushed to the job's Socket.IO room and appended
+to a per-job log file that stops growing at a configured size, so memory use
+stays flat however much a playbook prints; only a short tail is kept in
+memory for the job result.
+
+Runs can be limited to some hosts (``--limit``) and share a persistent fact
+cache, so that with ``smart`` gathering a host's facts are only gathered
+again once they have expired.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from instrumentation import playbook_duration
+
+
+def job_room(job_id):
+    """Socket.IO room that receives a job's output"""
+    return f'job:{job_id}'
+
+
+def fact_cache_env(backend, ttl=3600, path=None, redis_url=None):
+    """Ansible settings for a ``jsonfile`` or ``redis`` fact cache with smart gathering; ``off`` disables it"""
+    if backend in (None, '', 'off'):
+        return {}
+    env = {'ANSIBLE_GATHERING': 'smart', 'ANSIBLE_CACHE_PLUGIN_TIMEOUT': str(int(ttl))}
+    if backend == 'jsonfile':
+        env.update(ANSIBLE_CACHE_PLUGIN='jsonfile', ANSIBLE_CACHE_PLUGIN_CONNECTION=path)
+    elif backend == 'redis':
+        url = urlparse(redis_url)
+        # host:port:db[:password]
+        connection = f"{url.hostname or 'localhost'}:{url.port or 6379}:{url.path.lstrip('/') or 0}"
+        if url.password:
+            connection += f':{url.password}'
+        env.update(ANSIBLE_CACHE_PLUGIN='community.general.redis', ANSIBLE_CACHE_PLUGIN_CONNECTION=connection,
+                   ANSIBLE_CACHE_PLUGIN_PREFIX='ansible_facts:')
+    else:
+        raise ValueError(f'Unknown fact cache: {backend}')
+    return env
+
+
+class PlaybookRunner:
+    """Runs ansible-playbook and streams its output to a room and a capped log file"""
+
+    def __init__(self, ansible_dir, log_dir, emit, max_log_bytes=10 * 1024 * 1024, tail_lines=20, env=None):
+        self.ansible_dir = ansible_dir
+        self.log_dir = log_dir
+        self.emit = emit
+        self.max_log_bytes = max_log_bytes
+        self.tail_lines = tail_lines
+        # Extra ansible settings, e.g. from fact_cache_env
+        self.env = env or {}
+
+    def log_path(self, job_id):
+        return os.path.join(self.log_dir, f'{job_id}.log')
+
+    def _command(self, playbook, extra_vars, inventory=None, limit=None):
+        command = [
+            'ansible-playbook',
+            '-i', inventory or os.path.join(self.ansible_dir, 'inventory.ini'),
+            os.path.join(self.ansible_dir, playbook),
+            '--extra-vars', json.dumps(extra_vars)
+        ]
+        if limit:
+            command += ['--limit', limit]
+        return command
+
+    def run(self, job_id, playbook, extra_vars, timeout, inventory=None, limit=None):
+        """Run a playbook for a job, raising if it fails or times out
+
+        ``limit`` restricts the run to matching hosts (an Ansible host
+        pattern such as ``web1`` or ``web1,web2``).
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        room = job_room(job_id)
+        tail = deque(maxlen=self.tail_lines)
+        env = dict(os.environ, PYTHONUNBUFFERED='1', ANSIBLE_FORCE_COLOR='0', **self.env)
+
+        process = subprocess.Popen(
+            self._command(playbook, extra_vars, inventory, limit),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env,
+            start_new_session=True
+        )
+
+        timed_out = threading.Event()
+        started = time.monotonic()
+
+        def kill():
+            timed_out.set()
+            # Kill the whole process group so forked workers release the output pipe
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        watchdog = threading.Timer(timeout, kill)
+        watchdog.daemon = True
+        watchdog.start()
+
+        with open(self.log_path(job_id), 'a') as log:
+            written = log.tell()
+            truncated = False
+            try:
+                for line in process.stdout:
+                    line = line.rstrip('\n')
+                    tail.append(line)
+                    self.emit('job_output', {'job_id': job_id, 'line': line}, room=room)
+
+                    # Task headers double as coarse progress events
+                    if line.startswith('TASK [') or line.startswith('PLAY ['):
+                        self.emit('job_progress', {'job_id': job_id, 'step': line.strip('*').strip()}, room=room)
+
+                    if written < self.max_log_bytes:
+                        log.write(line + '\n')
+                        written += len(line) + 1
+                    elif not truncated:
+                        log.write(f'... output truncated at {self.max_log_bytes} bytes ...\n')
+                        truncated = True
+                returncode = process.wait()
+            finally:
+                watchdog.cancel()
+                if process.poll() is None:
+                    kill()
+
+        status = 'timeout' if timed_out.is_set() else 'succeeded' if returncode == 0 else 'failed'
+        playbook_duration.labels(playbook=playbook, status=status).observe(time.monotonic() - started)
+
+        if timed_out.is_set():
+            raise RuntimeError(f'{playbook} timed out after {timeout}s')
+        if returncode != 0:
+            raise RuntimeError('\n'.join(tail) or f'{playbook} exited with {returncode}')
+
+        return {'tail': list(tail), 'log_bytes': written, 'truncated': truncated}
@@ -0,0 +1,113 @@
+"""
+TTL response cache for read-heavy Flask endpoints.
+
+Successful responses are cached per endpoint and query string for a short TTL.
+Concurrent misses for the same key are coalesced: one request computes the
+response while the others wait for it (single-flight), so a burst of
+dashboards polling at once triggers one backend fetch. Cached responses carry
+an ETag, and requests with a matching ``If-None-Match`` get ``304 Not
+Modified``. Endpoints are invalidated by name when state changes.
+"""
+
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from flask import Response, make_response, request
+
+
+class _Flight:
+    """One in-progress computation that concurrent requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+class ResponseCache:
+    """Per-endpoint TTL cache with request coalescing and ETag validation"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._entries = {}
+        self._flights = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _etag(body):
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def _respond(self, entry):
+        body, status, content_type, etag = entry[:4]
+        if status == 200 and etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(body, status=status, content_type=content_type)
+        if etag:
+            response.set_etag(etag)
+        return response
+
+    def _compute(self, view, args, kwargs):
+        response = make_response(view(*args, **kwargs))
+        body = response.get_data()
+        etag = self._etag(body) if response.status_code == 200 else None
+        return body, response.status_code, response.content_type, etag
+
+    def cached(self, name, ttl):
+        """Decorator caching a view's 200 responses under ``name`` for ``ttl`` seconds"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or ttl <= 0:
+                    return view(*args, **kwargs)
+
+                key = (name, request.path, tuple(sorted(request.args.items(multi=True))))
+                now = time.time()
+
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry and entry[4] > now:
+                        self.hits += 1
+                        return self._respond(entry)
+
+                    flight = self._flights.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = self._flights[key] = _Flight()
+                        generation = self._generations.get(name, 0)
+                    self.misses += leader
+
+                if not leader:
+                    flight.done.wait()
+                    if flight.entry is not None:
+                        return self._respond(flight.entry)
+                    return view(*args, **kwargs)
+
+                try:
+                    body, status, content_type, etag = self._compute(view, args, kwargs)
+                    flight.entry = (body, status, content_type, etag, time.time() + ttl)
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                        # Skip storing if the endpoint was invalidated while computing
+                        if (flight.entry is not None and flight.entry[1] == 200
+                                and self._generations.get(name, 0) == generation):
+                            self._entries[key] = flight.entry
+                    flight.done.set()
+
+                return self._respond(flight.entry)
+
+            return wrapper
+        return decorator
+
+    def invalidate(self, *names):
+        """Drop cached responses for the named endpoints"""
+        with self._lock:
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            for key in [key for key in self._entries if key[0] in names]:
+                del self._entries[key]
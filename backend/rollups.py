@@ -0,0 +1,179 @@
+"""
+Downsampled rollups of the raw ``metrics`` table.
+
+A background worker aggregates raw samples into 1 minute, 5 minute and 1 hour
+buckets (min, max, avg, p95 and count per server and metric) stored in
+``metrics_rollup``. History queries are answered from the coarsest resolution
+that still yields enough points for the requested range, so a 30 day chart
+reads a few hundred pre-aggregated rows instead of scanning raw samples.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+
+import db
+
+# Rollup resolutions, finest first, as (name, bucket width in seconds)
+RESOLUTIONS = (('1m', 60), ('5m', 300), ('1h', 3600))
+
+RANGE_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+ROLLUP_SQL = """
+INSERT INTO metrics_rollup
+    (server_id, metric_type, resolution, bucket, min_value, max_value, avg_value, p95_value, sample_count)
+SELECT
+    server_id,
+    metric_type,
+    %(resolution)s,
+    to_timestamp(floor(extract(epoch FROM timestamp) / %(resolution)s) * %(resolution)s) AT TIME ZONE 'UTC',
+    min(value),
+    max(value),
+    avg(value),
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY value),
+    count(*)
+FROM metrics
+WHERE timestamp >= %(start)s AND timestamp < %(end)s
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (resolution, server_id, metric_type, bucket) DO UPDATE SET
+    min_value = EXCLUDED.min_value,
+    max_value = EXCLUDED.max_value,
+    avg_value = EXCLUDED.avg_value,
+    p95_value = EXCLUDED.p95_value,
+    sample_count = EXCLUDED.sample_count
+"""
+
+SERVER_QUERY_SQL = """
+SELECT r.bucket, r.min_value, r.max_value, r.avg_value, r.p95_value, r.sample_count
+FROM metrics_rollup r
+JOIN servers s ON s.id = r.server_id
+WHERE r.resolution = %(resolution)s AND r.metric_type = %(metric)s AND s.name = %(server)s
+  AND r.bucket >= %(start)s AND r.bucket < %(end)s
+ORDER BY r.bucket
+"""
+
+FLEET_QUERY_SQL = """
+SELECT bucket, min(min_value), max(max_value), avg(avg_value), max(p95_value), sum(sample_count)
+FROM metrics_rollup
+WHERE resolution = %(resolution)s AND metric_type = %(metric)s
+  AND bucket >= %(start)s AND bucket < %(end)s
+GROUP BY bucket
+ORDER BY bucket
+"""
+
+
+def parse_range(value):
+    """Convert a range such as '15m', '24h' or '7d' into seconds"""
+    match = re.fullmatch(r'(\d+)([mhdw])', value.strip().lower())
+    if not match:
+        raise ValueError(f'Invalid range: {value}')
+    return int(match.group(1)) * RANGE_UNITS[match.group(2)]
+
+
+def choose_resolution(range_seconds, min_points=60):
+    """Coarsest rollup resolution that still gives at least ``min_points`` buckets"""
+    for name, seconds in reversed(RESOLUTIONS):
+        if range_seconds / seconds >= min_points:
+            return name, seconds
+    return RESOLUTIONS[0]
+
+
+def query_performance(range_seconds, metric='cpu_usage', server=None, min_points=60, connect=db.connection):
+    """Rolled up history for one metric, for a single server or the whole fleet"""
+    name, resolution = choose_resolution(range_seconds, min_points)
+    end = time.time()
+    params = {
+        'resolution': resolution,
+        'metric': metric,
+        'server': server,
+        'start': datetime.utcfromtimestamp(end - range_seconds),
+        'end': datetime.utcfromtimestamp(end)
+    }
+
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SERVER_QUERY_SQL if server else FLEET_QUERY_SQL, params)
+            rows = cursor.fetchall()
+
+    points = [
+        {
+            'time': bucket.isoformat(),
+            'min': round(min_value, 2),
+            'max': round(max_value, 2),
+            'avg': round(avg_value, 2),
+            'p95': round(p95_value, 2),
+            'count': int(count)
+        }
+        for bucket, min_value, max_value, avg_value, p95_value, count in rows
+    ]
+    return {'resolution': name, 'metric': metric, 'server': server, 'points': points}
+
+
+class RollupWorker:
+    """Incrementally aggregates new raw samples into every rollup resolution"""
+
+    def __init__(self, connect=db.connection, interval=60, initial_lookback=86400, raw_retention=0, active=None):
+        self.connect = connect
+        # Passes are skipped while ``active()`` is false, e.g. when this instance is not the cluster leader
+        self.active = active
+        self.interval = interval
+        self.initial_lookback = initial_lookback
+        self.raw_retention = raw_retention
+        self._watermarks = {}
+        self._thread = None
+
+    def _load_watermark(self, cursor, resolution, now):
+        cursor.execute('SELECT max(bucket) FROM metrics_rollup WHERE resolution = %s', (resolution,))
+        latest = cursor.fetchone()[0]
+        if latest is None:
+            return now - self.initial_lookback
+        return (latest - datetime(1970, 1, 1)).total_seconds()
+
+    def rollup(self, now=None):
+        """Recompute every bucket touched since the previous run"""
+        now = now or time.time()
+        watermarks = {}
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                for _, resolution in RESOLUTIONS:
+                    if resolution not in self._watermarks:
+                        self._watermarks[resolution] = self._load_watermark(cursor, resolution, now)
+
+                    # Start at the beginning of the last, possibly partial, bucket
+                    start = self._watermarks[resolution] // resolution * resolution
+                    cursor.execute(ROLLUP_SQL, {
+                        'resolution': resolution,
+                        'start': datetime.utcfromtimestamp(start),
+                        'end': datetime.utcfromtimestamp(now)
+                    })
+                    watermarks[resolution] = now
+
+                if self.raw_retention:
+                    cursor.execute(
+                        'DELETE FROM metrics WHERE timestamp < %s',
+                        (datetime.utcfromtimestamp(now - self.raw_retention),)
+                    )
+
+        # Only advance once the transaction has committed
+        self._watermarks.update(watermarks)
+
+    def _run(self):
+        while True:
+            if self.active is not None and not self.active():
+                # Another instance advances the rollups meanwhile; reload its watermarks when resuming
+                self._watermarks.clear()
+                time.sleep(self.interval)
+                continue
+            try:
+                db.ensure_schema(self.connect)
+                self.rollup()
+            except Exception as e:
+                print(f"Metrics rollup error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start the background rollup loop"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
@@ -0,0 +1,279 @@
+"""
+Vectorized alert rule evaluation.
+
+The latest sample of every container is appended to a HistoryStore (NumPy
+arrays with one row per container and one column per tick), and each rule is
+evaluated against a view of the newest ticks for all rows at once. Per-row state arrays track how many
+consecutive ticks a rule has been breached or clear, whether an alert is open
+and a decaying flap score, so the engine only emits an event when an alert
+opens or resolves:
+
+- threshold: the latest value of a metric
+- rate: change per second of a metric across the window
+- zscore: how far the latest value is from the rolling mean, in standard deviations
+
+Each rule may require its condition to hold for N consecutive samples
+(``for``), resolves only once the value drops below a lower ``clear`` level
+(hysteresis), and stops opening new alerts for a source whose alert keeps
+flapping. Samples are only counted once: a source whose sample ``timestamp``
+has not changed since the last evaluation (e.g. when stats are polled less
+often than the monitor ticks) is left out of the next evaluation.
+"""
+
+import math
+import time
+import warnings
+
+import numpy as np
+
+from history_store import HistoryStore
+
+RULE_KINDS = ('threshold', 'rate', 'zscore')
+
+DEFAULT_RULES = [
+    {
+        'type': 'cpu_high',
+        'metric': 'cpu_usage',
+        'kind': 'threshold',
+        'warning': 80,
+        'critical': 90,
+        'clear': 75,
+        'for': 3,
+        'message': 'High CPU usage on {source}: {value:.1f}%'
+    },
+    {
+        'type': 'memory_high',
+        'metric': 'memory_usage',
+        'kind': 'threshold',
+        'warning': 85,
+        'critical': 95,
+        'clear': 80,
+        'for': 3,
+        'message': 'High memory usage on {source}: {value:.1f}%'
+    }
+]
+
+
+class Rule:
+    """A single alert rule evaluated against every container at once"""
+
+    def __init__(self, type, metric, kind='threshold', warning=None, critical=None, clear=None,
+                 window=30, message=None, flap_window=600, flap_threshold=4, **options):
+        if kind not in RULE_KINDS:
+            raise ValueError(f'Unknown rule kind: {kind}')
+        if warning is None:
+            raise ValueError(f'Rule {type} needs a warning level')
+
+        self.type = type
+        self.metric = metric
+        self.kind = kind
+        self.warning = float(warning)
+        self.critical = float(critical) if critical is not None else math.inf
+        self.clear = float(clear) if clear is not None else self.warning
+        self.for_samples = max(1, int(options.get('for', 1)))
+        self.clear_samples = max(1, int(options.get('clear_for', self.for_samples)))
+        self.window = max(2, int(window))
+        self.flap_window = float(flap_window)
+        self.flap_threshold = float(flap_threshold)
+        self.message = message or f'{type} on {{source}}: {{value:.2f}}'
+
+    def values(self, window, timestamps):
+        """The quantity this rule compares, one value per row (NaN where unknown)"""
+        if self.kind == 'threshold':
+            return window[:, -1]
+
+        recent = window[:, -self.window:]
+        if self.kind == 'rate':
+            stamps = timestamps[-self.window:]
+            # Compare the newest sample with the oldest one present in the window
+            first = np.argmax(~np.isnan(recent), axis=1)
+            rows = np.arange(recent.shape[0])
+            elapsed = stamps[-1] - stamps[first]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(elapsed > 0, (recent[:, -1] - recent[rows, first]) / elapsed, np.nan)
+
+        # zscore of the newest sample against the rest of the window
+        history = recent[:, :-1]
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            mean = np.nanmean(history, axis=1)
+            std = np.nanstd(history, axis=1)
+            return np.where(std > 0, (recent[:, -1] - mean) / std, np.nan)
+
+
+class RuleEngine:
+    """Evaluates rules over a rolling window of samples for all containers"""
+
+    def __init__(self, rules=None, window=30, capacity=64, store=None):
+        self.rules = [rule if isinstance(rule, Rule) else Rule(**rule) for rule in (rules or DEFAULT_RULES)]
+        self.window = max([window] + [rule.window for rule in self.rules])
+        self.metrics = sorted({rule.metric for rule in self.rules})
+
+        # The window may live in a larger store shared with the history API
+        if store is None:
+            store = HistoryStore(self.metrics, size=self.window, mirror=self.window, capacity=capacity)
+        missing = set(self.metrics) - set(store.metrics)
+        if missing:
+            raise ValueError(f'History store does not record {", ".join(sorted(missing))}')
+        if store.mirror < self.window:
+            raise ValueError(f'History store must keep windows of {self.window} ticks contiguous')
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        """Forget the alert state of every source; the metric history is kept"""
+        self._capacity = 0
+        self._last_evaluated = None
+        self._pending = []
+        self._stamps = {}
+        self._allocate(self.store.capacity)
+
+    def _allocate(self, capacity):
+        def grow(array, fill):
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:array.shape[0]] = array
+            return grown
+
+        if self._capacity == 0:
+            self._breached = {rule.type: np.zeros(capacity, dtype=np.int32) for rule in self.rules}
+            self._cleared = {rule.type: np.zeros(capacity, dtype=np.int32) for rule in self.rules}
+            self._open = {rule.type: np.zeros(capacity, dtype=bool) for rule in self.rules}
+            self._flaps = {rule.type: np.zeros(capacity) for rule in self.rules}
+            self._fresh = np.zeros(capacity, dtype=bool)
+        else:
+            self._breached = {key: grow(array, 0) for key, array in self._breached.items()}
+            self._cleared = {key: grow(array, 0) for key, array in self._cleared.items()}
+            self._open = {key: grow(array, False) for key, array in self._open.items()}
+            self._flaps = {key: grow(array, 0.0) for key, array in self._flaps.items()}
+            self._fresh = grow(self._fresh, False)
+        self._capacity = capacity
+
+    def _sync_capacity(self):
+        if self.store.capacity > self._capacity:
+            self._allocate(self.store.capacity)
+
+    def mark_open(self, source, alert_type):
+        """Record an alert that is already open, e.g. after a restart"""
+        if alert_type in self._open:
+            row = self.store.row(source)
+            self._sync_capacity()
+            self._open[alert_type][row] = True
+
+    def observe(self, samples, now=None):
+        """Append the latest sample per source (``{source: {metric: value}}``) to the window
+
+        Sources missing from ``samples`` are dropped, and any alert they had
+        open is resolved on the next evaluation. Samples with the same
+        ``timestamp`` as the source's previous one are not evaluated again.
+        """
+        released = self.store.append(samples, now)
+        self._sync_capacity()
+        for source, row in released.items():
+            self._stamps.pop(source, None)
+            self._fresh[row] = False
+            for alert_type, is_open in self._open.items():
+                if is_open[row]:
+                    self._pending.append({'action': 'resolve', 'type': alert_type, 'source': source, 'value': None})
+            for state in (self._breached, self._cleared, self._open, self._flaps):
+                for array in state.values():
+                    array[row] = 0
+        for source, sample in samples.items():
+            stamp = sample.get('timestamp')
+            if stamp is None or self._stamps.get(source) != stamp:
+                self._stamps[source] = stamp
+                self._fresh[self.store.rows[source]] = True
+
+    def evaluate(self, now=None):
+        """Update rule state for every row with a new sample and return the alerts that opened or resolved"""
+        self._sync_capacity()
+        events, self._pending = self._pending, []
+        fresh, self._fresh = self._fresh, np.zeros(self._capacity, dtype=bool)
+        if not fresh.any():
+            return events
+
+        now = time.time() if now is None else now
+        elapsed = now - self._last_evaluated if self._last_evaluated is not None else 0.0
+        self._last_evaluated = now
+
+        timestamps, windows = self.store.latest(self.window)
+        row_sources = dict(self.store.rows)
+        sources = np.empty(self._capacity, dtype=object)
+        active = np.zeros(self._capacity, dtype=bool)
+        for source, row in row_sources.items():
+            sources[row] = source
+            active[row] = fresh[row]
+
+        if timestamps.size == 0:
+            return events
+
+        for rule in self.rules:
+            values = rule.values(windows[rule.metric], timestamps)
+            known = active & ~np.isnan(values)
+            with np.errstate(invalid='ignore'):
+                breach = known & (values >= rule.warning)
+                clear = known & (values < rule.clear)
+
+            breached = self._breached[rule.type]
+            cleared = self._cleared[rule.type]
+            is_open = self._open[rule.type]
+            flaps = self._flaps[rule.type]
+
+            # Rows without a new sample keep their counts
+            breached[:] = np.where(active, np.where(breach, breached + 1, 0), breached)
+            cleared[:] = np.where(active, np.where(clear, cleared + 1, 0), cleared)
+            if elapsed:
+                flaps *= math.exp(-elapsed / rule.flap_window)
+
+            suppressed = flaps >= rule.flap_threshold
+            fire = active & ~is_open & (breached >= rule.for_samples) & ~suppressed
+            resolve = active & is_open & (cleared >= rule.clear_samples)
+
+            is_open[fire] = True
+            is_open[resolve] = False
+            flaps[fire | resolve] += 1
+
+            for row in np.flatnonzero(fire):
+                value = float(values[row])
+                events.append({
+                    'action': 'fire',
+                    'type': rule.type,
+                    'source': sources[row],
+                    'severity': 'critical' if value >= rule.critical else 'warning',
+                    'value': round(value, 2),
+                    'message': rule.message.format(source=sources[row], value=value)
+                })
+            for row in np.flatnonzero(resolve):
+                events.append({
+                    'action': 'resolve',
+                    'type': rule.type,
+                    'source': sources[row],
+                    'value': round(float(values[row]), 2)
+                })
+
+        return events
+
+    def near(self, source, sample, margin=0.9):
+        """Whether ``source`` has an alert open or a threshold metric within ``margin`` of its warning level"""
+        row = self.store.rows.get(source)
+        if row is not None and any(row < is_open.shape[0] and is_open[row] for is_open in self._open.values()):
+            return True
+        return any(rule.kind == 'threshold' and sample.get(rule.metric) is not None
+                   and sample[rule.metric] >= rule.warning * margin for rule in self.rules)
+
+    def flapping(self):
+        """(source, type) pairs whose alerts are currently suppressed for flapping"""
+        pairs = []
+        row_sources = {row: source for source, row in self.store.rows.items()}
+        for rule in self.rules:
+            rows = np.flatnonzero(self._flaps[rule.type] >= rule.flap_threshold)
+            pairs.extend((row_sources[row], rule.type) for row in rows if row in row_sources)
+        return pairs
+
+
+def load_rules(path):
+    """Read rule definitions from a YAML file containing a ``rules`` list"""
+    import yaml
+
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    return [Rule(**rule) for rule in config.get('rules', [])]
@@ -0,0 +1,151 @@
+"""
+Pluggable serialization for API responses, Socket.IO packets and Redis values.
+
+JSON is encoded and decoded with orjson when it is installed (several times
+faster than the standard library on the large server and alert payloads) and
+with the ``json`` module otherwise. Redis values can optionally be stored as
+msgpack (``REDIS_CODEC=msgpack``); msgpack values carry a marker byte so
+either format is read back regardless of the configured one, and switching
+needs no migration.
+"""
+
+import dataclasses
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_ENCODER = 'orjson' if orjson else 'json'
+
+# 0xc1 is never used by msgpack and cannot start a JSON document
+MSGPACK_MARKER = b'\xc1'
+
+
+def _default(value):
+    """Types neither encoder handles natively, converted the way Flask's provider does"""
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, 'tolist'):
+        # NumPy scalars and arrays
+        return value.tolist()
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj, sort_keys=False, indent=False):
+    """Encode to UTF-8 JSON bytes"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    return dumps(obj, sort_keys, indent).encode()
+
+
+def dumps(obj, sort_keys=False, indent=False):
+    """Encode to a JSON string"""
+    if orjson is not None:
+        return dumps_bytes(obj, sort_keys, indent).decode()
+    return json.dumps(obj, default=_default, sort_keys=sort_keys, indent=2 if indent else None,
+                      separators=None if indent else (',', ':'))
+
+
+def loads(data):
+    """Decode JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using the fast encoder
+
+    Calls with encoder options other than indentation (a custom ``cls``,
+    ``ensure_ascii``...) are handed to the standard library provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        indent = kwargs.pop('indent', None)
+        kwargs.pop('separators', None)
+        if kwargs:
+            return super().dumps(obj, indent=indent, **kwargs)
+        return dumps(obj, sort_keys=self.sort_keys, indent=bool(indent))
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+
+class SocketIOJSON:
+    """``json`` module replacement for Socket.IO and Engine.IO packets"""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return dumps(obj)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return loads(s)
+
+
+class Codec:
+    """Encodes values stored in Redis as JSON or msgpack, and decodes either"""
+
+    def __init__(self, format='json'):
+        if format not in ('json', 'msgpack'):
+            raise ValueError(f'Unknown codec: {format}')
+        if format == 'msgpack' and msgpack is None:
+            print("msgpack is not installed; storing Redis values as JSON")
+            format = 'json'
+        self.format = format
+
+    def encode(self, obj):
+        if self.format == 'msgpack':
+            return MSGPACK_MARKER + msgpack.packb(obj, default=_default, use_bin_type=True)
+        return dumps_bytes(obj)
+
+    def decode(self, data):
+        if isinstance(data, bytes) and data[:1] == MSGPACK_MARKER:
+            if msgpack is None:
+                raise ValueError('msgpack value found but msgpack is not installed')
+            return msgpack.unpackb(data[1:], raw=False, strict_map_key=False)
+        return loads(data)
+
+
+# Shared by every component that stores values in Redis
+redis_codec = Codec(os.getenv('REDIS_CODEC', 'json'))
+
+# Socket.IO packet encoding: 'json', or 'msgpack' for binary frames (clients need socket.io-msgpack-parser)
+SOCKETIO_SERIALIZER = os.getenv('SOCKETIO_SERIALIZER', 'json')
+
+
+def socketio_options():
+    """Keyword arguments for ``SocketIO()`` selecting the packet encoding"""
+    if SOCKETIO_SERIALIZER == 'msgpack':
+        if msgpack is not None:
+            return {'serializer': 'msgpack'}
+        print("msgpack is not installed; Socket.IO packets stay JSON")
+    return {'json': SocketIOJSON}
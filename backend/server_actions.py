@@ -0,0 +1,126 @@
+"""
+Bulk container actions.
+
+Start, stop and restart requests are run as jobs instead of inside the
+request, since Docker can wait for the full stop timeout per container. One
+job applies an action to any number of containers, selected by ID/name or by
+label selector, on a bounded thread pool, so a rolling restart of a fleet
+takes roughly ``containers / parallelism`` stop timeouts. Each container's
+outcome is pushed to the job's Socket.IO room as it completes.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from playbooks import job_room
+
+ACTIONS = ('start', 'stop', 'restart')
+
+
+def parse_selector(selector):
+    """Parse ``app=web,tier!=db,canary`` into ``[(key, op, value)]``; dicts mean equality"""
+    if isinstance(selector, dict):
+        return [(key, '=', str(value)) for key, value in selector.items()]
+
+    requirements = []
+    for term in str(selector).split(','):
+        term = term.strip()
+        if not term:
+            continue
+        if '!=' in term:
+            key, value = term.split('!=', 1)
+            requirements.append((key.strip(), '!=', value.strip()))
+        elif '=' in term:
+            key, value = term.split('=', 1)
+            requirements.append((key.strip(), '=', value.strip()))
+        else:
+            requirements.append((term, 'exists', None))
+    if not requirements or any(not key for key, _, _ in requirements):
+        raise ValueError(f'Invalid label selector: {selector}')
+    return requirements
+
+
+def matches(labels, requirements):
+    """Whether a container's labels satisfy every selector requirement"""
+    for key, op, value in requirements:
+        if op == 'exists' and key not in labels:
+            return False
+        if op == '=' and labels.get(key) != value:
+            return False
+        if op == '!=' and labels.get(key) == value:
+            return False
+    return True
+
+
+def select_containers(inventory, ids=None, selector=None):
+    """Containers named by ID/name or matched by a label selector; returns ``(containers, missing)``"""
+    if ids:
+        found, missing = {}, []
+        for key in ids:
+            container = inventory.get(key)
+            if container is None:
+                missing.append(key)
+            else:
+                found.setdefault(container.id, container)
+        return list(found.values()), missing
+
+    requirements = parse_selector(selector)
+    return [container for container in inventory.containers()
+            if matches(container.labels or {}, requirements)], []
+
+
+class BulkActionRunner:
+    """Applies one action to many containers with bounded parallelism"""
+
+    def __init__(self, docker_client, emit, parallelism=8, stop_timeout=10):
+        self.docker_client = docker_client
+        self.emit = emit
+        self.parallelism = parallelism
+        self.stop_timeout = stop_timeout
+
+    def _apply(self, action, container_id):
+        container = self.docker_client.containers.get(container_id)
+        if action == 'start':
+            container.start()
+        else:
+            getattr(container, action)(timeout=self.stop_timeout)
+        return container.name
+
+    def run(self, job_id, action, container_ids, parallelism=None):
+        """Run an action for a job, emitting per-container progress; raises if every container failed"""
+        if action not in ACTIONS:
+            raise ValueError(f'Invalid action: {action}')
+
+        room = job_room(job_id)
+        workers = max(1, min(parallelism or self.parallelism, self.parallelism, len(container_ids) or 1))
+        results = []
+        started = time.time()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='action') as pool:
+            futures = {pool.submit(self._apply, action, container_id): container_id
+                       for container_id in container_ids}
+            for future in as_completed(futures):
+                container_id = futures[future]
+                result = {'container_id': container_id[:12], 'action': action}
+                try:
+                    result.update(name=future.result(), status='succeeded')
+                except Exception as e:
+                    result.update(status='failed', error=str(e))
+                results.append(result)
+
+                self.emit('server_action_progress', dict(
+                    result, job_id=job_id, completed=len(results), total=len(container_ids)
+                ), room=room)
+
+        failed = [result for result in results if result['status'] == 'failed']
+        if container_ids and len(failed) == len(container_ids):
+            raise RuntimeError(f'{action} failed for every container: {failed[0]["error"]}')
+
+        return {
+            'action': action,
+            'total': len(container_ids),
+            'succeeded': len(results) - len(failed),
+            'failed': len(failed),
+            'duration': round(time.time() - started, 2),
+            'results': results
+        }
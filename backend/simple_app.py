@@ -7,21 +7,34 @@ Provides WebSocket connection and mock data for the dashboard
 from flask import Flask, jsonify, request
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-import psutil
+import os
 import time
 import threading
 import random
 import json
 from datetime import datetime
+from types import MappingProxyType
+from broadcaster import Broadcaster
+from host_sampler import HostSampler
+from serialization import JSONProvider, socketio_options
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'devops-monitoring-secret'
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+app.json = JSONProvider(app)
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_options())
+
+# Subscribed clients get a snapshot once, then only changed fields
+broadcaster = Broadcaster(socketio, interval=1.0)
+broadcaster.register_handlers()
+
+# Host metrics are sampled in the background; requests only read the latest snapshot
+host_sampler = HostSampler(interval=float(os.getenv('HOST_SAMPLE_INTERVAL', '1')))
 
 # Global state
 connected_clients = 0
-metrics_data = {
+# Read-only; replaced as a whole after every host sample, never updated in place
+metrics_data = MappingProxyType({
     'totalServers': 12,
     'onlineServers': 11,
     'cpuUsage': 67,
@@ -37,7 +50,7 @@ metrics_data = {
     'apiCalls': 15420,
     'errors': 12,
     'warnings': 7
-}
+})
 
 alerts_data = [
     {
@@ -76,40 +89,48 @@ servers_data = [
     {'id': 4, 'name': 'Load Balancer', 'status': 'online', 'cpu': 23, 'memory': 41, 'uptime': '30d 12h', 'connections': 1247}
 ]
 
-def get_system_metrics():
-    """Get real system metrics where possible, mock others"""
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
-        # Update with real data where available
-        metrics_data.update({
-            'cpuUsage': round(cpu_percent, 1),
-            'memoryUsage': round(memory.percent, 1),
-            'diskUsage': round(disk.percent, 1)
-        })
-    except Exception as e:
-        print(f"Error getting system metrics: {e}")
-        # Add some realistic variation to mock data
-        metrics_data['cpuUsage'] = max(0, min(100, metrics_data['cpuUsage'] + random.uniform(-5, 5)))
-        metrics_data['memoryUsage'] = max(0, min(100, metrics_data['memoryUsage'] + random.uniform(-3, 3)))
-        metrics_data['diskUsage'] = max(0, min(100, metrics_data['diskUsage'] + random.uniform(-1, 1)))
+def update_metrics(host):
+    """Build the next metrics snapshot from a host sample plus the simulated service figures"""
+    global metrics_data
+    metrics = dict(metrics_data)
+    metrics.update({
+        'cpuUsage': host['cpu_percent'],
+        'cpuPerCore': host['cpu_per_core'],
+        'loadAverage': host['load_average'],
+        'memoryUsage': host['memory_percent'],
+        'diskUsage': host['disk_percent'],
+        'diskReadBytesPerSec': host['disk_read_bytes_per_sec'],
+        'diskWriteBytesPerSec': host['disk_write_bytes_per_sec'],
+        'diskReadOpsPerSec': host['disk_read_ops_per_sec'],
+        'diskWriteOpsPerSec': host['disk_write_ops_per_sec'],
+        'networkRxBytesPerSec': host['net_rx_bytes_per_sec'],
+        'networkTxBytesPerSec': host['net_tx_bytes_per_sec'],
+        # GB/s, as the dashboard displays it
+        'networkTraffic': round((host['net_rx_bytes_per_sec'] + host['net_tx_bytes_per_sec']) / 1e9, 3),
+        'sampledAt': datetime.fromtimestamp(host['timestamp']).isoformat()
+    })
     
-    # Add variation to other metrics
-    metrics_data['networkTraffic'] = max(0, metrics_data['networkTraffic'] + random.uniform(-0.2, 0.3))
-    metrics_data['responseTime'] = max(50, metrics_data['responseTime'] + random.uniform(-10, 15))
-    metrics_data['throughput'] = max(1000, metrics_data['throughput'] + random.uniform(-100, 150))
-    metrics_data['activeConnections'] = max(0, metrics_data['activeConnections'] + random.randint(-50, 50))
-    metrics_data['apiCalls'] += random.randint(10, 100)
-    metrics_data['errors'] = max(0, metrics_data['errors'] + random.randint(-2, 3))
+    # Add variation to the simulated metrics
+    metrics['responseTime'] = max(50, metrics['responseTime'] + random.uniform(-10, 15))
+    metrics['throughput'] = max(1000, metrics['throughput'] + random.uniform(-100, 150))
+    metrics['activeConnections'] = max(0, metrics['activeConnections'] + random.randint(-50, 50))
+    metrics['apiCalls'] += random.randint(10, 100)
+    metrics['errors'] = max(0, metrics['errors'] + random.randint(-2, 3))
+    
+    metrics_data = MappingProxyType(metrics)
+
+host_sampler.add_listener(update_metrics)
+
+def get_system_metrics():
+    """Latest metrics snapshot as a dict; never waits for a sample"""
+    host_sampler.start()
+    return dict(metrics_data)
 
 def broadcast_metrics():
     """Broadcast updated metrics to all connected clients"""
     while True:
         try:
-            get_system_metrics()
-            socketio.emit('metrics_update', metrics_data)
+            broadcaster.publish('summary', get_system_metrics())
             
             # Occasionally send new alerts
             if random.random() < 0.1:  # 10% chance every 5 seconds
@@ -130,7 +151,7 @@ def broadcast_metrics():
                 }
                 alerts_data.insert(0, new_alert)
                 alerts_data[:] = alerts_data[:50]  # Keep only last 50 alerts
-                socketio.emit('new_alert', new_alert)
+                broadcaster.publish_event('alerts', 'new_alert', new_alert)
             
             time.sleep(5)  # Update every 5 seconds
         except Exception as e:
@@ -150,8 +171,7 @@ def health_check():
 @app.route('/api/metrics')
 def get_metrics():
     """Get current metrics"""
-    get_system_metrics()
-    return jsonify(metrics_data)
+    return jsonify(get_system_metrics())
 
 @app.route('/api/alerts')
 def get_alerts():
@@ -205,8 +225,7 @@ def handle_disconnect():
 @socketio.on('request_metrics')
 def handle_metrics_request():
     """Handle manual metrics request"""
-    get_system_metrics()
-    emit('metrics_update', metrics_data)
+    emit('metrics_update', get_system_metrics())
 
 @socketio.on('resolve_alert')
 def handle_resolve_alert(data):
@@ -216,7 +235,7 @@ def handle_resolve_alert(data):
         if alert['id'] == alert_id:
             alert['status'] = 'resolved'
             break
-    emit('alert_resolved', alert_id, broadcast=True)
+    broadcaster.publish_event('alerts', 'alert_resolved', alert_id)
 
 if __name__ == '__main__':
     print("🚀 Starting DevOps Monitoring Backend...")
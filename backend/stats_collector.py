@@ -0,0 +1,168 @@
+"""
+Container stats collection shared by the REST API and the monitor loop.
+
+Docker's one-shot stats call blocks for one to two seconds while the daemon
+takes two CPU samples, so stats are fetched for all running containers in
+parallel on a bounded worker pool and the latest result per container is kept
+in an in-memory snapshot.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import stage
+
+
+def calculate_usage(stats):
+    """Turn a raw Docker stats payload into the usage figures the API exposes"""
+    cpu_stats = stats['cpu_stats']
+    precpu_stats = stats['precpu_stats']
+
+    # Calculate CPU usage
+    cpu_delta = cpu_stats['cpu_usage']['total_usage'] - precpu_stats['cpu_usage']['total_usage']
+    system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+    online_cpus = cpu_stats.get('online_cpus') or len(cpu_stats['cpu_usage'].get('percpu_usage') or [1])
+    cpu_usage = (cpu_delta / system_delta) * online_cpus * 100 if system_delta > 0 else 0.0
+
+    # Calculate memory usage
+    memory_limit = stats['memory_stats'].get('limit', 0)
+    memory_usage = (stats['memory_stats'].get('usage', 0) / memory_limit) * 100 if memory_limit else 0.0
+
+    eth0 = stats.get('networks', {}).get('eth0', {})
+
+    return {
+        'cpu_usage': round(cpu_usage, 2),
+        'memory_usage': round(memory_usage, 2),
+        'memory_limit': memory_limit,
+        'network_rx': eth0.get('rx_bytes', 0),
+        'network_tx': eth0.get('tx_bytes', 0)
+    }
+
+
+class StatsCollector:
+    """Fetches stats for every running container concurrently and caches the latest sample"""
+
+    def __init__(self, docker_client, max_workers=8, interval=10, max_age=60, owns=None, inventory=None):
+        self.docker_client = docker_client
+        # Optional ContainerInventory to read running containers from instead of listing them
+        self.inventory = inventory
+        # Optional ``owns(container_id)`` filter when collection is sharded between instances
+        self.owns = owns
+        self.interval = interval
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stats')
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._last_refresh = 0.0
+        self._listeners = []
+
+    def fetch(self, container):
+        """One-shot stats for a container, as usage figures"""
+        with stage('docker_stats'):
+            stats = container.stats(stream=False)
+        return calculate_usage(stats)
+
+    def add_listener(self, callback):
+        """Call ``callback(container_id, sample)`` for every new sample"""
+        self._listeners.append(callback)
+
+    def _notify(self, container_id, sample):
+        for callback in self._listeners:
+            try:
+                callback(container_id, sample)
+            except Exception as e:
+                print(f"Stats listener error: {e}")
+
+    def record(self, container_id, name, usage):
+        """Store a sample produced elsewhere, e.g. by a persistent stats stream or the scheduler
+
+        Recorded samples count as a refresh, so reads do not trigger a full
+        collection while something else keeps the snapshot current.
+        """
+        sample = dict(usage, name=name, timestamp=time.time())
+        with self._lock:
+            self._snapshots[container_id] = sample
+            self._last_refresh = sample['timestamp']
+        self._notify(container_id, sample)
+
+    def discard(self, container_id):
+        """Forget a container that is no longer running"""
+        with self._lock:
+            self._snapshots.pop(container_id, None)
+
+    def running(self):
+        """Running containers this instance collects stats for"""
+        if self.inventory is not None:
+            containers = self.inventory.containers(status='running')
+        else:
+            with stage('docker_list'):
+                containers = self.docker_client.containers.list(filters={'status': 'running'})
+        if self.owns:
+            containers = [container for container in containers if self.owns(container.id)]
+        return containers
+
+    def refresh(self):
+        """Collect a fresh sample for every running container without a recent one"""
+        with self._refresh_lock:
+            containers = self.running()
+            now = time.time()
+            with self._lock:
+                stale = [container for container in containers
+                         if now - self._snapshots.get(container.id, {}).get('timestamp', 0) >= self.interval]
+            futures = {container: self._executor.submit(self.fetch, container) for container in stale}
+
+            fetched = {}
+            for container, future in futures.items():
+                try:
+                    usage = future.result()
+                except Exception as e:
+                    print(f"Stats collection error for {container.name}: {e}")
+                    continue
+                fetched[container.id] = dict(usage, name=container.name, timestamp=time.time())
+
+            running = {container.id for container in containers}
+            with self._lock:
+                for container_id in list(self._snapshots):
+                    if container_id not in running:
+                        del self._snapshots[container_id]
+                self._snapshots.update(fetched)
+                self._last_refresh = time.time()
+                snapshots = dict(self._snapshots)
+
+            for container_id, sample in fetched.items():
+                self._notify(container_id, sample)
+            return snapshots
+
+    def _ensure_fresh(self):
+        if time.time() - self._last_refresh > self.max_age:
+            self.refresh()
+
+    def get(self, container_id):
+        """Latest sample for one container, or None if it has not been collected"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._snapshots.get(container_id)
+
+    def snapshot(self):
+        """Latest sample for every running container, keyed by container ID"""
+        self._ensure_fresh()
+        with self._lock:
+            return dict(self._snapshots)
+
+    def _run(self):
+        while True:
+            started = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Stats collector error: {e}")
+            time.sleep(max(0, self.interval - (time.time() - started)))
+
+    def start(self):
+        """Start the background refresh loop"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
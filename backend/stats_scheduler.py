@@ -0,0 +1,216 @@
+"""
+Adaptive per-container stats scheduling.
+
+Instead of sampling every running container once per fixed interval, each
+container has its own next-due time in a heap. Containers that are close to
+an alert threshold or have an alert open are sampled every ``min_interval``
+seconds. Containers whose usage barely changes between samples back off
+towards ``max_interval``, and everything else is sampled every ``interval``.
+Due samples are fetched on a worker pool, subject to a global budget of
+fetches per second so the Docker daemon is not flooded when many containers
+fall due at once. The achieved interval of each container is tracked next to
+its target so that a budget too small for the fleet shows up as lag.
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import stats_interval
+
+TIERS = ('hot', 'normal', 'stable')
+
+
+class StatsScheduler:
+    """Samples containers through a StatsCollector, each at its own adaptive interval"""
+
+    def __init__(self, collector, interval=10, min_interval=2, max_interval=60, budget=20, max_workers=8,
+                 hot=None, stable_delta=2.0, backoff=1.5, sync_interval=1.0):
+        self.collector = collector
+        self.interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        # Fetches started per second across all containers
+        self.budget = budget
+        self.max_workers = max_workers
+        # Optional ``hot(name, sample)`` deciding whether a container needs the shortest interval
+        self.hot = hot
+        # Change in percentage points below which a sample counts as unchanged
+        self.stable_delta = stable_delta
+        self.backoff = backoff
+        self.sync_interval = sync_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stats-scheduler')
+        self._entries = {}
+        self._heap = []
+        self._in_flight = 0
+        self._tokens = float(budget)
+        self._refilled_at = time.monotonic()
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def sync(self):
+        """Schedule newly running containers immediately and drop those that stopped"""
+        containers = {container.id: container for container in self.collector.running()}
+        now = time.monotonic()
+        with self._lock:
+            for container_id, container in containers.items():
+                entry = self._entries.get(container_id)
+                if entry is None:
+                    self._entries[container_id] = {
+                        'container': container,
+                        'due': now,
+                        'interval': self.interval,
+                        'tier': 'normal',
+                        'sample': None,
+                        'started': None,
+                        'running': False,
+                        'achieved': None
+                    }
+                    heapq.heappush(self._heap, (now, container_id))
+                else:
+                    entry['container'] = container
+            gone = [container_id for container_id in self._entries if container_id not in containers]
+            for container_id in gone:
+                # Its heap entry is skipped when it comes up
+                del self._entries[container_id]
+        for container_id in gone:
+            self.collector.discard(container_id)
+
+    def _refill(self, now):
+        self._tokens = min(float(self.budget), self._tokens + (now - self._refilled_at) * self.budget)
+        self._refilled_at = now
+
+    def run_pending(self):
+        """Dispatch every due sample the budget and worker pool allow; returns seconds until more may be due"""
+        now = time.monotonic()
+        if now >= self._next_sync:
+            self.sync()
+            self._next_sync = now + self.sync_interval
+            self._publish()
+
+        dispatched = []
+        wait = self._next_sync - now
+        with self._lock:
+            self._refill(now)
+            while self._heap:
+                due, container_id = self._heap[0]
+                entry = self._entries.get(container_id)
+                if entry is None or entry['due'] != due or entry['running']:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    wait = min(wait, due - now)
+                    break
+                if self._in_flight >= self.max_workers:
+                    # Woken when a fetch completes
+                    break
+                if self._tokens < 1:
+                    wait = min(wait, (1 - self._tokens) / self.budget)
+                    break
+                heapq.heappop(self._heap)
+                self._tokens -= 1
+                self._in_flight += 1
+                if entry['started'] is not None:
+                    achieved = now - entry['started']
+                    entry['achieved'] = achieved if entry['achieved'] is None else \
+                        0.7 * entry['achieved'] + 0.3 * achieved
+                entry['started'] = now
+                entry['running'] = True
+                dispatched.append((container_id, entry))
+
+        for container_id, entry in dispatched:
+            self._executor.submit(self._sample, container_id, entry)
+        return max(0.0, wait)
+
+    def _next_interval(self, entry, usage):
+        previous = entry['sample']
+        if self.hot and self.hot(entry['container'].name, usage):
+            return 'hot', self.min_interval
+        if previous is not None and all(abs(usage[key] - previous[key]) < self.stable_delta
+                                        for key in ('cpu_usage', 'memory_usage')):
+            return 'stable', min(self.max_interval, max(entry['interval'], self.interval) * self.backoff)
+        return 'normal', self.interval
+
+    def _sample(self, container_id, entry):
+        container = entry['container']
+        try:
+            usage = self.collector.fetch(container)
+        except Exception as e:
+            print(f"Stats collection error for {container.name}: {e}")
+            usage = None
+
+        with self._lock:
+            self._in_flight -= 1
+            entry['running'] = False
+            current = self._entries.get(container_id) is entry
+            if current:
+                if usage is not None:
+                    entry['tier'], entry['interval'] = self._next_interval(entry, usage)
+                    entry['sample'] = usage
+                # Next sample one interval after this one started; missed samples are not caught up
+                entry['due'] = max(entry['started'] + entry['interval'], time.monotonic())
+                heapq.heappush(self._heap, (entry['due'], container_id))
+
+        if current and usage is not None:
+            self.collector.record(container_id, container.name, usage)
+        self._wake.set()
+
+    def report(self, detail=False):
+        """Target versus achieved sampling intervals, overall and optionally per container"""
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._entries.values())
+            in_flight = self._in_flight
+        tiers = {tier: 0 for tier in TIERS}
+        for entry in entries:
+            tiers[entry['tier']] += 1
+        achieved = [entry['achieved'] for entry in entries if entry['achieved'] is not None]
+
+        report = {
+            'containers': len(entries),
+            'in_flight': in_flight,
+            'budget_per_second': self.budget,
+            # Fetches per second the current targets need; above the budget every interval stretches
+            'demand_per_second': round(sum(1 / entry['interval'] for entry in entries), 2),
+            'overdue': sum(1 for entry in entries if not entry['running'] and entry['due'] < now - 1),
+            'tiers': tiers,
+            'target_interval': round(sum(entry['interval'] for entry in entries) / len(entries), 2)
+            if entries else None,
+            'achieved_interval': round(sum(achieved) / len(achieved), 2) if achieved else None
+        }
+        if detail:
+            report['servers'] = {
+                entry['container'].name: {
+                    'tier': entry['tier'],
+                    'target_interval': round(entry['interval'], 2),
+                    'achieved_interval': round(entry['achieved'], 2) if entry['achieved'] is not None else None
+                }
+                for entry in entries
+            }
+        return report
+
+    def _publish(self):
+        report = self.report()
+        if report['target_interval'] is not None:
+            stats_interval.labels('target').set(report['target_interval'])
+        if report['achieved_interval'] is not None:
+            stats_interval.labels('achieved').set(report['achieved_interval'])
+
+    def _run(self):
+        while True:
+            try:
+                wait = self.run_pending()
+            except Exception as e:
+                print(f"Stats scheduler error: {e}")
+                wait = 1.0
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def start(self):
+        """Start the scheduling loop"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
@@ -0,0 +1,168 @@
+"""
+Persistent Docker stats streams.
+
+Docker pushes a stats frame per container roughly every second over
+``container.stats(stream=True, decode=True)``. The stream manager keeps one of
+those streams open per running container, opening and closing them as the
+Docker event stream reports containers starting and stopping, and feeds every
+frame into the shared StatsCollector snapshot. Given a ContainerInventory, the
+manager follows the inventory's changes instead of opening its own event
+stream. A stream that fails drops its container's last sample and is reopened
+after ``reopen_delay`` seconds if the container is still running.
+"""
+
+import threading
+import time
+
+from instrumentation import stage
+from stats_collector import calculate_usage
+
+START_ACTIONS = {'start', 'unpause'}
+STOP_ACTIONS = {'die', 'stop', 'kill', 'pause', 'destroy'}
+
+
+class StatsStreamManager:
+    """Keeps one long-lived stats stream per running container"""
+
+    def __init__(self, docker_client, collector, inventory=None, reopen_delay=5):
+        self.docker_client = docker_client
+        self.collector = collector
+        self.inventory = inventory
+        self.reopen_delay = reopen_delay
+        self.owns = collector.owns
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._events_thread = None
+        self._started = False
+
+    def _consume(self, container, stop_event):
+        failed = False
+        try:
+            for frame in container.stats(stream=True, decode=True):
+                if stop_event.is_set():
+                    break
+                # The first frame has no previous CPU sample to diff against
+                if not frame.get('precpu_stats', {}).get('system_cpu_usage'):
+                    continue
+
+                usage = calculate_usage(frame)
+                self.collector.record(container.id, container.name, usage)
+        except Exception as e:
+            print(f"Stats stream error for {container.name}: {e}")
+            failed = True
+        finally:
+            with self._lock:
+                current = self._streams.get(container.id) is stop_event
+                if current:
+                    del self._streams[container.id]
+
+        if failed and current:
+            # The last sample would otherwise show as the container's stats until something else changes
+            self.collector.discard(container.id)
+            timer = threading.Timer(self.reopen_delay, self._reopen, args=(container,))
+            timer.daemon = True
+            timer.start()
+
+    def _reopen(self, container):
+        """Reopen a failed stream if its container is still running here"""
+        try:
+            container.reload()
+        except Exception as e:
+            # Gone, or Docker is down; the next sync opens it again if it comes back
+            print(f"Unable to reopen stats stream for {container.name}: {e}")
+            return
+        if container.status == 'running' and (not self.owns or self.owns(container.id)):
+            self.open_stream(container)
+
+    def open_stream(self, container):
+        """Start streaming stats for a container unless a stream is already open"""
+        with self._lock:
+            if container.id in self._streams:
+                return
+            stop_event = threading.Event()
+            self._streams[container.id] = stop_event
+
+        thread = threading.Thread(target=self._consume, args=(container, stop_event), daemon=True)
+        thread.start()
+
+    def close_stream(self, container_id):
+        """Stop streaming stats for a container"""
+        with self._lock:
+            stop_event = self._streams.pop(container_id, None)
+        if stop_event:
+            stop_event.set()
+        self.collector.discard(container_id)
+
+    def sync(self):
+        """Open streams for running containers and close the ones that went away"""
+        if self.inventory is not None:
+            containers = self.inventory.containers(status='running')
+        else:
+            with stage('docker_list'):
+                containers = self.docker_client.containers.list(filters={'status': 'running'})
+        if self.owns:
+            containers = [container for container in containers if self.owns(container.id)]
+        running = {container.id for container in containers}
+
+        for container in containers:
+            self.open_stream(container)
+
+        with self._lock:
+            gone = [container_id for container_id in self._streams if container_id not in running]
+        for container_id in gone:
+            self.close_stream(container_id)
+
+    def _handle_event(self, event):
+        action = event.get('Action') or event.get('status')
+        container_id = event.get('id') or event.get('Actor', {}).get('ID')
+        if not container_id:
+            return
+
+        if action in START_ACTIONS:
+            if self.owns and not self.owns(container_id):
+                return
+            try:
+                self.open_stream(self.docker_client.containers.get(container_id))
+            except Exception as e:
+                print(f"Unable to open stats stream for {container_id[:12]}: {e}")
+        elif action in STOP_ACTIONS:
+            self.close_stream(container_id)
+
+    def _handle_change(self, action, container_id, container):
+        """ContainerInventory listener opening or closing the stream of a changed container"""
+        if action == 'sync':
+            self.sync()
+        elif container is not None and container.status == 'running':
+            if not self.owns or self.owns(container_id):
+                self.open_stream(container)
+        else:
+            self.close_stream(container_id)
+
+    def _watch_events(self):
+        while True:
+            try:
+                # Re-sync after (re)connecting so nothing is missed while disconnected
+                self.sync()
+                for event in self.docker_client.events(decode=True, filters={'type': 'container'}):
+                    self._handle_event(event)
+            except Exception as e:
+                print(f"Docker events stream error: {e}")
+            time.sleep(5)
+
+    def start(self):
+        """Open streams for running containers and follow Docker events"""
+        if self._started:
+            return
+        self._started = True
+        if self.inventory is not None:
+            self.inventory.add_listener(self._handle_change)
+            try:
+                self.inventory.start()
+            except Exception as e:
+                # The listener syncs once a later inventory read manages to load
+                print(f"Stats stream start error: {e}")
+                return
+            self.sync()
+        else:
+            self._events_thread = threading.Thread(target=self._watch_events, daemon=True)
+            self._events_thread.start()
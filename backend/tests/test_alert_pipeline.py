@@ -0,0 +1,233 @@
+# Tests for the asynchronous alert pipeline and its Postgres writer
+import sys
+import os
+import json
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+fakeredis = pytest.importorskip('fakeredis')
+
+import alert_pipeline
+from alert_pipeline import AlertPipeline, AlertWriter, parse_time
+from alert_store import AlertStore
+from incidents import IncidentCorrelator
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+
+@contextmanager
+def fake_connect():
+    yield FakeConnection()
+
+
+@contextmanager
+def unavailable():
+    raise ConnectionError('postgres is down')
+    yield
+
+
+@pytest.fixture
+def store():
+    return AlertStore(fakeredis.FakeRedis())
+
+
+def test_changes_are_queued_then_applied_in_order(store):
+    writer = AlertWriter(connect=unavailable)
+    pipeline = AlertPipeline(store, writer=writer)
+    events = []
+    pipeline.add_listener(lambda event, payload: events.append((event, payload)))
+
+    pipeline.fire({'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.fire({'severity': 'critical', 'message': 'High memory', 'source': 'web1', 'type': 'memory_high'})
+    pipeline.clear('web1', 'cpu_high', auto_resolved=True)
+
+    # Nothing touches Redis until the consumer runs
+    assert pipeline.pending() == 3
+    assert store.list()[1] == 0
+
+    assert pipeline.process() == 3
+    assert [event for event, _ in events] == ['new_alert', 'new_alert', 'alert_resolved']
+    assert events[0][1]['id'] == 1
+    assert events[2][1] == 1
+    assert store.get(1)['resolved'] is True
+    assert store.get(2)['resolved'] is False
+
+    kinds = [kind for kind, _ in writer._buffer]
+    assert kinds == ['insert', 'insert', 'resolve']
+
+
+def test_failed_change_is_requeued(store, monkeypatch):
+    pipeline = AlertPipeline(store)
+    pipeline.fire({'message': 'first', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.resolve(1)
+
+    def broken(*args, **kwargs):
+        raise ConnectionError('redis is down')
+
+    monkeypatch.setattr(store, 'resolve', broken)
+    with pytest.raises(ConnectionError):
+        pipeline.process()
+
+    # The new alert was applied; the resolve waits for the next attempt
+    assert store.get(1)['resolved'] is False
+    assert pipeline.pending() == 1
+
+    monkeypatch.undo()
+    pipeline.process()
+    assert store.get(1)['resolved'] is True
+
+
+def test_failure_after_add_many_does_not_store_alerts_twice(store, monkeypatch):
+    writer = AlertWriter(connect=unavailable)
+    pipeline = AlertPipeline(store, writer=writer)
+    events = []
+    pipeline.add_listener(lambda event, payload: events.append((event, payload)))
+    pipeline.fire({'message': 'first', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.fire({'message': 'second', 'source': 'web2', 'type': 'cpu_high'})
+
+    real_insert = writer.insert
+    calls = []
+
+    def flaky_insert(alert):
+        calls.append(alert['id'])
+        if len(calls) == 2:
+            raise RuntimeError('buffer unavailable')
+        real_insert(alert)
+
+    monkeypatch.setattr(writer, 'insert', flaky_insert)
+    with pytest.raises(RuntimeError):
+        pipeline.process()
+    # The alerts are in Redis; only the failed Postgres insert is left
+    assert store.list()[1] == 2
+    assert pipeline.pending() == 1
+
+    pipeline.process()
+    assert store.list()[1] == 2
+    assert calls == [1, 2, 2]
+    assert [row[0] for _, row in writer._buffer] == [1, 2]
+    assert [event for event, _ in events] == ['new_alert', 'new_alert']
+
+
+def test_failed_incident_update_is_retried_without_new_alerts(store, monkeypatch):
+    pipeline = AlertPipeline(store, correlator=IncidentCorrelator(window=300))
+    pipeline.fire({'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.process()
+
+    pipeline.fire({'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.fire({'severity': 'warning', 'message': 'High memory', 'source': 'web2', 'type': 'memory_high'})
+
+    def broken(*args, **kwargs):
+        raise ConnectionError('redis is down')
+
+    monkeypatch.setattr(store, 'update', broken)
+    with pytest.raises(ConnectionError):
+        pipeline.process()
+    assert store.list()[1] == 2
+
+    monkeypatch.undo()
+    pipeline.process()
+    assert store.list()[1] == 2
+    assert store.get(1)['occurrences'] == 2
+
+
+def test_repeated_alerts_update_one_incident(store):
+    writer = AlertWriter(connect=unavailable)
+    pipeline = AlertPipeline(store, writer=writer, correlator=IncidentCorrelator(window=300))
+    events = []
+    pipeline.add_listener(lambda event, payload: events.append((event, payload)))
+
+    for _ in range(3):
+        pipeline.fire({'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.process()
+    for _ in range(50):
+        pipeline.fire({'severity': 'critical', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.process()
+
+    assert store.list()[1] == 1
+    assert [event for event, _ in events] == ['new_alert', 'incident_updated']
+    assert events[0][1]['occurrences'] == 3
+    assert events[1][1]['id'] == 1 and events[1][1]['occurrences'] == 53
+    assert store.get(1)['occurrences'] == 53
+    assert store.get(1)['severity'] == 'critical'
+    assert [kind for kind, _ in writer._buffer] == ['insert', 'update']
+
+    # Once cleared, the next alert opens a new incident
+    pipeline.clear('web1', 'cpu_high', auto_resolved=True)
+    pipeline.fire({'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+    pipeline.process()
+    assert store.get(1)['resolved'] is True
+    assert store.get(2)['occurrences'] == 1
+
+
+def test_writer_batches_inserts_before_resolves(monkeypatch):
+    calls = []
+    monkeypatch.setattr(alert_pipeline, 'execute_values',
+                        lambda cursor, sql, rows, **kwargs: calls.append((sql, rows)))
+    writer = AlertWriter(connect=fake_connect)
+
+    writer.resolve(7, '2024-01-01T00:05:00', auto_healed=True)
+    writer.insert({'id': 7, 'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high',
+                   'timestamp': '2024-01-01T00:00:00', 'resolved': False, 'value': 91.5})
+    writer.insert({'id': 8, 'source': 'web2', 'type': 'cpu_high', 'timestamp': '2024-01-01T00:01:00'})
+
+    assert writer.flush() == 3
+    assert len(calls) == 2
+    assert calls[0][0] == alert_pipeline.INSERT_SQL
+    assert [row[0] for row in calls[0][1]] == [7, 8]
+    assert json.loads(calls[0][1][0][-1]) == {'value': 91.5}
+    # Required columns get defaults instead of failing the whole batch
+    assert calls[0][1][1][1:3] == ('info', '')
+    assert calls[1][0] == alert_pipeline.RESOLVE_SQL
+    assert calls[1][1][0][:3] == (7, alert_pipeline._utc('2024-01-01T00:05:00'), True)
+
+
+def test_writer_keeps_the_latest_update_per_alert(monkeypatch):
+    calls = []
+    monkeypatch.setattr(alert_pipeline, 'execute_values',
+                        lambda cursor, sql, rows, **kwargs: calls.append((sql, rows)))
+    writer = AlertWriter(connect=fake_connect)
+
+    writer.update(7, severity='warning', occurrences=2)
+    writer.update(7, severity='critical', occurrences=5)
+    writer.flush()
+
+    assert calls[0][0] == alert_pipeline.UPDATE_SQL
+    assert len(calls[0][1]) == 1
+    assert calls[0][1][0][1] == 'critical'
+    assert json.loads(calls[0][1][0][2]) == {'occurrences': 5}
+
+
+def test_old_ranges_are_read_from_postgres(store, monkeypatch):
+    queries = []
+    monkeypatch.setattr(alert_pipeline, 'query_alerts', lambda **kwargs: queries.append(kwargs) or ([], 0))
+    pipeline = AlertPipeline(store, writer=AlertWriter(connect=fake_connect))
+    store.add({'message': 'recent', 'source': 'web1', 'type': 'cpu_high'})
+    horizon = store.horizon()
+
+    alerts, total = pipeline.list(since=horizon - 1)
+    assert queries and queries[0]['since'] == horizon - 1
+
+    alerts, total = pipeline.list(since=horizon, source='web1')
+    assert total == 1 and alerts[0]['message'] == 'recent'
+    assert len(queries) == 1
+
+
+def test_parse_time():
+    assert parse_time('1700000000') == 1700000000.0
+    assert parse_time('2024-01-01T00:00:00Z') == parse_time('2024-01-01T00:00:00') == 1704067200.0
+    with pytest.raises(ValueError):
+        parse_time('yesterday')
@@ -0,0 +1,100 @@
+# Tests for the indexed Redis alert store
+import sys
+import os
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from alert_store import AlertStore
+
+
+@pytest.fixture
+def store():
+    return AlertStore(fakeredis.FakeRedis(), max_alerts=5)
+
+
+def test_add_and_get(store):
+    alert = store.add({'severity': 'warning', 'message': 'High CPU', 'source': 'web1', 'type': 'cpu_high'})
+
+    assert alert['id'] == 1
+    assert alert['resolved'] is False
+    assert store.get(alert['id'])['message'] == 'High CPU'
+    assert store.get(999) is None
+
+
+def test_list_is_newest_first_and_paginated(store):
+    for i in range(4):
+        store.add({'message': f'alert {i}', 'source': 'web1', 'type': 'cpu_high'})
+
+    alerts, total = store.list(limit=2)
+    assert total == 4
+    assert [a['message'] for a in alerts] == ['alert 3', 'alert 2']
+
+    alerts, _ = store.list(offset=2, limit=2)
+    assert [a['message'] for a in alerts] == ['alert 1', 'alert 0']
+
+
+def test_filters_use_secondary_indexes(store):
+    first = store.add({'source': 'web1', 'type': 'cpu_high'})
+    store.add({'source': 'web1', 'type': 'memory_high'})
+    store.add({'source': 'web2', 'type': 'cpu_high'})
+    store.resolve(first['id'])
+
+    assert store.list(source='web1')[1] == 2
+    assert store.list(alert_type='cpu_high')[1] == 2
+    assert store.list(resolved=False)[1] == 2
+
+    alerts, total = store.list(source='web1', alert_type='cpu_high', resolved=True)
+    assert total == 1
+    assert alerts[0]['id'] == first['id']
+
+
+def test_resolve_moves_state_index(store):
+    alert = store.add({'source': 'web1', 'type': 'cpu_high'})
+
+    resolved = store.resolve(alert['id'], auto_healed=True)
+
+    assert resolved['resolved'] is True
+    assert resolved['auto_healed'] is True
+    assert store.list(resolved=False)[1] == 0
+    assert store.list(resolved=True)[1] == 1
+    assert store.resolve(12345) is None
+
+
+def test_retention_by_size(store):
+    for i in range(8):
+        store.add({'message': f'alert {i}', 'source': f'web{i % 2}', 'type': 'cpu_high'})
+
+    alerts, total = store.list(limit=100)
+    assert total == 5
+    assert alerts[-1]['message'] == 'alert 3'
+    assert store.list(source='web0')[1] + store.list(source='web1')[1] == 5
+
+
+def test_import_legacy_blob(store):
+    store.redis.set('alerts', json.dumps([
+        {'id': 2, 'message': 'newer', 'source': 'web1', 'type': 'cpu_high', 'resolved': False},
+        {'id': 1, 'message': 'older', 'source': 'web1', 'type': 'cpu_high', 'resolved': True}
+    ]))
+
+    assert store.import_legacy() == 2
+    alerts, total = store.list()
+    assert [a['message'] for a in alerts] == ['newer', 'older']
+    assert store.list(resolved=True)[1] == 1
+    assert store.redis.get('alerts') is None
+
+
+def test_add_many_and_reserved_ids(store):
+    store.reserve_ids(41)
+    alerts = store.add_many([{'message': 'a', 'source': 'web1'}, {'message': 'b', 'source': 'web2'}],
+                            scores=[1000, 1001])
+
+    assert [alert['id'] for alert in alerts] == [42, 43]
+    assert store.horizon() == 1000
+    # Reserving below the current counter changes nothing
+    store.reserve_ids(10)
+    assert store.add({'message': 'c'})['id'] == 44
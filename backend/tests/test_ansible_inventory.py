@@ -0,0 +1,115 @@
+# Tests for the generated Ansible inventory
+import sys
+import os
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ansible_inventory import AnsibleInventory, parse_ini
+
+
+class FakeContainer:
+    def __init__(self, container_id, name, labels=None, status='running'):
+        self.id = container_id
+        self.name = name
+        self.labels = labels or {}
+        self.status = status
+
+
+class FakeInventory:
+    def __init__(self, containers):
+        self._containers = containers
+
+    def containers(self, status=None):
+        return [container for container in self._containers if status is None or container.status == status]
+
+
+class FakeHost:
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+
+
+class FakeDockerHosts:
+    def __init__(self):
+        self.hosts = {'edge': FakeHost('edge', 'tcp://10.0.0.5:2376')}
+
+    def servers(self):
+        return [
+            {'id': 'bbbbbbbbbbbb', 'name': 'web1', 'status': 'running', 'host': 'edge'},
+            {'id': 'cccccccccccc', 'name': 'old', 'status': 'exited', 'host': 'edge'}
+        ]
+
+
+STATIC = """
+[webservers]
+web1 ansible_host=web1 ansible_connection=docker
+legacy ansible_host=10.0.0.9  # not a container
+
+[databases]
+postgres
+
+[backend:children]
+webservers
+databases
+
+[webservers:vars]
+http_port=8080
+
+[all:vars]
+ansible_user=root
+"""
+
+
+def test_parse_ini(tmp_path):
+    path = tmp_path / 'inventory.ini'
+    path.write_text(STATIC)
+    hosts, groups = parse_ini(str(path))
+    assert hosts['legacy'] == {'ansible_host': '10.0.0.9'}
+    assert groups['webservers'] == {'hosts': ['web1', 'legacy'], 'children': [], 'vars': {'http_port': '8080'}}
+    assert groups['backend']['children'] == ['webservers', 'databases']
+    assert groups['all']['vars'] == {'ansible_user': 'root'}
+
+
+def test_parse_ini_rejects_unknown_sections(tmp_path):
+    path = tmp_path / 'inventory.ini'
+    path.write_text('[webservers:meta]\nweb1\n')
+    with pytest.raises(ValueError, match='unsupported section'):
+        parse_ini(str(path))
+
+
+def test_inventory_merges_containers_remote_hosts_and_static_groups(tmp_path):
+    static = tmp_path / 'inventory.ini'
+    static.write_text(STATIC)
+    containers = [
+        FakeContainer('a' * 64, 'web1', {'autoguard.ansible.groups': 'frontend, canary'}),
+        FakeContainer('d' * 64, 'cache'),
+        FakeContainer('e' * 64, 'crashed', status='exited')
+    ]
+    inventory = AnsibleInventory(FakeInventory(containers), str(tmp_path / 'out' / 'inventory.json'),
+                                 docker_hosts=FakeDockerHosts(), static_path=str(static), local_name='local')
+
+    data = json.loads(open(inventory.write()).read())['all']
+
+    assert data['vars'] == {'ansible_user': 'root'}
+    assert data['hosts']['web1']['container_id'] == 'a' * 12
+    assert data['hosts']['legacy'] == {'ansible_host': '10.0.0.9'}
+    assert data['hosts']['web1.edge']['ansible_docker_extra_args'] == '-H tcp://10.0.0.5:2376'
+    # Stopped containers are kept so heals can be limited to them
+    assert data['hosts']['crashed']['container_status'] == 'exited'
+    assert data['hosts']['old.edge']['container_status'] == 'exited'
+
+    children = {group: set(members['hosts']) for group, members in data['children'].items()}
+    assert children['webservers'] == {'web1', 'legacy'}
+    assert children['docker_local'] == {'web1', 'cache', 'crashed'}
+    assert children['docker_edge'] == {'web1.edge', 'old.edge'}
+    assert children['frontend'] == children['canary'] == {'web1'}
+    assert set(data['children']['backend']['children']) == {'webservers', 'databases'}
+    assert data['children']['webservers']['vars'] == {'http_port': '8080'}
+    assert 'all' not in data['children']
+
+    full = {'all': data}
+    assert AnsibleInventory.unknown(full, 'crashed,backend,web*') == []
+    assert AnsibleInventory.unknown(full, 'crashed,ghost') == ['ghost']
@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeDockerClient
+from benchmarks.harness import compare, measure, percentile, summarize
+from stats_collector import calculate_usage
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([5], 99) == 5
+    assert percentile([], 50) is None
+
+
+def test_summarize_reports_milliseconds_and_throughput():
+    result = summarize([0.001, 0.002, 0.003, 0.004], elapsed=0.5, errors=1)
+    assert result['requests'] == 4
+    assert result['errors'] == 1
+    assert result['p50_ms'] == 2.0
+    assert result['p99_ms'] == 4.0
+    assert result['rps'] == 8.0
+
+
+def test_measure_counts_failures_and_per_thread_state():
+    states = []
+
+    def setup():
+        states.append(object())
+        return len(states)
+
+    result = measure(lambda state: state is not None and len(states) < 100, 20, concurrency=4, setup=setup)
+    assert result['requests'] == 20
+    assert result['errors'] == 0
+    assert 1 <= len(states) <= 4
+
+    assert measure(lambda state: 1 / 0, 5)['errors'] == 5
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = {'http': [{'name': 'a', 'p99_ms': 10.0, 'rps': 100.0}, {'name': 'b', 'p99_ms': 10.0, 'rps': 100.0}]}
+    current = {'http': [{'name': 'a', 'p99_ms': 10.5, 'rps': 80.0}, {'name': 'b', 'p99_ms': 20.0, 'rps': 100.0},
+                        {'name': 'new', 'p99_ms': 1.0, 'rps': 1.0}]}
+
+    regressions = {(name, metric) for name, metric, *_ in compare(current, baseline, threshold=10)}
+    assert regressions == {('a', 'rps'), ('b', 'p99_ms')}
+
+
+def test_fake_docker_client_produces_usable_stats():
+    client = FakeDockerClient(20, stopped_ratio=0.1)
+    containers = client.containers.list(all=True)
+    running = client.containers.list(filters={'status': 'running'})
+
+    assert len(containers) == 20
+    assert len(running) == 18
+    assert client.containers.get(running[0].id[:12]) is running[0]
+
+    usage = calculate_usage(running[0].stats(stream=False))
+    assert 0 <= usage['cpu_usage'] <= 400
+    assert 0 < usage['memory_usage'] <= 100
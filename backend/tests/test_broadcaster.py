@@ -0,0 +1,100 @@
+# Tests for delta-encoded topic broadcasting
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcaster import Broadcaster
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+
+
+def make_broadcaster():
+    socketio = FakeSocketIO()
+    broadcaster = Broadcaster(socketio)
+    broadcaster._thread = 'not started'
+    return broadcaster, socketio.emitted
+
+
+def test_updates_within_a_tick_are_coalesced_into_one_delta():
+    broadcaster, emitted = make_broadcaster()
+
+    broadcaster.publish('summary', {'cpu': 10, 'memory': 50})
+    broadcaster.publish('summary', {'cpu': 20})
+    broadcaster.flush()
+
+    assert emitted == [('topic_update', {'topic': 'summary', 'seq': 1, 'changes': {'cpu': 20, 'memory': 50},
+                                         'removed': []}, 'topic:summary')]
+
+
+def test_only_changed_fields_are_sent():
+    broadcaster, emitted = make_broadcaster()
+    broadcaster.publish('summary', {'cpu': 10, 'memory': 50})
+    broadcaster.flush()
+    emitted.clear()
+
+    broadcaster.publish('summary', {'cpu': 10, 'memory': 55})
+    broadcaster.flush()
+    assert emitted[0][1]['changes'] == {'memory': 55}
+    assert emitted[0][1]['seq'] == 2
+
+    emitted.clear()
+    broadcaster.publish('summary', {'cpu': 10, 'memory': 55})
+    broadcaster.flush()
+    assert emitted == []
+
+
+def test_removed_fields_and_snapshot():
+    broadcaster, emitted = make_broadcaster()
+    broadcaster.publish('servers', {'web1': {'cpu': 1}, 'web2': {'cpu': 2}})
+    broadcaster.flush()
+
+    broadcaster.remove('servers', 'web1', 'missing')
+    broadcaster.flush()
+
+    assert emitted[-1][1]['removed'] == ['web1']
+    assert broadcaster.snapshot('servers') == ({'web2': {'cpu': 2}}, 2)
+
+
+def test_events_are_batched_per_topic():
+    broadcaster, emitted = make_broadcaster()
+
+    broadcaster.publish_event('alerts', 'new_alert', {'id': 1})
+    broadcaster.publish_event('alerts', 'alert_resolved', 1)
+    broadcaster.flush()
+
+    assert emitted == [('topic_events', {'topic': 'alerts', 'events': [
+        {'event': 'new_alert', 'data': {'id': 1}},
+        {'event': 'alert_resolved', 'data': 1}
+    ]}, 'topic:alerts')]
+
+
+def test_shared_store_serves_snapshots_and_continues_sequence():
+    fakeredis = pytest.importorskip('fakeredis')
+    store = fakeredis.FakeRedis()
+
+    leader = Broadcaster(FakeSocketIO(), store=store)
+    leader._thread = 'not started'
+    leader.publish('summary', {'cpu': 10})
+    leader.flush()
+    leader.publish('summary', {'cpu': 20})
+    leader.flush()
+
+    follower = Broadcaster(FakeSocketIO(), store=store)
+    follower._thread = 'not started'
+    assert follower.snapshot('summary') == ({'cpu': 20}, 2)
+
+    # A new leader continues from the stored sequence and only sends what changed
+    follower.publish('summary', {'cpu': 20, 'memory': 5})
+    follower.flush()
+    assert follower.socketio.emitted == [
+        ('topic_update', {'topic': 'summary', 'seq': 3, 'changes': {'memory': 5}, 'removed': []}, 'topic:summary')
+    ]
@@ -0,0 +1,92 @@
+# Tests for lazily created clients and import-time startup
+import sys
+import os
+import json
+import subprocess
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clients import ClientUnavailable, LazyClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeClient:
+    def ping(self):
+        return True
+
+
+def test_created_once_on_first_use():
+    calls = []
+
+    def factory(url, timeout=None):
+        calls.append((url, timeout))
+        return FakeClient()
+
+    client = LazyClient('fake', factory, 'fake://host', timeout=3)
+    assert calls == []
+    assert client.ping() and client.ping()
+    assert calls == [('fake://host', 3)]
+
+
+def test_failures_are_cached_then_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(time.time())
+        if len(attempts) == 1:
+            raise ConnectionError('refused')
+        return FakeClient()
+
+    client = LazyClient('fake', factory, retry_interval=0.1)
+    with pytest.raises(ClientUnavailable, match='fake unavailable: refused'):
+        client.ping()
+    # Within the retry interval the error is raised without calling the factory
+    with pytest.raises(ClientUnavailable):
+        client.ping()
+    assert len(attempts) == 1
+
+    time.sleep(0.15)
+    assert client.ping()
+    assert len(attempts) == 2
+
+
+def test_special_attributes_do_not_connect():
+    client = LazyClient('fake', lambda: pytest.fail('connected'))
+    assert not hasattr(client, '__deepcopy__')
+    assert 'not connected' in repr(client)
+
+
+def test_app_imports_and_serves_health_without_docker_or_redis():
+    script = (
+        "import json, app\n"
+        "client = app.app.test_client()\n"
+        "print(json.dumps([client.get('/health').status_code, client.get('/health/ready').get_json()]))\n"
+    )
+    env = dict(os.environ, DOCKER_HOST='unix:///nonexistent/docker.sock', REDIS_URL='redis://127.0.0.1:1/0',
+               SOCKETIO_ASYNC_MODE='threading', METRICS_PERSISTENCE='false', ALERT_PERSISTENCE='false')
+    completed = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+
+    health, readiness = json.loads(completed.stdout.strip().splitlines()[-1])
+    assert health == 200
+    assert readiness['status'] == 'unavailable'
+    assert set(readiness['checks']) == {'docker', 'redis'}
+    assert all(result.startswith(f'{name} unavailable') for name, result in readiness['checks'].items())
+
+
+def test_importing_app_leaves_heavy_dependencies_unloaded():
+    script = (
+        "import json, sys, app\n"
+        "print(json.dumps(sorted(name for name in ('psycopg2', 'numpy', 'docker', 'yaml') if name in sys.modules)))\n"
+    )
+    env = dict(os.environ, DOCKER_HOST='unix:///nonexistent/docker.sock', REDIS_URL='redis://127.0.0.1:1/0',
+               SOCKETIO_ASYNC_MODE='threading')
+    completed = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == []
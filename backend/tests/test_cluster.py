@@ -0,0 +1,110 @@
+# Tests for leader election, membership and stats sharding
+import sys
+import os
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from cluster import Cluster, HashRing, LeaseLock, SharedStats
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def test_hash_ring_moves_only_a_share_of_keys_when_a_node_joins():
+    keys = [f'container-{i}' for i in range(1000)]
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b', 'c', 'd'])
+
+    owners = {before.node_for(key) for key in keys}
+    moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+
+    assert owners == {'a', 'b', 'c'}
+    assert all(after.node_for(key) == 'd' for key in moved)
+    assert 100 < len(moved) < 400
+    assert HashRing().node_for('x') is None
+
+
+def test_lease_is_exclusive_renewable_and_released(redis_client):
+    first = LeaseLock(redis_client, 'leader', 'one', ttl=5)
+    second = LeaseLock(redis_client, 'leader', 'two', ttl=5)
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()
+    assert first.holder() == 'one'
+
+    second.release()
+    assert first.holder() == 'one'
+    first.release()
+    assert second.acquire()
+
+
+def test_lease_fails_over_when_it_expires(redis_client):
+    first = LeaseLock(redis_client, 'leader', 'one', ttl=0.2)
+    second = LeaseLock(redis_client, 'leader', 'two', ttl=0.2)
+
+    assert first.acquire()
+    time.sleep(0.3)
+    assert second.acquire()
+    assert not first.acquire()
+
+
+def test_one_leader_and_disjoint_shards(redis_client):
+    members = [Cluster(redis_client, identity=name) for name in ('a', 'b', 'c')]
+    elected = []
+    members[0].on_leadership(elected.append)
+
+    for member in members:
+        member.heartbeat()
+    for member in members:
+        member.heartbeat()
+
+    assert [member.is_leader for member in members] == [True, False, False]
+    assert elected == [True]
+    assert members[2].members() == ['a', 'b', 'c']
+
+    keys = [f'container-{i}' for i in range(300)]
+    for key in keys:
+        assert sum(member.owns(key) for member in members) == 1
+
+
+def test_leader_leaving_hands_over(redis_client):
+    first = Cluster(redis_client, identity='a')
+    second = Cluster(redis_client, identity='b')
+    first.heartbeat()
+    second.heartbeat()
+
+    first.leave()
+    second.heartbeat()
+
+    assert second.is_leader
+    assert second.members() == ['b']
+    assert all(second.owns(f'container-{i}') for i in range(50))
+
+
+def test_stale_members_drop_out(redis_client):
+    stale = Cluster(redis_client, identity='stale', ttl=10)
+    live = Cluster(redis_client, identity='live', ttl=10)
+    stale.heartbeat(now=time.time() - 60)
+
+    assert live.heartbeat() == {'live'}
+
+
+def test_shared_stats_merge_members_and_expire_old_samples(redis_client):
+    shared = SharedStats(redis_client, max_age=30)
+    now = time.time()
+    shared.record_sample('c1', {'name': 'web', 'cpu_usage': 10.0, 'timestamp': now})
+    shared.record_sample('c2', {'name': 'db', 'cpu_usage': 20.0, 'timestamp': now})
+    shared.record_sample('c3', {'name': 'old', 'cpu_usage': 30.0, 'timestamp': now - 60})
+
+    assert set(shared.snapshot()) == {'c1', 'c2'}
+    assert shared.get('c2')['cpu_usage'] == 20.0
+    assert shared.get('c3') is None
+    assert not redis_client.hexists('cluster:stats', 'c3')
@@ -0,0 +1,152 @@
+# Tests for remote Docker host collection against fake Engine API servers
+import sys
+import os
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('docker')
+
+from docker_hosts import CircuitBreaker, DockerHostRegistry, parse_hosts
+
+STATS = {
+    'cpu_stats': {'cpu_usage': {'total_usage': 200}, 'system_cpu_usage': 2000, 'online_cpus': 1},
+    'precpu_stats': {'cpu_usage': {'total_usage': 100}, 'system_cpu_usage': 1000},
+    'memory_stats': {'usage': 50, 'limit': 200},
+    'networks': {'eth0': {'rx_bytes': 1, 'tx_bytes': 2}}
+}
+
+
+class FakeDaemon(ThreadingHTTPServer):
+    """Answers the few Engine API calls the registry makes"""
+    daemon_threads = True
+
+    def __init__(self, containers, delay=0.0):
+        self.containers = containers
+        self.delay = delay
+        self.requests = 0
+        super().__init__(('127.0.0.1', 0), FakeDaemonHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'tcp://127.0.0.1:{self.server_address[1]}'
+
+
+class FakeDaemonHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        daemon = self.server
+        daemon.requests += 1
+        path = self.path.split('?')[0]
+        if path.endswith('/version'):
+            return self._send({'ApiVersion': '1.41', 'Version': '20.10.0'})
+        time.sleep(daemon.delay)
+        if path.endswith('/_ping'):
+            return self._send('OK')
+        if path.endswith('/containers/json'):
+            return self._send([
+                {'Id': f'{name}{"0" * 60}'[:64], 'Names': [f'/{name}'], 'State': state, 'Image': 'nginx:1.25',
+                 'Created': 1700000000}
+                for name, state in daemon.containers
+            ])
+        if re.search(r'/containers/\w+/stats$', path):
+            return self._send(STATS)
+        self.send_error(404)
+
+
+@pytest.fixture
+def daemons():
+    servers = []
+
+    def start(containers, delay=0.0):
+        daemon = FakeDaemon(containers, delay)
+        servers.append(daemon)
+        return daemon
+
+    yield start
+    for daemon in servers:
+        daemon.shutdown()
+        daemon.server_close()
+
+
+def test_parse_hosts():
+    assert parse_hosts('web=tcp://10.0.0.5:2376, db=ssh://ops@db1') == [
+        {'name': 'web', 'url': 'tcp://10.0.0.5:2376'}, {'name': 'db', 'url': 'ssh://ops@db1'}]
+    assert parse_hosts('') == []
+    with pytest.raises(ValueError):
+        parse_hosts('tcp://10.0.0.5:2376')
+
+
+def test_merged_host_labelled_view(daemons):
+    east = daemons([('web1', 'running'), ('batch', 'exited')], delay=0.2)
+    west = daemons([('web2', 'running')], delay=0.2)
+    registry = DockerHostRegistry([{'name': 'east', 'url': east.url}, {'name': 'west', 'url': west.url}],
+                                  timeout=5)
+
+    assert registry.refresh() == {'east': None, 'west': None}
+
+    servers = {server['name']: server for server in registry.servers()}
+    assert {name: server['host'] for name, server in servers.items()} == {
+        'web1': 'east', 'batch': 'east', 'web2': 'west'}
+    assert servers['web1']['cpu_usage'] == 10.0 and servers['web1']['memory_usage'] == 25.0
+    assert 'cpu_usage' not in servers['batch']
+    assert [server['name'] for server in registry.servers('west')] == ['web2']
+    assert [host['state'] for host in registry.status()] == ['closed', 'closed']
+
+
+def test_slow_host_times_out_and_trips_its_breaker(daemons):
+    fast = daemons([('web1', 'running')])
+    slow = daemons([('web2', 'running')], delay=3)
+    registry = DockerHostRegistry([{'name': 'fast', 'url': fast.url}, {'name': 'slow', 'url': slow.url}],
+                                  timeout=0.5, failure_threshold=1, reset_timeout=60)
+
+    started = time.monotonic()
+    errors = registry.refresh()
+    assert time.monotonic() - started < 1.5
+    assert errors == {'fast': None, 'slow': 'timed out after 0.5s'}
+    assert [server['host'] for server in registry.servers()] == ['fast']
+
+    # The open breaker skips the slow host entirely
+    requests = slow.requests
+    started = time.monotonic()
+    assert registry.refresh() == {'fast': None}
+    assert time.monotonic() - started < 0.5
+    assert slow.requests == requests
+    assert {host['name']: host['state'] for host in registry.status()} == {'fast': 'closed', 'slow': 'open'}
+
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    # Only one trial at a time
+    assert breaker.state == 'half_open' and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
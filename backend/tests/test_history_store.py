@@ -0,0 +1,74 @@
+# Tests for the columnar per-container history store
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip('numpy')
+
+from history_store import HistoryStore
+
+
+def fill(store, ticks, sources=('web', 'db')):
+    for now in range(ticks):
+        store.append({source: {'cpu_usage': now + i / 10} for i, source in enumerate(sources)}, now=now)
+
+
+def test_windows_are_oldest_first_and_wrap_around():
+    store = HistoryStore(['cpu_usage'], size=5, mirror=3)
+    fill(store, 8)
+
+    timestamps, values = store.series('web', 'cpu_usage')
+    assert list(timestamps) == [3, 4, 5, 6, 7]
+    assert list(values) == [3, 4, 5, 6, 7]
+    assert len(store) == 5
+
+
+def test_short_windows_are_views_even_across_the_wrap():
+    store = HistoryStore(['cpu_usage'], size=5, mirror=3)
+    for ticks in range(1, 13):
+        store.append({'web': {'cpu_usage': ticks}}, now=ticks)
+        timestamps, windows = store.latest(3)
+        expected = list(range(max(1, ticks - 2), ticks + 1))
+        assert list(timestamps) == expected
+        assert list(windows['cpu_usage'][store.rows['web']]) == expected
+        assert np.shares_memory(windows['cpu_usage'], store._columns['cpu_usage'])
+
+
+def test_missing_sources_are_released_and_rows_reused():
+    store = HistoryStore(['cpu_usage'], size=4, capacity=2)
+    fill(store, 2)
+    web_row = store.rows['web']
+
+    released = store.append({'db': {'cpu_usage': 1}, 'cache': {'cpu_usage': 2}, 'queue': {'cpu_usage': 3}}, now=2)
+
+    assert released == {'web': web_row}
+    assert store.capacity == 4
+    assert set(store.rows) == {'db', 'cache', 'queue'}
+    # A reused row starts without the previous owner's samples
+    assert [sample['cpu_usage'] for sample in store.history('cache')] == [2]
+
+
+def test_history_skips_unrecorded_ticks_and_filters_by_time():
+    store = HistoryStore(['cpu_usage', 'memory_usage'], size=10)
+    fill(store, 3, sources=('web',))
+    store.append({'web': {'cpu_usage': 50}}, now=3)
+
+    history = store.history('web', since=2)
+    assert history == [
+        {'cpu_usage': 2.0, 'memory_usage': None, 'timestamp': 2.0},
+        {'cpu_usage': 50.0, 'memory_usage': None, 'timestamp': 3.0}
+    ]
+    assert store.history('unknown') == []
+
+
+def test_memory_is_fixed_by_size_and_capacity():
+    store = HistoryStore(['cpu_usage', 'memory_usage', 'network_rx', 'network_tx'], size=3600, mirror=60,
+                         capacity=512)
+    before = store.nbytes
+    fill(store, 100, sources=[f'c{i}' for i in range(500)])
+
+    assert store.nbytes == before
+    assert before < 70 * 1024 * 1024
@@ -0,0 +1,110 @@
+# Tests for the background host metrics sampler
+import sys
+import os
+import time
+from collections import namedtuple
+
+import psutil
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import host_sampler
+from host_sampler import HostSampler
+
+CPUTimes = namedtuple('CPUTimes', 'user system idle iowait')
+DiskIO = namedtuple('DiskIO', 'read_count write_count read_bytes write_bytes')
+NetIO = namedtuple('NetIO', 'bytes_sent bytes_recv packets_sent packets_recv')
+Memory = namedtuple('Memory', 'percent used total')
+Usage = namedtuple('Usage', 'percent')
+
+
+class FakePsutil:
+    def __init__(self):
+        self.now = 1000.0
+        self.cores = [CPUTimes(10, 10, 80, 0), CPUTimes(40, 10, 50, 0)]
+        self.disk = DiskIO(100, 50, 10000, 5000)
+        self.net = NetIO(2000, 4000, 20, 40)
+
+    def advance(self, seconds, cores, disk, net):
+        self.now += seconds
+        self.cores, self.disk, self.net = cores, disk, net
+
+    def cpu_times(self, percpu=False):
+        if percpu:
+            return list(self.cores)
+        return CPUTimes(*(sum(values) for values in zip(*self.cores)))
+
+    def disk_io_counters(self):
+        return self.disk
+
+    def net_io_counters(self):
+        return self.net
+
+    def boot_time(self):
+        return 900.0
+
+    def virtual_memory(self):
+        return Memory(42.0, 4, 8)
+
+    def disk_usage(self, path):
+        return Usage(55.5)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakePsutil()
+    monkeypatch.setattr(host_sampler, 'psutil', fake)
+    monkeypatch.setattr(host_sampler.time, 'time', lambda: fake.now)
+    return fake
+
+
+def test_rates_and_per_core_usage_from_counter_deltas(fake):
+    sampler = HostSampler()
+    first = sampler.sample()
+    # Since boot: core 0 busy 20%, core 1 busy 50%
+    assert first['cpu_per_core'] == (20.0, 50.0)
+    assert first['cpu_percent'] == 35.0
+    assert first['net_rx_bytes_per_sec'] == 40.0
+
+    fake.advance(2, [CPUTimes(11, 10, 81, 0), CPUTimes(42, 11, 51, 0)],
+                 DiskIO(110, 70, 14000, 9000), NetIO(3000, 8000, 30, 60))
+    second = sampler.sample()
+
+    assert second['cpu_per_core'] == (50.0, 75.0)
+    assert second['cpu_percent'] == 66.7
+    assert second['disk_read_bytes_per_sec'] == 2000.0
+    assert second['disk_write_ops_per_sec'] == 10.0
+    assert second['net_rx_bytes_per_sec'] == 2000.0
+    assert second['net_tx_packets_per_sec'] == 5.0
+    assert second['memory_percent'] == 42.0 and second['disk_percent'] == 55.5
+
+
+def test_snapshots_are_read_only_and_swapped(fake):
+    sampler = HostSampler()
+    first = sampler.sample()
+    with pytest.raises(TypeError):
+        first['cpu_percent'] = 0
+
+    fake.advance(1, fake.cores, fake.disk, NetIO(2000, 4000, 20, 40))
+    second = sampler.sample()
+    assert second is not first
+    assert first['net_rx_bytes_per_sec'] == 40.0
+    # A counter reset reads as no traffic, not a negative rate
+    fake.advance(1, fake.cores, DiskIO(0, 0, 0, 0), fake.net)
+    assert sampler.sample()['disk_read_bytes_per_sec'] == 0.0
+
+
+def test_simple_app_metrics_do_not_wait_for_a_sample(monkeypatch):
+    import simple_app
+
+    monkeypatch.setattr(simple_app.host_sampler, 'interval', 3600)
+    client = simple_app.app.test_client()
+    client.get('/api/metrics')
+
+    started = time.perf_counter()
+    response = client.get('/api/metrics')
+    assert time.perf_counter() - started < 0.1
+    metrics = response.get_json()
+    assert len(metrics['cpuPerCore']) == len(psutil.cpu_times(percpu=True))
+    assert 'diskReadBytesPerSec' in metrics and 'networkRxBytesPerSec' in metrics
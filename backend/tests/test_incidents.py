@@ -0,0 +1,100 @@
+# Tests for alert correlation into incidents
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incidents import STORM_SOURCE, IncidentCorrelator
+
+
+def alert(source, alert_type='cpu_high', severity='warning'):
+    return {'source': source, 'type': alert_type, 'severity': severity, 'message': f'{alert_type} on {source}'}
+
+
+def stored(new, first_id=1):
+    return [dict(item, id=first_id + offset) for offset, (item, _) in enumerate(new)]
+
+
+def test_repeats_fold_into_one_incident():
+    correlator = IncidentCorrelator(window=60, storm_threshold=0)
+    new, updates = correlator.correlate([(alert('web1'), 100), (alert('web1'), 110), (alert('web2'), 110)])
+    assert [(item['source'], item['occurrences']) for item, _ in new] == [('web1', 2), ('web2', 1)]
+    assert [first_seen for _, first_seen in new] == [100, 110]
+    assert updates == []
+    correlator.bind(stored(new))
+
+    # One update per incident however many repeats arrive in the batch
+    new, updates = correlator.correlate([(alert('web1'), 120), (alert('web1', severity='critical'), 125)])
+    assert new == []
+    assert len(updates) == 1
+    assert updates[0]['alert_id'] == 1
+    assert updates[0]['occurrences'] == 4
+    assert updates[0]['severity'] == 'critical'
+    assert correlator.suppressed == 3
+
+
+def test_incident_ends_after_a_quiet_window():
+    correlator = IncidentCorrelator(window=60, storm_threshold=0)
+    new, _ = correlator.correlate([(alert('web1'), 100)])
+    correlator.bind(stored(new))
+
+    new, updates = correlator.correlate([(alert('web1'), 200)])
+    assert len(new) == 1 and updates == []
+    assert new[0][0]['occurrences'] == 1
+
+
+def test_unstored_incident_is_returned_again_after_a_failed_batch():
+    correlator = IncidentCorrelator(window=60, storm_threshold=0)
+    correlator.correlate([(alert('web1'), 100)])
+    # add_many failed, so bind was never called; the retried batch must still store it
+    new, updates = correlator.correlate([(alert('web1'), 100)])
+    assert len(new) == 1 and updates == []
+
+
+def test_storm_collapses_sources_of_one_type():
+    correlator = IncidentCorrelator(window=60, storm_threshold=3)
+    new, _ = correlator.correlate([(alert(f'c{i}'), 100 + i) for i in range(10)])
+    assert [item['source'] for item, _ in new] == ['c0', 'c1', 'c2', STORM_SOURCE]
+    storm = new[-1][0]
+    assert storm['sources'] == [f'c{i}' for i in range(3, 10)]
+    assert storm['occurrences'] == 7
+    correlator.bind(stored(new))
+
+    # Other types are unaffected
+    new, _ = correlator.correlate([(alert('c5', 'memory_high'), 115)])
+    assert [item['source'] for item, _ in new] == ['c5']
+
+    # The storm's alert is resolved once its last source clears
+    assert all(correlator.close(f'c{i}', 'cpu_high') == [] for i in range(3, 9))
+    assert correlator.close('c9', 'cpu_high') == [4]
+    assert correlator.report()['storms'] == 0
+
+
+def test_restore_reopens_stored_incidents():
+    correlator = IncidentCorrelator(window=60, storm_threshold=0)
+    correlator.restore([dict(alert('web1'), id=7, occurrences=5)], 100)
+
+    new, updates = correlator.correlate([(alert('web1'), 110)])
+    assert new == []
+    assert updates[0]['alert_id'] == 7 and updates[0]['occurrences'] == 6
+
+    correlator.forget(7)
+    new, _ = correlator.correlate([(alert('web1'), 120)])
+    assert len(new) == 1
+
+
+def test_storm_outlives_the_window_until_its_sources_clear():
+    correlator = IncidentCorrelator(window=60, storm_threshold=2)
+    new, _ = correlator.correlate([(alert(f'c{i}'), 100) for i in range(4)])
+    correlator.bind(stored(new))
+
+    # Much later, with the storm's condition still active and no new alerts for it
+    correlator.correlate([(alert('other', 'memory_high'), 2000)])
+    assert correlator.report()['storms'] == 1
+
+    # A storm member firing again still folds into the storm
+    new, updates = correlator.correlate([(alert('c2'), 2010)])
+    assert new == [] and updates[0]['alert_id'] == 3
+
+    assert correlator.close('c2', 'cpu_high') == []
+    assert correlator.close('c3', 'cpu_high') == [3]
@@ -0,0 +1,130 @@
+# Tests for request middleware and stage timing
+import sys
+import os
+
+import time
+
+import pytest
+from flask import Flask, jsonify
+from prometheus_client import REGISTRY, CollectorRegistry
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrumentation import ServerMetricsCollector, init_app, instrument_redis, stage, track_queue
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_recorded_per_route_template_and_status():
+    app = Flask(__name__)
+    init_app(app)
+
+    @app.route('/things/<thing_id>')
+    def get_thing(thing_id):
+        if thing_id == 'missing':
+            return jsonify({'error': 'not found'}), 404
+        return jsonify({'id': thing_id})
+
+    before_ok = sample('api_requests_total', method='GET', endpoint='/things/<thing_id>', status='200')
+    before_missing = sample('api_requests_total', method='GET', endpoint='/things/<thing_id>', status='404')
+    before_timed = sample('api_request_duration_seconds_count', method='GET', endpoint='/things/<thing_id>')
+    before_json = sample('backend_stage_duration_seconds_count', stage='json_dumps')
+
+    client = app.test_client()
+    client.get('/things/a')
+    client.get('/things/b')
+    client.get('/things/missing')
+
+    assert sample('api_requests_total', method='GET', endpoint='/things/<thing_id>', status='200') == before_ok + 2
+    assert sample('api_requests_total', method='GET', endpoint='/things/<thing_id>', status='404') == before_missing + 1
+    assert sample('api_request_duration_seconds_count', method='GET', endpoint='/things/<thing_id>') == before_timed + 3
+    assert sample('backend_stage_duration_seconds_count', stage='json_dumps') == before_json + 3
+
+
+def test_stage_times_blocks_and_functions():
+    before = sample('backend_stage_duration_seconds_count', stage='test_stage')
+
+    with stage('test_stage'):
+        pass
+
+    @stage('test_stage')
+    def work():
+        return 42
+
+    assert work() == 42
+    assert sample('backend_stage_duration_seconds_count', stage='test_stage') == before + 2
+
+
+def test_redis_commands_and_pipelines_are_timed():
+    fakeredis = pytest.importorskip('fakeredis')
+    client = instrument_redis(fakeredis.FakeRedis())
+    commands = sample('backend_stage_duration_seconds_count', stage='redis')
+    pipelines = sample('backend_stage_duration_seconds_count', stage='redis_pipeline')
+
+    client.set('a', 1)
+    assert client.get('a') == b'1'
+    pipe = client.pipeline()
+    pipe.incr('a')
+    pipe.incr('a')
+    assert pipe.execute() == [2, 3]
+
+    assert sample('backend_stage_duration_seconds_count', stage='redis') == commands + 2
+    assert sample('backend_stage_duration_seconds_count', stage='redis_pipeline') == pipelines + 1
+
+
+def test_queue_depth_is_read_at_scrape_time():
+    depth = {'value': 3}
+    track_queue('test_queue', lambda: depth['value'])
+    assert sample('backend_queue_depth', queue='test_queue') == 3
+
+    depth['value'] = 7
+    assert sample('backend_queue_depth', queue='test_queue') == 7
+
+
+def test_server_metrics_follow_the_current_samples():
+    now = time.time()
+    samples = [
+        {'name': 'web', 'host': 'local', 'timestamp': now, 'cpu_usage': 40.0, 'memory_usage': 10.0},
+        {'name': 'db', 'host': 'edge', 'timestamp': now, 'cpu_usage': 5.0, 'memory_usage': 60.0},
+        {'name': 'quiet', 'host': 'local', 'timestamp': now - 300, 'cpu_usage': 1.0, 'memory_usage': 1.0}
+    ]
+    registry = CollectorRegistry()
+    registry.register(ServerMetricsCollector(lambda: samples, ttl=120))
+
+    assert registry.get_sample_value('server_cpu_usage_percent', {'server': 'web', 'host': 'local'}) == 40.0
+    assert registry.get_sample_value('server_memory_usage_percent', {'server': 'db', 'host': 'edge'}) == 60.0
+    # Not seen within the TTL
+    assert registry.get_sample_value('server_cpu_usage_percent', {'server': 'quiet', 'host': 'local'}) is None
+
+    # A removed container has no series on the next scrape
+    del samples[0]
+    assert registry.get_sample_value('server_cpu_usage_percent', {'server': 'web', 'host': 'local'}) is None
+
+
+def test_server_metrics_are_capped_to_the_busiest_servers():
+    now = time.time()
+    samples = [{'name': f'c{i}', 'host': 'local', 'timestamp': now, 'cpu_usage': float(i), 'memory_usage': 1.0}
+               for i in range(10)]
+    registry = CollectorRegistry()
+    registry.register(ServerMetricsCollector(lambda: samples, max_series=3))
+
+    exported = {sample.labels['server'] for metric in registry.collect() if metric.name == 'server_cpu_usage_percent'
+                for sample in metric.samples}
+    assert exported == {'c7', 'c8', 'c9'}
+    assert registry.get_sample_value('server_metrics_dropped_servers') == 7
+
+
+def test_server_metrics_registration_does_not_collect():
+    calls = []
+
+    def samples():
+        calls.append(1)
+        raise ConnectionError('docker unavailable')
+
+    registry = CollectorRegistry()
+    registry.register(ServerMetricsCollector(samples))
+    assert calls == []
+    # A failing source exports no servers instead of failing the scrape
+    assert registry.get_sample_value('server_metrics_dropped_servers') == 0
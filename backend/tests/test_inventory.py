@@ -0,0 +1,116 @@
+# Tests for the event-driven container inventory
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import ContainerInventory
+
+
+class FakeContainer:
+    def __init__(self, container_id, name, status='running', image_id='sha256:web'):
+        self.id = container_id
+        self.name = name
+        self.status = status
+        self.attrs = {'Image': image_id, 'Config': {'Image': 'web:latest'}}
+
+
+class FakeImage:
+    def __init__(self, tags):
+        self.tags = tags
+
+
+class FakeImages:
+    def __init__(self):
+        self.tags = {'sha256:web': ['web:1.0']}
+        self.calls = 0
+
+    def get(self, image_id):
+        self.calls += 1
+        return FakeImage(self.tags.get(image_id, []))
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self.by_id = {c.id: c for c in containers}
+        self.list_calls = 0
+
+    def list(self, **kwargs):
+        self.list_calls += 1
+        return list(self.by_id.values())
+
+    def get(self, container_id):
+        return self.by_id[container_id]
+
+
+class FakeDockerClient:
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+        self.images = FakeImages()
+
+
+def make_inventory(*containers):
+    client = FakeDockerClient(containers)
+    inventory = ContainerInventory(client)
+    inventory.load()
+    # Mark as started so queries do not spawn the event watcher
+    inventory._thread = True
+    return client, inventory
+
+
+def test_counts_and_lookups_served_from_memory():
+    client, inventory = make_inventory(
+        FakeContainer('aaaa1111', 'web1'),
+        FakeContainer('bbbb2222', 'web2', status='exited')
+    )
+
+    assert inventory.count() == 2
+    assert inventory.count('running') == 1
+    assert [c.name for c in inventory.containers(status='running')] == ['web1']
+    assert inventory.get('web2').id == 'bbbb2222'
+    assert inventory.get('aaaa').name == 'web1'
+    assert inventory.get('missing') is None
+    assert client.containers.list_calls == 1
+
+
+def test_events_keep_inventory_current():
+    client, inventory = make_inventory(FakeContainer('aaaa1111', 'web1'))
+    changes = []
+    inventory.add_listener(lambda action, container_id, container: changes.append((action, container_id)))
+
+    client.containers.by_id['aaaa1111'].status = 'exited'
+    inventory._handle_event({'Type': 'container', 'Action': 'die', 'id': 'aaaa1111'})
+    assert inventory.count('running') == 0
+    assert inventory.count('exited') == 1
+
+    client.containers.by_id['cccc3333'] = FakeContainer('cccc3333', 'web3')
+    inventory._handle_event({'Type': 'container', 'Action': 'start', 'id': 'cccc3333'})
+    client.containers.by_id['cccc3333'].name = 'api'
+    inventory._handle_event({'Type': 'container', 'Action': 'rename', 'id': 'cccc3333'})
+    assert inventory.get('api').id == 'cccc3333'
+    assert inventory.get('web3') is None
+
+    inventory._handle_event({'Type': 'container', 'Action': 'destroy', 'id': 'aaaa1111'})
+    assert inventory.count() == 1
+    assert inventory.count('exited') == 0
+    # exec and health events do not touch the inventory
+    inventory._handle_event({'Type': 'container', 'Action': 'exec_start: sh', 'id': 'cccc3333'})
+
+    assert changes == [('die', 'aaaa1111'), ('start', 'cccc3333'), ('rename', 'cccc3333'), ('destroy', 'aaaa1111')]
+    assert client.containers.list_calls == 1
+
+
+def test_image_tags_cached_by_image_id():
+    client, inventory = make_inventory(
+        FakeContainer('aaaa1111', 'web1'),
+        FakeContainer('bbbb2222', 'web2'),
+        FakeContainer('cccc3333', 'job', image_id='sha256:gone')
+    )
+
+    assert [inventory.image_tag(c) for c in inventory.containers()] == ['web:1.0', 'web:1.0', 'web:latest']
+    assert inventory.image_tag(inventory.get('web1')) == 'web:1.0'
+    assert client.images.calls == 2
+
+    client.images.tags['sha256:web'] = ['web:2.0']
+    inventory._handle_event({'Type': 'image', 'Action': 'tag', 'id': 'sha256:web'})
+    assert inventory.image_tag(inventory.get('web1')) == 'web:2.0'
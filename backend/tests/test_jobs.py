@@ -0,0 +1,224 @@
+# Tests for the job queue and worker pool
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JobQueue, MemoryJobBackend, RedisJobBackend
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    if request.param == 'memory':
+        return MemoryJobBackend()
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisJobBackend(fakeredis.FakeRedis())
+
+
+def test_priorities_and_bounded_concurrency(backend):
+    queue = JobQueue(backend, concurrency=1)
+    order = []
+    gate = threading.Event()
+
+    def handler(job):
+        gate.wait()
+        order.append(job['payload'])
+
+    queue.register('heal', handler, priority=0)
+    queue.register('deploy', handler, priority=10)
+
+    queue.submit('deploy', 'first')
+    time.sleep(0.2)
+    queue.submit('deploy', 'deploy')
+    queue.submit('heal', 'heal')
+    gate.set()
+
+    assert wait_for(lambda: len(order) == 3)
+    assert order == ['first', 'heal', 'deploy']
+
+
+def test_dedup_returns_in_flight_job(backend):
+    queue = JobQueue(backend, concurrency=1)
+    gate = threading.Event()
+    queue.register('heal', lambda job: gate.wait())
+
+    first, created = queue.submit('heal', {}, dedup_key='heal:web1:cpu_high')
+    second, duplicate_created = queue.submit('heal', {}, dedup_key='heal:web1:cpu_high')
+    assert created and not duplicate_created
+    assert second['id'] == first['id']
+
+    gate.set()
+    assert wait_for(lambda: queue.get(first['id'])['status'] == 'succeeded')
+    third, created = queue.submit('heal', {}, dedup_key='heal:web1:cpu_high')
+    assert created and third['id'] != first['id']
+
+
+def test_failed_job_is_retried_with_backoff(backend):
+    queue = JobQueue(backend, concurrency=1, retry_backoff=0.05)
+    attempts = []
+
+    def flaky(job):
+        attempts.append(time.time())
+        if len(attempts) < 3:
+            raise RuntimeError('playbook failed')
+        return {'ok': True}
+
+    finished = []
+    queue.register('heal', flaky, max_retries=2, on_finish=finished.append)
+
+    job, _ = queue.submit('heal', {})
+    assert wait_for(lambda: finished)
+    assert finished[0]['status'] == 'succeeded'
+    assert queue.get(job['id'])['attempts'] == 3
+    assert queue.get(job['id'])['result'] == {'ok': True}
+
+
+def test_job_fails_after_retries_exhausted(backend):
+    queue = JobQueue(backend, concurrency=1, retry_backoff=0.01)
+
+    def broken(job):
+        raise RuntimeError('boom')
+
+    queue.register('deploy', broken, max_retries=1)
+
+    job, _ = queue.submit('deploy', {})
+    assert wait_for(lambda: queue.get(job['id'])['status'] == 'failed')
+    assert queue.get(job['id'])['error'] == 'boom'
+    jobs, total = queue.history()
+    assert total == 1 and jobs[0]['id'] == job['id']
+
+
+def test_queued_jobs_survive_restart():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+
+    stopped = JobQueue(RedisJobBackend(fakeredis.FakeRedis(server=server)))
+    stopped.register('deploy', lambda job: None)
+    stopped._threads = ['not started']
+    job, _ = stopped.submit('deploy', {'app': 'web'})
+
+    restarted = JobQueue(RedisJobBackend(fakeredis.FakeRedis(server=server)))
+    ran = []
+    restarted.register('deploy', lambda job: ran.append(job['payload']))
+    restarted.start()
+
+    assert wait_for(lambda: ran == [{'app': 'web'}])
+
+
+def test_jobs_abandoned_by_a_dead_worker_are_requeued(backend):
+    dead = JobQueue(backend)
+    dead.register('heal', lambda job: None)
+    dead._threads = ['not started']
+    job, _ = dead.submit('heal', {}, dedup_key='heal:web1:cpu_high')
+    # Picked up and then the process died mid-run
+    assert backend.pop(timeout=1) == job['id']
+    backend.heartbeat([job['id']], time.time() - 120)
+    dead._update(job, status='running', owner=dead.worker_id)
+
+    ran = []
+    queue = JobQueue(backend, lease=60)
+    queue.register('heal', lambda job: ran.append(job['id']))
+    assert queue.recover() == 1
+    # Only one instance requeues it
+    assert queue.recover() == 0
+    queue.start()
+    assert wait_for(lambda: ran == [job['id']])
+    assert wait_for(lambda: queue.get(job['id'])['status'] == 'succeeded')
+
+
+def test_running_jobs_with_a_live_heartbeat_are_left_alone(backend):
+    queue = JobQueue(backend, lease=60)
+    queue.register('heal', lambda job: None)
+    queue._threads = ['not started']
+    job, _ = queue.submit('heal', {})
+    backend.pop(timeout=1)
+    backend.heartbeat([job['id']], time.time())
+    queue._update(job, status='running', owner='other-worker')
+
+    assert queue.recover() == 0
+    assert queue.get(job['id'])['status'] == 'running'
+
+
+def test_dedup_claims_expire(backend):
+    queue = JobQueue(backend, lease=0, retry_backoff=0)
+    queue.register('heal', lambda job: None, timeout=1)
+    queue._threads = ['not started']
+
+    first, _ = queue.submit('heal', {}, dedup_key='heal:web1:cpu_high')
+    assert queue.submit('heal', {}, dedup_key='heal:web1:cpu_high')[0]['id'] == first['id']
+    time.sleep(1.1)
+    second, created = queue.submit('heal', {}, dedup_key='heal:web1:cpu_high')
+    assert created and second['id'] != first['id']
+
+
+def test_redis_is_retried_and_takes_over_fallback_jobs():
+    fakeredis = pytest.importorskip('fakeredis')
+    redis_up = []
+
+    def create():
+        if not redis_up:
+            raise ConnectionError('redis is down')
+        return RedisJobBackend(fakeredis.FakeRedis())
+
+    queue = JobQueue(create, fallback=MemoryJobBackend(), retry_interval=0)
+    queue.register('heal', lambda job: None)
+    queue._threads = ['not started']
+    job, _ = queue.submit('heal', {'server': 'web1'}, dedup_key='heal:web1')
+    assert isinstance(queue.backend, MemoryJobBackend)
+
+    redis_up.append(True)
+    backend = queue.backend
+    assert isinstance(backend, RedisJobBackend)
+    assert backend.load(job['id'])['payload'] == {'server': 'web1'}
+    assert backend.pop(timeout=1) == job['id']
+    assert backend.claim_dedup('heal:web1', 'other', 60) == job['id']
+    assert queue._fallback.depth() == 0
+
+
+def test_backend_creation_is_not_retried_before_the_interval():
+    attempts = []
+
+    def create():
+        attempts.append(time.time())
+        raise ConnectionError('redis is down')
+
+    queue = JobQueue(create, fallback=MemoryJobBackend(), retry_interval=60)
+    for _ in range(3):
+        assert isinstance(queue.backend, MemoryJobBackend)
+    assert len(attempts) == 1
+
+
+def test_pooled_kinds_do_not_wait_behind_running_jobs(backend):
+    queue = JobQueue(backend, concurrency=1, pools={'actions': 1})
+    release = threading.Event()
+    ran = []
+    queue.register('deploy', lambda job: release.wait(5))
+    queue.register('restart', lambda job: ran.append(job['payload']), pool='actions')
+
+    queue.submit('deploy', {})
+    queue.submit('deploy', {})
+    job, _ = queue.submit('restart', {'container': 'web1'})
+    try:
+        assert wait_for(lambda: ran == [{'container': 'web1'}])
+        assert queue.get(job['id'])['pool'] == 'actions'
+        assert queue.depth() == 1
+    finally:
+        release.set()
+
+
+def test_registering_on_an_unknown_pool_is_rejected():
+    with pytest.raises(ValueError):
+        JobQueue(MemoryJobBackend()).register('restart', lambda job: None, pool='actions')
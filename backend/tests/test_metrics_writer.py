@@ -0,0 +1,51 @@
+# Tests for buffered metrics persistence
+import sys
+import os
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics_writer import MetricsWriter
+
+
+@contextmanager
+def unavailable():
+    raise ConnectionError('postgres is down')
+    yield
+
+
+def test_buffer_is_bounded_and_drops_oldest():
+    writer = MetricsWriter(connect=unavailable, max_buffer=3)
+
+    for i in range(5):
+        writer.record('web1', 'cpu_usage', i, timestamp=1000 + i)
+
+    assert writer.pending() == 3
+    assert writer.dropped == 2
+    assert [row[2] for row in writer._buffer] == [2.0, 3.0, 4.0]
+
+
+def test_record_sample_expands_metric_fields():
+    writer = MetricsWriter(connect=unavailable)
+    sample = {'name': 'web1', 'timestamp': 1000, 'cpu_usage': 12.5, 'memory_usage': 40.0,
+              'memory_limit': 1024, 'network_rx': 10, 'network_tx': 20}
+
+    writer.record_sample('abcdef1234567890', sample)
+
+    assert sorted(row[1] for row in writer._buffer) == ['cpu_usage', 'memory_usage', 'network_rx', 'network_tx']
+    assert writer._buffer[0][4] == {'container_id': 'abcdef123456'}
+
+
+def test_failed_flush_requeues_batch():
+    writer = MetricsWriter(connect=unavailable, batch_size=2)
+    for i in range(3):
+        writer.record('web1', 'cpu_usage', i)
+
+    with pytest.raises(ConnectionError):
+        writer.flush()
+
+    assert writer.pending() == 3
+    assert [row[2] for row in writer._buffer] == [0.0, 1.0, 2.0]
+    assert writer.written == 0
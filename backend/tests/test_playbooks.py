@@ -0,0 +1,96 @@
+# Tests for streaming playbook execution
+import sys
+import os
+import stat
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playbooks import PlaybookRunner, fact_cache_env, job_room
+
+
+@pytest.fixture
+def fake_ansible(tmp_path, monkeypatch):
+    """Put a stand-in ansible-playbook on PATH whose behaviour is driven by FAKE_ANSIBLE"""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'ansible-playbook'
+    script.write_text(
+        '#!/bin/sh\n'
+        'echo "PLAY [all] ****"\n'
+        'echo "TASK [restart nginx] ****"\n'
+        'i=0; while [ $i -lt ${LINES_OUT:-3} ]; do echo "line $i"; i=$((i+1)); done\n'
+        '[ -n "$ECHO_ARGS" ] && echo "args $* gathering=$ANSIBLE_GATHERING"\n'
+        '[ -n "$SLEEP_FOR" ] && sleep $SLEEP_FOR\n'
+        'exit ${EXIT_CODE:-0}\n'
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    return monkeypatch
+
+
+def make_runner(tmp_path, **kwargs):
+    events = []
+    runner = PlaybookRunner(str(tmp_path), str(tmp_path / 'logs'),
+                            lambda event, data, room: events.append((event, data, room)), **kwargs)
+    return runner, events
+
+
+def test_output_is_streamed_to_job_room_and_log(tmp_path, fake_ansible):
+    runner, events = make_runner(tmp_path)
+
+    result = runner.run('job1', 'deploy.yml', {}, timeout=10)
+
+    lines = [data['line'] for event, data, _ in events if event == 'job_output']
+    assert lines[-1] == 'line 2'
+    assert all(room == job_room('job1') for _, _, room in events)
+    assert [data['step'] for event, data, _ in events if event == 'job_progress'] == ['PLAY [all]', 'TASK [restart nginx]']
+    assert open(runner.log_path('job1')).read().splitlines() == lines
+    assert result['tail'][-1] == 'line 2'
+
+
+def test_log_file_and_tail_are_capped(tmp_path, fake_ansible):
+    fake_ansible.setenv('LINES_OUT', '500')
+    runner, _ = make_runner(tmp_path, max_log_bytes=200, tail_lines=5)
+
+    result = runner.run('job2', 'deploy.yml', {}, timeout=10)
+
+    assert result['truncated'] is True
+    assert len(result['tail']) == 5
+    assert os.path.getsize(runner.log_path('job2')) < 300
+
+
+def test_failure_and_timeout_raise(tmp_path, fake_ansible):
+    runner, _ = make_runner(tmp_path)
+
+    fake_ansible.setenv('EXIT_CODE', '2')
+    with pytest.raises(RuntimeError, match='line 2'):
+        runner.run('job3', 'deploy.yml', {}, timeout=10)
+
+    fake_ansible.setenv('EXIT_CODE', '0')
+    fake_ansible.setenv('SLEEP_FOR', '5')
+    with pytest.raises(RuntimeError, match='timed out'):
+        runner.run('job4', 'deploy.yml', {}, timeout=0.5)
+
+
+def test_limit_and_fact_cache_are_passed_to_ansible(tmp_path, fake_ansible):
+    fake_ansible.setenv('ECHO_ARGS', '1')
+    fake_ansible.setenv('LINES_OUT', '0')
+    runner, _ = make_runner(tmp_path, env=fact_cache_env('jsonfile', ttl=600, path=str(tmp_path / 'facts')))
+
+    result = runner.run('job5', 'auto-heal.yml', {'server': 'web1'}, timeout=10,
+                        inventory=str(tmp_path / 'inventory.json'), limit='web1')
+
+    assert result['tail'][-1].startswith(f"args -i {tmp_path / 'inventory.json'} ")
+    assert result['tail'][-1].endswith('--limit web1 gathering=smart')
+
+
+def test_fact_cache_settings():
+    assert fact_cache_env('off') == {}
+    env = fact_cache_env('redis', ttl=60, redis_url='redis://:secret@cache:6380/2')
+    assert env['ANSIBLE_CACHE_PLUGIN'] == 'community.general.redis'
+    assert env['ANSIBLE_CACHE_PLUGIN_CONNECTION'] == 'cache:6380:2:secret'
+    assert env['ANSIBLE_CACHE_PLUGIN_TIMEOUT'] == '60'
+    with pytest.raises(ValueError):
+        fact_cache_env('memcached')
@@ -0,0 +1,95 @@
+# Tests for the TTL response cache
+import sys
+import os
+import threading
+import time
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache
+
+
+def make_app(ttl=60, delay=0):
+    app = Flask(__name__)
+    cache = ResponseCache()
+    calls = []
+
+    @app.route('/api/servers')
+    @cache.cached('servers', ttl)
+    def servers():
+        calls.append(1)
+        time.sleep(delay)
+        return jsonify({'servers': len(calls)})
+
+    @app.route('/api/broken')
+    @cache.cached('broken', ttl)
+    def broken():
+        calls.append(1)
+        return jsonify({'error': 'docker unavailable'}), 500
+
+    return app, cache, calls
+
+
+def test_hits_are_served_from_cache_until_invalidated():
+    app, cache, calls = make_app()
+    client = app.test_client()
+
+    assert client.get('/api/servers').json == {'servers': 1}
+    assert client.get('/api/servers').json == {'servers': 1}
+    assert len(calls) == 1
+
+    cache.invalidate('servers')
+    assert client.get('/api/servers').json == {'servers': 2}
+
+
+def test_ttl_expiry_and_query_string_keys():
+    app, _, calls = make_app(ttl=0.05)
+    client = app.test_client()
+
+    client.get('/api/servers')
+    client.get('/api/servers?page=2')
+    assert len(calls) == 2
+
+    time.sleep(0.1)
+    client.get('/api/servers')
+    assert len(calls) == 3
+
+
+def test_etag_and_not_modified():
+    app, _, _ = make_app()
+    client = app.test_client()
+
+    first = client.get('/api/servers')
+    etag = first.headers['ETag']
+
+    second = client.get('/api/servers', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+
+
+def test_errors_are_not_cached():
+    app, _, calls = make_app()
+    client = app.test_client()
+
+    assert client.get('/api/broken').status_code == 500
+    assert client.get('/api/broken').status_code == 500
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_share_one_fetch():
+    app, _, calls = make_app(delay=0.2)
+    results = []
+
+    def fetch():
+        results.append(app.test_client().get('/api/servers').json)
+
+    threads = [threading.Thread(target=fetch) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'servers': 1}] * 10
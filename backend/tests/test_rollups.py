@@ -0,0 +1,179 @@
+# Tests for rollup resolution selection and the rollup and history queries
+import sys
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rollups import (FLEET_QUERY_SQL, ROLLUP_SQL, SERVER_QUERY_SQL, RollupWorker, choose_resolution, parse_range,
+                     query_performance)
+
+
+class FakeCursor:
+    """Records executed statements; answers fetchone from ``latest`` and fetchall with ``rows``"""
+
+    def __init__(self, latest=None, rows=()):
+        self.executed = []
+        self.latest = latest
+        self.rows = list(rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return (self.latest,)
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def fake_connect(cursor):
+    @contextmanager
+    def connect():
+        yield FakeConnection(cursor)
+    return connect
+
+
+def test_parse_range():
+    assert parse_range('15m') == 900
+    assert parse_range('24h') == 86400
+    assert parse_range('7d') == 604800
+    with pytest.raises(ValueError):
+        parse_range('soon')
+
+
+@pytest.mark.parametrize('range_value, expected', [
+    ('15m', '1m'),
+    ('1h', '1m'),
+    ('6h', '5m'),
+    ('24h', '5m'),
+    ('7d', '1h'),
+    ('30d', '1h'),
+])
+def test_choose_resolution_picks_coarsest_with_enough_points(range_value, expected):
+    name, _ = choose_resolution(parse_range(range_value), min_points=60)
+    assert name == expected
+
+
+def test_first_rollup_covers_the_initial_lookback_for_every_resolution():
+    cursor = FakeCursor()
+    RollupWorker(connect=fake_connect(cursor), initial_lookback=7200).rollup(now=100000)
+
+    watermarks = [(sql, params) for sql, params in cursor.executed if sql.startswith('SELECT max(bucket)')]
+    assert [params for _, params in watermarks] == [(60,), (300,), (3600,)]
+
+    rollups = [params for sql, params in cursor.executed if sql == ROLLUP_SQL]
+    # Each run starts at the beginning of the bucket containing the watermark
+    assert rollups == [
+        {'resolution': 60, 'start': datetime.utcfromtimestamp(92760), 'end': datetime.utcfromtimestamp(100000)},
+        {'resolution': 300, 'start': datetime.utcfromtimestamp(92700), 'end': datetime.utcfromtimestamp(100000)},
+        {'resolution': 3600, 'start': datetime.utcfromtimestamp(90000), 'end': datetime.utcfromtimestamp(100000)},
+    ]
+    assert not any(sql.startswith('DELETE') for sql, _ in cursor.executed)
+
+
+def test_rollup_resumes_from_the_stored_and_previous_watermarks():
+    cursor = FakeCursor(latest=datetime.utcfromtimestamp(90000))
+    worker = RollupWorker(connect=fake_connect(cursor))
+    worker.rollup(now=100000)
+    assert [params['start'] for sql, params in cursor.executed if sql == ROLLUP_SQL] == \
+        [datetime.utcfromtimestamp(90000)] * 3
+
+    cursor.executed.clear()
+    worker.rollup(now=100130)
+    # Watermarks are loaded once, then advanced in memory
+    assert [sql for sql, _ in cursor.executed] == [ROLLUP_SQL] * 3
+    assert [params['start'] for _, params in cursor.executed] == [
+        datetime.utcfromtimestamp(99960), datetime.utcfromtimestamp(99900), datetime.utcfromtimestamp(97200)
+    ]
+
+
+def test_failed_rollup_does_not_advance_watermarks():
+    cursor = FakeCursor(latest=datetime.utcfromtimestamp(90000))
+
+    @contextmanager
+    def failing():
+        yield FakeConnection(cursor)
+        raise ConnectionError('commit failed')
+
+    worker = RollupWorker(connect=failing)
+    with pytest.raises(ConnectionError):
+        worker.rollup(now=100000)
+    assert worker._watermarks == {60: 90000, 300: 90000, 3600: 90000}
+
+
+def test_rollup_prunes_raw_samples_past_retention():
+    cursor = FakeCursor()
+    RollupWorker(connect=fake_connect(cursor), raw_retention=86400).rollup(now=100000)
+
+    sql, params = cursor.executed[-1]
+    assert sql == 'DELETE FROM metrics WHERE timestamp < %s'
+    assert params == (datetime.utcfromtimestamp(13600),)
+
+
+@pytest.mark.parametrize('range_value, resolution, seconds', [
+    ('1h', '1m', 60),
+    ('24h', '5m', 300),
+    ('30d', '1h', 3600),
+])
+@pytest.mark.parametrize('server, sql', [(None, FLEET_QUERY_SQL), ('web1', SERVER_QUERY_SQL)])
+def test_query_reads_the_chosen_resolution(range_value, resolution, seconds, server, sql):
+    cursor = FakeCursor()
+    range_seconds = parse_range(range_value)
+    result = query_performance(range_seconds, metric='memory_usage', server=server, connect=fake_connect(cursor))
+
+    assert result == {'resolution': resolution, 'metric': 'memory_usage', 'server': server, 'points': []}
+    [(executed, params)] = cursor.executed
+    assert executed == sql
+    assert params['resolution'] == seconds
+    assert params['metric'] == 'memory_usage'
+    assert params['server'] == server
+    assert (params['end'] - params['start']).total_seconds() == pytest.approx(range_seconds)
+
+
+def test_query_rounds_rollup_rows_into_points():
+    bucket = datetime(2024, 5, 1, 12, 0)
+    cursor = FakeCursor(rows=[(bucket, 1.234, 98.765, 50.5, 90.111, 12)])
+    result = query_performance(3600, connect=fake_connect(cursor))
+
+    assert result['points'] == [
+        {'time': '2024-05-01T12:00:00', 'min': 1.23, 'max': 98.77, 'avg': 50.5, 'p95': 90.11, 'count': 12}
+    ]
+
+
+def test_worker_only_rolls_up_while_active():
+    cursor = FakeCursor()
+    leader = []
+    worker = RollupWorker(connect=fake_connect(cursor), interval=0.01, active=lambda: bool(leader))
+    worker._watermarks = {60: 0}
+    worker.start()
+
+    time.sleep(0.1)
+    assert cursor.executed == []
+    # Watermarks advanced by another leader are reloaded on resuming
+    assert worker._watermarks == {}
+
+    leader.append(True)
+    deadline = time.time() + 5
+    while not cursor.executed and time.time() < deadline:
+        time.sleep(0.01)
+    leader.clear()
+    assert cursor.executed
@@ -0,0 +1,107 @@
+# Tests for the vectorized alert rule engine
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('numpy')
+
+from rules import RuleEngine
+
+
+def cpu_rule(**overrides):
+    rule = {'type': 'cpu_high', 'metric': 'cpu_usage', 'warning': 80, 'critical': 90, 'clear': 70, 'for': 2}
+    rule.update(overrides)
+    return rule
+
+
+def tick(engine, now, **cpu):
+    engine.observe({source: {'cpu_usage': value, 'timestamp': now} for source, value in cpu.items()}, now=now)
+    return engine.evaluate(now=now)
+
+
+def test_threshold_needs_sustained_breach_and_fires_once():
+    engine = RuleEngine([cpu_rule()])
+
+    assert tick(engine, 1, web1=95, web2=10) == []
+    events = tick(engine, 2, web1=95, web2=10)
+    assert [(e['action'], e['source'], e['severity']) for e in events] == [('fire', 'web1', 'critical')]
+
+    # Still hot: the open alert is not duplicated
+    assert tick(engine, 3, web1=96, web2=10) == []
+
+
+def test_repeated_sample_is_not_counted_again():
+    engine = RuleEngine([cpu_rule()])
+    assert tick(engine, 1, web1=95) == []
+
+    # Monitor ticks that see the same sample do not count towards 'for'
+    for now in (2, 3, 4):
+        engine.observe({'web1': {'cpu_usage': 95, 'timestamp': 1}}, now=now)
+        assert engine.evaluate(now=now) == []
+
+    events = tick(engine, 5, web1=95)
+    assert [(e['action'], e['source']) for e in events] == [('fire', 'web1')]
+
+
+def test_hysteresis_delays_resolution():
+    engine = RuleEngine([cpu_rule(**{'for': 1})])
+    tick(engine, 1, web1=85)
+
+    # Below the warning level but above the clear level
+    assert tick(engine, 2, web1=75) == []
+    events = tick(engine, 3, web1=60)
+    assert [(e['action'], e['source']) for e in events] == [('resolve', 'web1')]
+
+
+def test_flapping_suppresses_new_alerts():
+    engine = RuleEngine([cpu_rule(**{'for': 1, 'clear_for': 1, 'flap_threshold': 3, 'flap_window': 600})])
+
+    fired = 0
+    for now in range(1, 13):
+        events = tick(engine, now, web1=95 if now % 2 else 50)
+        fired += sum(e['action'] == 'fire' for e in events)
+
+    assert fired == 2
+    assert engine.flapping() == [('web1', 'cpu_high')]
+
+
+def test_rate_rule():
+    engine = RuleEngine([cpu_rule(kind='rate', warning=5, clear=1, window=3, **{'for': 1})])
+
+    assert tick(engine, 0, web1=10) == []
+    assert tick(engine, 10, web1=20) == []
+    events = tick(engine, 20, web1=200)
+    assert events[0]['action'] == 'fire'
+    assert events[0]['value'] == 9.5
+
+
+def test_zscore_rule():
+    engine = RuleEngine([cpu_rule(kind='zscore', warning=3, clear=1, window=10, **{'for': 1})])
+
+    for now in range(9):
+        assert tick(engine, now, web1=20 + (now % 2)) == []
+    events = tick(engine, 9, web1=60)
+    assert events[0]['action'] == 'fire'
+
+
+def test_disappearing_source_resolves_and_rows_are_reused():
+    engine = RuleEngine([cpu_rule(**{'for': 1})], capacity=2)
+    tick(engine, 1, web1=95, web2=10)
+
+    events = tick(engine, 2, web2=10, web3=10, web4=10)
+    assert ('resolve', 'web1') in [(e['action'], e['source']) for e in events]
+    assert len(engine.store.rows) == 3
+
+
+def test_near_threshold_or_open_alert():
+    engine = RuleEngine([cpu_rule()])
+    tick(engine, 1, web1=95, web2=10)
+    tick(engine, 2, web1=95, web2=10)
+
+    assert engine.near('web2', {'cpu_usage': 75}, margin=0.9)
+    assert not engine.near('web2', {'cpu_usage': 10}, margin=0.9)
+    # web1's alert stays open until it clears, whatever the latest sample says
+    assert engine.near('web1', {'cpu_usage': 72})
@@ -0,0 +1,117 @@
+# Tests for bulk container actions
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import ContainerInventory
+from server_actions import BulkActionRunner, parse_selector, select_containers
+
+
+class FakeContainer:
+    def __init__(self, container_id, name, labels, delay=0.0, broken=False):
+        self.id = container_id
+        self.name = name
+        self.status = 'running'
+        self.labels = labels
+        self.attrs = {}
+        self.delay = delay
+        self.broken = broken
+        self.actions = []
+
+    def _act(self, action):
+        time.sleep(self.delay)
+        if self.broken:
+            raise RuntimeError('daemon error')
+        self.actions.append(action)
+
+    def start(self):
+        self._act('start')
+
+    def stop(self, timeout=10):
+        self._act('stop')
+
+    def restart(self, timeout=10):
+        self._act('restart')
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self.by_id = {c.id: c for c in containers}
+
+    def list(self, **kwargs):
+        return list(self.by_id.values())
+
+    def get(self, container_id):
+        return self.by_id[container_id]
+
+
+class FakeDockerClient:
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+
+
+def make_fleet(count, **kwargs):
+    return [FakeContainer(f'{i:04d}' + 'f' * 60, f'web{i}', {'app': 'web' if i % 2 else 'db', 'tier': str(i % 3)},
+                          **kwargs) for i in range(count)]
+
+
+def test_parse_selector():
+    assert parse_selector('app=web, tier!=2,canary') == [('app', '=', 'web'), ('tier', '!=', '2'),
+                                                         ('canary', 'exists', None)]
+    assert parse_selector({'app': 'web'}) == [('app', '=', 'web')]
+    with pytest.raises(ValueError):
+        parse_selector(' , ')
+
+
+def test_select_by_ids_and_selector():
+    client = FakeDockerClient(make_fleet(6))
+    inventory = ContainerInventory(client)
+    inventory.load()
+    inventory._thread = True
+
+    containers, missing = select_containers(inventory, ids=['web1', '0001', 'nope'])
+    assert [c.name for c in containers] == ['web1']
+    assert missing == ['nope']
+
+    containers, _ = select_containers(inventory, selector='app=web,tier!=0')
+    assert sorted(c.name for c in containers) == ['web1', 'web5']
+
+
+def test_actions_run_in_parallel_with_progress():
+    fleet = make_fleet(40, delay=0.05)
+    events = []
+    lock = threading.Lock()
+
+    def emit(event, data, room=None):
+        with lock:
+            events.append((event, data, room))
+
+    runner = BulkActionRunner(FakeDockerClient(fleet), emit, parallelism=10)
+    started = time.time()
+    result = runner.run('job1', 'restart', [c.id for c in fleet])
+
+    # 40 containers x 50ms at 10 at a time, not 2s sequentially
+    assert time.time() - started < 1.0
+    assert result['succeeded'] == 40 and result['failed'] == 0
+    assert all(c.actions == ['restart'] for c in fleet)
+    assert len(events) == 40
+    assert {room for _, _, room in events} == {'job:job1'}
+    assert sorted(data['completed'] for _, data, _ in events) == list(range(1, 41))
+
+
+def test_partial_and_total_failure():
+    fleet = make_fleet(3)
+    fleet[1].broken = True
+    runner = BulkActionRunner(FakeDockerClient(fleet), lambda *args, **kwargs: None)
+
+    result = runner.run('job1', 'stop', [c.id for c in fleet])
+    assert result['succeeded'] == 2 and result['failed'] == 1
+    assert [r['error'] for r in result['results'] if r['status'] == 'failed'] == ['daemon error']
+
+    with pytest.raises(RuntimeError):
+        runner.run('job2', 'stop', [fleet[1].id])
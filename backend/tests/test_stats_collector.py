@@ -0,0 +1,87 @@
+# Tests for the concurrent container stats collector
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_collector import StatsCollector, calculate_usage
+
+
+def make_stats(cpu_total=200, precpu_total=100, system=2000, presystem=1000, usage=50, limit=200):
+    return {
+        'cpu_stats': {'cpu_usage': {'total_usage': cpu_total, 'percpu_usage': [0, 0]}, 'system_cpu_usage': system},
+        'precpu_stats': {'cpu_usage': {'total_usage': precpu_total}, 'system_cpu_usage': presystem},
+        'memory_stats': {'usage': usage, 'limit': limit},
+        'networks': {'eth0': {'rx_bytes': 10, 'tx_bytes': 20}}
+    }
+
+
+class FakeContainer:
+    def __init__(self, container_id, name, delay=0.2):
+        self.id = container_id
+        self.name = name
+        self.status = 'running'
+        self.delay = delay
+
+    def stats(self, stream=False):
+        time.sleep(self.delay)
+        return make_stats()
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self._containers = containers
+
+    def list(self, **kwargs):
+        return list(self._containers)
+
+
+class FakeDockerClient:
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+
+
+def test_calculate_usage():
+    usage = calculate_usage(make_stats())
+    assert usage['cpu_usage'] == 20.0
+    assert usage['memory_usage'] == 25.0
+    assert usage['network_rx'] == 10
+    assert usage['network_tx'] == 20
+
+
+def test_calculate_usage_handles_missing_system_delta():
+    usage = calculate_usage(make_stats(system=1000))
+    assert usage['cpu_usage'] == 0.0
+
+
+def test_refresh_fetches_containers_concurrently():
+    containers = [FakeContainer(f'c{i}', f'web{i}') for i in range(10)]
+    collector = StatsCollector(FakeDockerClient(containers), max_workers=10)
+
+    started = time.time()
+    snapshot = collector.refresh()
+
+    assert time.time() - started < 1.0
+    assert set(snapshot) == {c.id for c in containers}
+    assert snapshot['c3']['name'] == 'web3'
+    assert 'timestamp' in snapshot['c3']
+
+
+def test_reads_are_served_from_snapshot():
+    container = FakeContainer('c1', 'web1', delay=0)
+    collector = StatsCollector(FakeDockerClient([container]), max_age=60)
+    collector.refresh()
+
+    container.delay = 5
+    started = time.time()
+    assert collector.get('c1')['cpu_usage'] == 20.0
+    assert collector.snapshot()['c1']['memory_usage'] == 25.0
+    assert time.time() - started < 0.5
+
+
+def test_refresh_only_collects_owned_containers():
+    containers = [FakeContainer(f'c{i}', f'web{i}', delay=0) for i in range(6)]
+    collector = StatsCollector(FakeDockerClient(containers), owns=lambda container_id: container_id in ('c1', 'c4'))
+
+    assert set(collector.refresh()) == {'c1', 'c4'}
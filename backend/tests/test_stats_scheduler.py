@@ -0,0 +1,101 @@
+# Tests for adaptive per-container stats scheduling
+import sys
+import os
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_scheduler import StatsScheduler
+
+
+class FakeContainer:
+    def __init__(self, container_id, usage):
+        self.id = container_id
+        self.name = container_id
+        # Callable returning (cpu, memory) for the nth sample
+        self.usage = usage
+
+
+class FakeCollector:
+    def __init__(self, containers):
+        self.containers = containers
+        self.fetches = Counter()
+        self.recorded = Counter()
+        self.discarded = []
+        self._lock = threading.Lock()
+
+    def running(self):
+        return list(self.containers)
+
+    def fetch(self, container):
+        with self._lock:
+            self.fetches[container.id] += 1
+            count = self.fetches[container.id]
+        cpu, memory = container.usage(count)
+        return {'cpu_usage': cpu, 'memory_usage': memory}
+
+    def record(self, container_id, name, usage):
+        with self._lock:
+            self.recorded[container_id] += 1
+
+    def discard(self, container_id):
+        self.discarded.append(container_id)
+
+
+def run_for(scheduler, seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        wait = scheduler.run_pending()
+        scheduler._wake.wait(min(wait, deadline - time.monotonic()))
+        scheduler._wake.clear()
+
+
+def test_hot_containers_sampled_more_often_than_stable_ones():
+    collector = FakeCollector([
+        FakeContainer('hot', lambda n: (95, 50)),
+        FakeContainer('busy', lambda n: (40 if n % 2 else 10, 50)),
+        FakeContainer('idle', lambda n: (1, 20))
+    ])
+    scheduler = StatsScheduler(collector, interval=0.2, min_interval=0.05, max_interval=0.8, budget=1000,
+                               hot=lambda name, sample: sample['cpu_usage'] >= 90, sync_interval=0.05)
+    run_for(scheduler, 1.2)
+
+    assert collector.fetches['hot'] > collector.fetches['busy'] > collector.fetches['idle']
+    assert collector.fetches['hot'] >= 15
+    report = scheduler.report(detail=True)
+    assert report['tiers'] == {'hot': 1, 'normal': 1, 'stable': 1}
+    assert report['servers']['hot']['target_interval'] == 0.05
+    assert report['servers']['idle']['target_interval'] > 0.2
+    assert abs(report['servers']['busy']['achieved_interval'] - 0.2) < 0.1
+
+
+def test_budget_caps_fetch_rate_and_reports_lag():
+    collector = FakeCollector([FakeContainer(f'c{i}', lambda n: (n * 10, 10)) for i in range(50)])
+    scheduler = StatsScheduler(collector, interval=0.1, min_interval=0.1, max_interval=0.1, budget=40,
+                               sync_interval=0.05)
+    run_for(scheduler, 1.5)
+
+    # A one second burst plus 1.5s of refill, instead of 50 containers x 10/s
+    assert 80 <= sum(collector.fetches.values()) <= 105
+    report = scheduler.report()
+    assert report['demand_per_second'] == 500
+    assert report['target_interval'] == 0.1
+    assert report['achieved_interval'] > 0.5
+
+
+def test_stopped_containers_are_dropped():
+    containers = [FakeContainer('a', lambda n: (1, 1)), FakeContainer('b', lambda n: (1, 1))]
+    collector = FakeCollector(containers)
+    scheduler = StatsScheduler(collector, interval=0.05, budget=1000, sync_interval=0.02)
+    run_for(scheduler, 0.2)
+
+    containers.pop()
+    run_for(scheduler, 0.1)
+    fetched = collector.fetches['b']
+    run_for(scheduler, 0.2)
+
+    assert collector.discarded == ['b']
+    assert collector.fetches['b'] == fetched
+    assert scheduler.report()['containers'] == 1
@@ -0,0 +1,151 @@
+# Tests for the persistent stats stream manager
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_collector import StatsCollector
+from stats_stream import StatsStreamManager
+
+
+def make_frame(n):
+    return {
+        'cpu_stats': {'cpu_usage': {'total_usage': 100 * (n + 1)}, 'system_cpu_usage': 1000 * (n + 1), 'online_cpus': 1},
+        'precpu_stats': {'cpu_usage': {'total_usage': 100 * n}, 'system_cpu_usage': 1000 * n},
+        'memory_stats': {'usage': 50, 'limit': 100}
+    }
+
+
+class StreamingContainer:
+    def __init__(self, container_id, name, frames=5):
+        self.id = container_id
+        self.name = name
+        self.status = 'running'
+        self.frames = frames
+
+    def stats(self, stream=False, decode=False):
+        for n in range(self.frames):
+            yield make_frame(n)
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self.by_id = {c.id: c for c in containers}
+
+    def list(self, **kwargs):
+        return list(self.by_id.values())
+
+    def get(self, container_id):
+        return self.by_id[container_id]
+
+
+class FakeDockerClient:
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_sync_streams_frames_into_snapshot():
+    client = FakeDockerClient([StreamingContainer('c1', 'web1')])
+    collector = StatsCollector(client)
+    samples = []
+    collector.add_listener(lambda container_id, sample: samples.append(sample))
+    manager = StatsStreamManager(client, collector)
+
+    manager.sync()
+
+    # The first frame has no previous sample and is skipped
+    assert wait_for(lambda: len(samples) == 4)
+    assert samples[-1]['cpu_usage'] == 10.0
+    assert collector._snapshots['c1']['memory_usage'] == 50.0
+
+
+def test_events_open_and_close_streams():
+    client = FakeDockerClient([StreamingContainer('c1', 'web1', frames=3)])
+    collector = StatsCollector(client)
+    manager = StatsStreamManager(client, collector)
+
+    manager._handle_event({'Action': 'start', 'id': 'c1'})
+    assert wait_for(lambda: 'c1' in collector._snapshots)
+
+    manager._handle_event({'Action': 'destroy', 'id': 'c1'})
+    assert 'c1' not in collector._snapshots
+
+
+def test_follows_inventory_changes():
+    from inventory import ContainerInventory
+
+    container = StreamingContainer('c1', 'web1', frames=3)
+    client = FakeDockerClient([container])
+    inventory = ContainerInventory(client)
+    inventory.load()
+    inventory._thread = True
+    collector = StatsCollector(client, inventory=inventory)
+    manager = StatsStreamManager(client, collector, inventory=inventory)
+
+    manager.start()
+    assert wait_for(lambda: 'c1' in collector._snapshots)
+
+    container.status = 'exited'
+    inventory._handle_event({'Type': 'container', 'Action': 'die', 'id': 'c1'})
+    assert 'c1' not in collector._snapshots
+
+
+class FailingContainer(StreamingContainer):
+    """Streams a few frames and then fails, once"""
+
+    def __init__(self, container_id, name):
+        super().__init__(container_id, name, frames=3)
+        self.opened = 0
+        self.reloaded = 0
+
+    def reload(self):
+        self.reloaded += 1
+
+    def stats(self, stream=False, decode=False):
+        self.opened += 1
+        yield from super().stats(stream, decode)
+        if self.opened == 1:
+            raise ConnectionError('stream reset')
+
+
+def test_failed_stream_drops_its_sample_and_is_reopened():
+    container = FailingContainer('c1', 'web1')
+    client = FakeDockerClient([container])
+    collector = StatsCollector(client)
+    discarded = []
+    discard = collector.discard
+    collector.discard = lambda container_id: discarded.append(container_id) or discard(container_id)
+    manager = StatsStreamManager(client, collector, reopen_delay=0.05)
+
+    manager.open_stream(container)
+
+    assert wait_for(lambda: container.opened == 2)
+    assert discarded == ['c1']
+    assert container.reloaded == 1
+    assert wait_for(lambda: 'c1' in collector._snapshots)
+
+
+def test_failed_stream_of_a_stopped_container_stays_closed():
+    container = FailingContainer('c1', 'web1')
+    container.reload = lambda: setattr(container, 'status', 'exited')
+    client = FakeDockerClient([container])
+    collector = StatsCollector(client)
+    manager = StatsStreamManager(client, collector, reopen_delay=0.01)
+
+    manager.open_stream(container)
+
+    assert wait_for(lambda: container.status == 'exited')
+    time.sleep(0.05)
+    assert container.opened == 1
+    assert 'c1' not in collector._snapshots
+    assert 'c1' not in manager._streams
@@ -112,12 +112,14 @@ export const WebSocketProvider = ({ children }) => {
 
   useEffect(() => {
     const socketUrl = process.env.REACT_APP_WS_URL || 'ws://localhost:5000';
-    const newSocket = io(socketUrl);
+    // WebSocket only: long-polling sessions break when requests land on different backend workers
+    const newSocket = io(socketUrl, { transports: ['websocket'] });
 
     setSocket(newSocket);
 
     newSocket.on('connect', () => {
       setIsConnected(true);
+      newSocket.emit('subscribe', { topics: ['summary', 'alerts'] });
       toast.success('Connected to monitoring system');
     });
 
@@ -126,11 +128,31 @@ export const WebSocketProvider = ({ children }) => {
       toast.error('Disconnected from monitoring system');
     });
 
-    newSocket.on('metrics_update', (data) => {
-      setMetrics(data);
+    // Topic updates carry only changed fields; seq detects missed messages
+    let summarySeq = 0;
+
+    newSocket.on('topic_snapshot', ({ topic, seq, data }) => {
+      if (topic === 'summary') {
+        summarySeq = seq;
+        setMetrics(data);
+      }
     });
 
-    newSocket.on('new_alert', (alert) => {
+    newSocket.on('topic_update', ({ topic, seq, changes, removed }) => {
+      if (topic !== 'summary' || seq <= summarySeq) return;
+      if (seq !== summarySeq + 1) {
+        newSocket.emit('subscribe', { topics: ['summary'] });
+        return;
+      }
+      summarySeq = seq;
+      setMetrics(prev => {
+        const next = { ...prev, ...changes };
+        removed.forEach(key => delete next[key]);
+        return next;
+      });
+    });
+
+    const handleNewAlert = (alert) => {
       setAlerts(prev => [alert, ...prev.slice(0, 99)]); // Keep last 100 alerts
       
       const toastOptions = {
@@ -152,15 +174,42 @@ export const WebSocketProvider = ({ children }) => {
       } else {
         toast(`ℹ️ ${alert.message}`, toastOptions);
       }
-    });
+    };
 
-    newSocket.on('alert_resolved', (alertId) => {
+    const handleAlertResolved = (alertId) => {
       setAlerts(prev => prev.map(alert => 
         alert.id === alertId ? { ...alert, resolved: true } : alert
       ));
       toast.success('Alert resolved automatically');
+    };
+
+    // Repeats of an open incident only update its counts, without another toast
+    const handleIncidentUpdated = ({ id, ...changes }) => {
+      setAlerts(prev => prev.map(alert =>
+        alert.id === id ? { ...alert, ...changes } : alert
+      ));
+    };
+
+    const eventHandlers = {
+      new_alert: handleNewAlert,
+      incident_updated: handleIncidentUpdated,
+      alert_resolved: handleAlertResolved
+    };
+
+    newSocket.on('topic_events', ({ events }) => {
+      events.forEach(({ event, data }) => {
+        const handler = eventHandlers[event];
+        if (handler) handler(data);
+      });
     });
 
+    newSocket.on('metrics_update', (data) => {
+      setMetrics(data);
+    });
+
+    newSocket.on('new_alert', handleNewAlert);
+    newSocket.on('alert_resolved', handleAlertResolved);
+
     return () => {
       newSocket.close();
     };
@@ -1,4 +1,6 @@
 -- Create database schema for monitoring platform
+-- This only runs on an empty data volume; changes for existing databases are
+-- applied at startup by db.ensure_schema (backend/db.py SCHEMA_MIGRATIONS)
 
 -- Create monitoring database
 CREATE DATABASE IF NOT EXISTS monitoring_db;
@@ -10,6 +12,7 @@ CREATE TABLE IF NOT EXISTS alerts (
     severity VARCHAR(50) NOT NULL,
     message TEXT NOT NULL,
     source VARCHAR(100),
+    type VARCHAR(100),
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     resolved BOOLEAN DEFAULT FALSE,
     resolved_at TIMESTAMP NULL,
@@ -48,17 +51,33 @@ CREATE TABLE IF NOT EXISTS metrics (
     id SERIAL PRIMARY KEY,
     server_id INTEGER REFERENCES servers(id),
     metric_type VARCHAR(100) NOT NULL,
-    value DECIMAL(10,2) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     labels JSONB
 );
 
+-- Create tables for downsampled metric rollups (resolution is the bucket width in seconds)
+CREATE TABLE IF NOT EXISTS metrics_rollup (
+    server_id INTEGER REFERENCES servers(id),
+    metric_type VARCHAR(100) NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    avg_value DOUBLE PRECISION NOT NULL,
+    p95_value DOUBLE PRECISION NOT NULL,
+    sample_count INTEGER NOT NULL,
+    PRIMARY KEY (resolution, server_id, metric_type, bucket)
+);
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp);
 CREATE INDEX IF NOT EXISTS idx_alerts_resolved ON alerts(resolved);
+CREATE INDEX IF NOT EXISTS idx_alerts_source_timestamp ON alerts(source, timestamp);
 CREATE INDEX IF NOT EXISTS idx_deployments_environment ON deployments(environment);
 CREATE INDEX IF NOT EXISTS idx_metrics_server_type ON metrics(server_id, metric_type);
 CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_type_bucket ON metrics_rollup(resolution, metric_type, bucket);
 
 -- Insert sample data
 INSERT INTO servers (name, host, status) VALUES